@@ -1,4 +1,6 @@
-from app import app, logger
+from app import create_app, logger
+
+app = create_app()
 
 if __name__ == "__main__":
     logger.info("Starting Flask server...")
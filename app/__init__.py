@@ -1,80 +1,96 @@
 import os
 import logging
+import weakref
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from sqlalchemy.orm import declarative_base
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: records are queued and written by a background thread
+from app.logs import configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app first
-app = Flask(__name__)
-
-# Initialize database
+# Extensions are created unbound and attached to an application in create_app()
 Base = declarative_base()
 db = SQLAlchemy(model_class=Base)
 
-# Configure database from environment variables
-database_url = os.getenv('DATABASE_URL')
-if not database_url:
-    logger.error("DATABASE_URL environment variable not set")
-    raise ValueError("DATABASE_URL environment variable is required")
-
-# Configure Flask app
-app.config.update(
-    SQLALCHEMY_DATABASE_URI=database_url,
-    SQLALCHEMY_TRACK_MODIFICATIONS=False,
-    SQLALCHEMY_ENGINE_OPTIONS={
-        "pool_size": 5,
-        "max_overflow": 2,
-        "pool_timeout": 30,
-        "pool_recycle": 1800,
-        "pool_pre_ping": True,
-    },
-    SECRET_KEY=os.getenv('FLASK_SECRET_KEY', 'development-key-change-in-production'),
-)
-
-# Initialize extensions
-try:
-    db.init_app(app)
-    logger.info("Successfully initialized database")
-except Exception as e:
-    logger.error(f"Failed to initialize database: {str(e)}")
-    raise
-
-# Setup rate limiter with increased storage timeout
-try:
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        storage_uri="memory://",
-        default_limits=["200 per day"],
-        storage_options={"storage_timeout": 3600},  # 1 hour timeout for storage
-        strategy="fixed-window-elastic-expiry"  # More accurate rate limiting
+# Rate limiter shared by all workers through Redis
+from app.rate_limit import RedisRateLimiter, get_remote_address  # noqa: E402
+limiter = RedisRateLimiter(key_func=get_remote_address, default_limits=["200 per day"])
+
+# Applications built in this process, for the fork hook below
+_apps = weakref.WeakSet()
+
+def _discard_inherited_connections():
+    # Pooled connections must never be shared with a forked child
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_discard_inherited_connections)
+
+def create_app():
+    """
+    Build the Flask application
+
+    Nothing here opens a connection. Postgres and Redis connections are made on
+    first use in each process, so a gunicorn master can build the app once
+    (--preload) and fork workers that each connect for themselves. Schema
+    migrations are a separate step (python -m app.migrations), and GET /ready
+    reports whether the database is reachable and migrated.
+    """
+    # Configure database from environment variables
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL environment variable not set")
+        raise ValueError("DATABASE_URL environment variable is required")
+
+    app = Flask(__name__)
+
+    # Request, database and Redis instrumentation, exported at /metrics
+    from app.metrics import InstrumentedQueuePool, init_app as init_metrics
+    init_metrics(app)
+
+    # Per-request correlation id and log sampling decision
+    from app.logs import init_app as init_logs
+    init_logs(app)
+
+    # JSON provider, MessagePack negotiation and response compression
+    from app.encoding import init_app as init_encoding
+    init_encoding(app)
+
+    # Configure Flask app
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS={
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": 5,
+            "max_overflow": 2,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        },
+        SECRET_KEY=os.getenv('FLASK_SECRET_KEY', 'development-key-change-in-production'),
     )
-    logger.info("Successfully initialized rate limiter")
-except Exception as e:
-    logger.error(f"Failed to initialize rate limiter: {str(e)}")
-    raise
-
-# Import models and create tables
-try:
-    with app.app_context():
-        # Import models here to avoid circular imports
-        from app.models import User, Submission  # noqa: F401
-        db.create_all()
-        logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {str(e)}")
-    raise
-
-# Import routes after app initialization to avoid circular imports
-from app.routes import *  # noqa: F401, E402
-
-logger.info("Flask application initialized successfully")
\ No newline at end of file
+
+    # Initialize extensions
+    db.init_app(app)
+    limiter.init_app(app)
+
+    # Import models and routes here to avoid circular imports
+    from app import models  # noqa: F401
+    from app.routes import bp
+    app.register_blueprint(bp)
+
+    # Rebuild the leaderboard if Redis lost it and keep it reconciled with Postgres.
+    # Started on each process's first request, so forked workers get their own thread.
+    from app.reconcile import start_reconciler
+    app.before_request(start_reconciler)
+
+    # Forked children drop the pooled connections they inherit
+    _apps.add(app)
+
+    logger.info("Flask application initialized successfully")
+    return app
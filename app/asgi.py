@@ -0,0 +1,698 @@
+"""
+ASGI entry point serving the hot paths on asyncio
+
+    uvicorn asgi:app --workers 4
+
+POST /submit_qualification and GET /leaderboard (the default top-10 view and
+offset/limit pages of the all-time board) run as coroutines on redis.asyncio
+and an async SQLAlchemy engine: asyncpg for Postgres, aiosqlite for SQLite.
+GET /leaderboard/stream is a coroutine awaiting frames from the process's
+leaderboard subscription (app.stream), so an open stream holds no thread.
+Validation, scoring, Redis keys, Lua scripts, rate limits, idempotency records
+and response bodies are the Flask views', so both servers can serve the same
+deployment side by side. A leaderboard read's rate limit check and cache
+lookup don't depend on each other and overlap; a submission reaches the
+leaderboard (and its subscribers) only once its row is committed. The slot lease is read in the same pipeline as the ranking, and concurrent
+cache misses for the same leaderboard version share one render.
+Responses are negotiated and compressed as the Flask app's are (app.encoding).
+
+Everything else is handed to the Flask app on a thread pool
+(Config.ASGI_THREADS): the other routes, plus requests the views answer on
+paths the async handlers don't reimplement. These are cursor and window pages,
+top-K overflow into Postgres, async ingest, bodies that are not a JSON object,
+and anything arriving while the Redis circuit breaker is open. When Redis fails
+during a leaderboard read, the fallback tiers (app.fallback) run on the thread
+pool.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+import redis
+from sqlalchemy import exc, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.http import parse_etags
+from app import create_app, fallback, limiter, logger
+from app.encoding import (
+    cached_variant, compress, content_coding, decode_record_body, encode, loads, response_format, vary
+)
+from app.idempotency import (
+    CONFLICT_ERROR, HEADER as IDEMPOTENCY_HEADER, IN_PROGRESS_ERROR, REPLAYED_HEADER,
+    body_fingerprint, claim_async, finish_async, invalid_header, record_ttl, request_key, stored_response
+)
+from app.logs import REQUEST_ID_HEADER, begin_request, end_request
+from app.metrics import metrics
+from app.models import Submission
+from app.ranking import estimate_total
+from app.rate_limit import rate_limit_headers, rejection_body
+from app.reconcile import start_reconciler
+from app.redis_client import (
+    LEADERBOARD_CACHE_KEY, LEADERBOARD_EVENTS_CHANNEL, LEADERBOARD_KEY, LEADERBOARD_VERSION_KEY, SLOT_LEASE_KEY,
+    breaker, create_async_redis_client, decode_cached_leaderboard, encode_cached_leaderboard, entered_top,
+    leaderboard_event, load_pipeline_scripts, queue_leaderboard_update, record_redis_error
+)
+from app.routes import (
+    encode_cursor, leaderboard_cache_ttl, render_leaderboard, render_payload, scorer,
+    submission_details, submission_details_query
+)
+from app.schemas import validate_submission
+from app.slots import allocate_slot, get_current_slot, slot_info
+from app.stats import histogram_deltas, metric_columns, summary_upsert
+from app.stream import STREAM_HEADERS, broadcaster, opening_frame, sse_frame
+from config import Config
+
+# (method, path) -> (Flask endpoint name, handler method)
+ROUTES = {
+    ('POST', '/submit_qualification'): ('api.submit_qualification', 'submit_qualification'),
+    ('GET', '/leaderboard'): ('api.get_leaderboard', 'get_leaderboard'),
+    ('GET', '/leaderboard/stream'): ('api.stream_leaderboard', 'stream_leaderboard'),
+}
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'postgres': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+def async_database_url(url):
+    """DATABASE_URL with its driver swapped for an asyncio one"""
+    scheme, separator, rest = url.partition('://')
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}{separator}{rest}"
+
+class Request:
+    """The parts of an ASGI request the async handlers read"""
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.body = body
+        self.headers = {}
+        for name, value in scope['headers']:
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]},{value}" if name in self.headers else value
+        self.args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value)
+
+    @property
+    def remote_addr(self):
+        client = self.scope.get('client')
+        return client[0] if client else '127.0.0.1'
+
+    def int_arg(self, name, default):
+        """Like request.args.get(name, default, type=int)"""
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+    def json(self):
+        """The body as a JSON object, or None if it isn't one"""
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if mimetype != 'application/json' and not (mimetype.startswith('application/') and mimetype.endswith('+json')):
+            return None
+        try:
+            data = loads(self.body)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+class AsgiApp:
+    """ASGI application: async handlers for the hot paths, the Flask app for the rest"""
+    def __init__(self, flask_app):
+        self.flask = flask_app
+        self.engine = None
+        self.redis = None
+        self._threads = None
+        self._renders = {}  # leaderboard version -> render in progress
+
+    def _connect(self):
+        """Create this worker's engine, Redis client and thread pool, and its background threads"""
+        if self.engine is not None:
+            return
+        self.engine = create_async_engine(
+            Config.ASYNC_DATABASE_URL or async_database_url(self.flask.config['SQLALCHEMY_DATABASE_URI']),
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=Config.ASYNC_DB_POOL_SIZE,
+            max_overflow=2,
+            pool_recycle=1800,
+            pool_pre_ping=True,
+        )
+        self.redis = create_async_redis_client()
+        self._threads = ThreadPoolExecutor(max_workers=Config.ASGI_THREADS, thread_name_prefix='asgi-flask')
+        # Flask requests start these on first use; async-only traffic would never get there
+        metrics.start_flusher()
+        with self.flask.app_context():
+            start_reconciler()
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            await self.redis.aclose()
+            self._threads.shutdown(wait=False)
+            self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        self._connect()
+        body = await self._read_body(receive)
+        route = ROUTES.get((scope['method'], scope['path']))
+        if route:
+            response = await self._handle(route, Request(scope, body))
+            if response is not None and isinstance(response[2], AsyncIterator):
+                return await self._stream(receive, send, *response)
+            if response is not None:
+                return await self._respond(send, *response)
+        await self._to_flask(scope, body, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._connect()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def _handle(self, route, request):
+        """Run an async handler; returns (status, headers, body), or None to hand the request to Flask"""
+        endpoint, name = route
+        started = time.perf_counter()
+        request_id, tokens = begin_request(request.headers.get(REQUEST_ID_HEADER.lower(), ''))
+        try:
+            with self.flask.app_context():
+                try:
+                    response = await getattr(self, name)(request)
+                except Exception as e:
+                    logger.error("Error handling %s: %s", endpoint, e)
+                    response = self._json(500, {'error': 'Internal server error'})
+            if response is not None:
+                response = self._compress(request, *self._encode(request, *response))
+                response[1][REQUEST_ID_HEADER] = request_id
+                metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                                method=request.scope['method'], endpoint=endpoint, status=response[0])
+            return response
+        finally:
+            end_request(tokens)
+
+    @staticmethod
+    def _raw_headers(headers):
+        return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+
+    async def _respond(self, send, status, headers, body):
+        body = body.encode() if isinstance(body, str) else body
+        headers = self._raw_headers(headers)
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _stream(self, receive, send, status, headers, chunks):
+        """Send the chunks of an async iterator as they come, until it ends or the client disconnects"""
+        async def pump():
+            await send({'type': 'http.response.start', 'status': status, 'headers': self._raw_headers(headers)})
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Closing the iterator runs its cleanup (see _stream_frames)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await chunks.aclose()
+        if tasks[0] in done and tasks[0].exception():
+            logger.error("Error streaming response: %s", tasks[0].exception())
+
+    def _json(self, status, payload, headers=None):
+        # The payload is serialised by _encode(), in the format the client negotiated
+        return status, dict(headers or {}), payload
+
+    def _encode(self, request, status, headers, body):
+        """Serialise a payload from _json(), as jsonify() does"""
+        if isinstance(body, dict):
+            body, headers['Content-Type'] = encode(body, response_format(request.headers.get('accept')))
+        return status, headers, body
+
+    def _compress(self, request, status, headers, body):
+        """Compress a response as the Flask app does (see app.encoding.init_app)"""
+        negotiated_on = vary(headers.get('Content-Type', '').split(';')[0])
+        if not negotiated_on:
+            return status, headers, body
+        headers['Vary'] = ', '.join(negotiated_on)
+        coding = content_coding(request.headers.get('accept-encoding'))
+        if coding is None or 'Content-Encoding' in headers or status in (204, 304) \
+                or len(body) < Config.COMPRESS_MIN_BYTES:
+            return status, headers, body
+        headers['Content-Encoding'] = coding
+        return status, headers, compress(body.encode() if isinstance(body, str) else body, coding)
+
+    async def _run_sync(self, fn, *args):
+        """Run blocking app code (fallback tiers, slot allocation) on the thread pool, in an app context"""
+        def call():
+            with self.flask.app_context():
+                return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._threads, call)
+
+    async def _check_limits(self, request, scope, limits):
+        """Returns tuple (rate limit headers, 429 response or None)"""
+        result, rejected = await limiter.check_async(self.redis, scope, limits, request.remote_addr)
+        headers = rate_limit_headers(result) if result else {}
+        return headers, self._json(429, rejection_body(result), headers) if rejected else None
+
+    async def submit_qualification(self, request):
+        """POST /submit_qualification: the rate limit, idempotency and view of routes.submit_qualification"""
+        if Config.ASYNC_INGEST or not breaker.allow():
+            return None
+        data = request.json()
+        if data is None:
+            return None
+
+        header = request.headers.get(IDEMPOTENCY_HEADER.lower())
+        error = invalid_header(header)
+        if error:
+            return self._json(400, {'error': error})
+        fingerprint = body_fingerprint(data, request.body)
+        key = request_key('api.submit_qualification', request.remote_addr, header, fingerprint)
+        # Claimed before the rate limit check, as @idempotent wraps @limiter.limit on the
+        # view, so a retry answered from a stored response is not charged
+        token, outcome = await self._claim(key, fingerprint)
+        if outcome:
+            return self._idempotent_outcome(*outcome, {})
+        headers, rejection = await self._check_limits(
+            request, 'submit_qualification', limiter.endpoint_limits['submit_qualification']
+        )
+        if rejection:
+            if token:
+                await finish_async(self.redis, key, token, None, 0)
+            return rejection
+
+        status, response_headers, body = self._encode(request, *await self._submit(data))
+        if token:
+            record = stored_response(fingerprint, status, response_headers['Content-Type'], body) \
+                if 200 <= status < 300 else None
+            await finish_async(self.redis, key, token, record, record_ttl(header))
+        return status, {**response_headers, **headers}, body
+
+    async def _claim(self, key, fingerprint):
+        """claim_async() for a submission; returns tuple (token, outcome), both None when Redis fails"""
+        try:
+            return await claim_async(self.redis, key, fingerprint)
+        except redis.RedisError as e:
+            # Like the decorator: without Redis the request runs without deduplication
+            record_redis_error(e)
+            logger.warning("Idempotency check unavailable: %s", e)
+            return None, None
+
+    def _idempotent_outcome(self, state, record, headers):
+        if state == 'conflict':
+            return self._json(422, {'error': CONFLICT_ERROR}, headers)
+        if state == 'timeout':
+            retry_after = str(max(1, int(Config.IDEMPOTENCY_WAIT_SECONDS)))
+            return self._json(409, {'error': IN_PROGRESS_ERROR}, {**headers, 'Retry-After': retry_after})
+        metrics.inc('idempotent_replays_total', endpoint='api.submit_qualification')
+        return record['status'], {'Content-Type': record['mimetype'], REPLAYED_HEADER: 'true', **headers}, \
+            decode_record_body(record['body'])
+
+    async def _submit(self, data):
+        if not data:
+            return self._json(400, {'error': 'No data provided'})
+
+        validation_error = validate_submission(data)
+        if validation_error:
+            return self._json(400, {'error': 'Invalid submission format', 'details': validation_error})
+
+        try:
+            score = scorer.calculate_score(data)
+        except ValueError as e:
+            return self._json(400, {'error': 'Score calculation failed', 'details': str(e)})
+
+        timestamp = datetime.utcnow()
+        columns = metric_columns(data)
+        try:
+            async with self.engine.connect() as conn:
+                submission_id = (await conn.execute(
+                    insert(Submission).values(
+                        metrics=data, score=score, score_version=scorer.version,
+                        timestamp=timestamp, slot_allocated=False, **columns
+                    ).returning(Submission.id)
+                )).scalar_one()
+                await conn.execute(summary_upsert(
+                    conn.dialect.name, histogram_deltas([{'score': score, **columns}])
+                ))
+                await conn.commit()
+        except exc.SQLAlchemyError as e:
+            logger.error("Database error processing submission: %s", e)
+            return self._json(500, {'error': 'Database error occurred'})
+
+        leader = await self._update_leaderboard([(submission_id, score)], [data], [timestamp])
+        if not leader:
+            logger.error("Failed to update leaderboard for submission %s", submission_id)
+        elif leader[0] == submission_id:
+            await self._run_sync(allocate_slot, submission_id)
+
+        logger.info("New submission processed successfully with score %s", score)
+        return self._json(200, {'success': True, 'score': score, 'submission_id': submission_id})
+
+    async def _update_leaderboard(self, entries, metrics_list, timestamps):
+        """redis_client.update_leaderboard_bulk() on the async client"""
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            queue_leaderboard_update(pipe, entries, metrics_list, timestamps)
+            load_pipeline_scripts(pipe)
+            top = (await pipe.execute())[-1]
+            entered = entered_top(top, entries)
+            if entered:
+                await self.redis.publish(LEADERBOARD_EVENTS_CHANNEL, leaderboard_event('entered', entries=entered))
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error("Redis error updating leaderboard: %s", e)
+            return None
+        logger.info("Updated leaderboard with %s submission(s)", len(entries))
+        return (int(top[0][0]), top[0][1]) if top else None
+
+    async def get_leaderboard(self, request):
+        """GET /leaderboard: the default view of routes.get_leaderboard, and all-time offset/limit pages"""
+        if any(param in request.args for param in ('offset', 'limit', 'cursor', 'window')):
+            return await self.leaderboard_page(request)
+        if not breaker.allow():
+            return None
+
+        (headers, rejection), (version, etag, body) = await asyncio.gather(
+            self._check_limits(request, 'api.get_leaderboard', limiter.default_limits),
+            self._cached_leaderboard()
+        )
+        if rejection:
+            return rejection
+
+        snapshot = None
+        if body is None:
+            rendered = await self._shared_render(version)
+            if rendered is None:
+                return self._json(503, {'error': 'Leaderboard unavailable'}, {**headers, 'Retry-After': '1'})
+            etag, body, snapshot = rendered
+
+        etag, mimetype, coding, data = cached_variant(
+            etag, body, request.headers.get('accept'), request.headers.get('accept-encoding')
+        )
+        headers.update({'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', **self._degraded_headers(snapshot)})
+        if parse_etags(request.headers.get('if-none-match')).contains(etag):
+            return 304, headers, b''
+        headers['Content-Type'] = mimetype
+        if coding:
+            headers['Content-Encoding'] = coding
+        return 200, headers, data
+
+    async def _cached_leaderboard(self):
+        try:
+            return decode_cached_leaderboard(*await self.redis.mget(LEADERBOARD_VERSION_KEY, LEADERBOARD_CACHE_KEY))
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error("Redis error fetching cached leaderboard: %s", e)
+            return None, None, None
+
+    async def _shared_render(self, version):
+        """
+        Each submission invalidates the cached board, so readers arriving together
+        all miss it; those missing the same version wait for a single render
+        """
+        if version is None:
+            return await self._render_leaderboard(version)
+        render = self._renders.get(version)
+        if render is None:
+            render = self._renders[version] = asyncio.ensure_future(self._render_leaderboard(version))
+            render.add_done_callback(lambda _: self._renders.pop(version, None))
+        # A reader that goes away must not cancel the render for the others
+        return await asyncio.shield(render)
+
+    async def _render_leaderboard(self, version):
+        """routes.render_leaderboard() after a cache miss; returns (etag, body, snapshot) or None"""
+        top = await self._pipeline(lambda pipe: pipe.zrevrange(LEADERBOARD_KEY, 0, 9, withscores=True))
+        if not top or not top[0]:
+            # Empty or unreachable: the Flask path's fallback tiers decide what to show
+            return await self._run_sync(render_leaderboard)
+        entries, current_slot = [(int(sub_id), score) for sub_id, score in top[0]], self._lease(*top[1:])
+        fallback.remember(entries)
+
+        try:
+            details = await self._submission_details([sub_id for sub_id, _ in entries])
+        except exc.SQLAlchemyError as e:
+            logger.error("Error fetching leaderboard submissions: %s", e)
+            details = []
+        if not current_slot and details:
+            _, current_slot = await self._run_sync(allocate_slot, details[0]['submission_id'])
+
+        etag, body = render_payload({'leaderboard': details, 'current_slot': current_slot})
+        ttl = leaderboard_cache_ttl(current_slot)
+        if version is not None and ttl > 0:
+            try:
+                await self.redis.set(LEADERBOARD_CACHE_KEY, encode_cached_leaderboard(version, etag, body), ex=ttl)
+            except redis.RedisError as e:
+                record_redis_error(e)
+                logger.error("Redis error caching leaderboard: %s", e)
+        return etag, body, None
+
+    async def leaderboard_page(self, request):
+        """
+        routes.leaderboard_page() for offset/limit pages of the all-time board
+        Pages reaching past the Redis top K, which continue from Postgres, are left to the Flask view
+        """
+        limit, offset = request.int_arg('limit', 10), request.int_arg('offset', 0)
+        if 'cursor' in request.args or request.args.get('window', 'all') != 'all' \
+                or 0 < Config.LEADERBOARD_TOP_K < offset + limit or not breaker.allow():
+            return None
+
+        headers, rejection = await self._check_limits(request, 'api.get_leaderboard', limiter.default_limits)
+        if rejection:
+            return rejection
+        if not 1 <= limit <= Config.LEADERBOARD_MAX_PAGE_SIZE or offset < 0:
+            return self._json(400, {
+                'error': 'Invalid pagination parameters',
+                'details': f"limit must be 1-{Config.LEADERBOARD_MAX_PAGE_SIZE} and offset must be >= 0"
+            }, headers)
+
+        def queue(pipe):
+            pipe.zrevrange(LEADERBOARD_KEY, offset, offset + limit - 1, withscores=True)
+            pipe.zcard(LEADERBOARD_KEY)
+        page = await self._pipeline(queue)
+        snapshot = None
+        if page and page[1] > 0:
+            entries, total, current_slot = [(int(sub_id), score) for sub_id, score in page[0]], page[1], \
+                self._lease(*page[2:])
+            if offset == 0:
+                fallback.remember(entries, total)
+            if 0 < Config.LEADERBOARD_TOP_K <= total:
+                # The board goes on past rank K in Postgres
+                total = max(total, await self._run_sync(estimate_total))
+        else:
+            page = await self._run_sync(fallback.leaderboard_page, offset, limit)
+            if page is None:
+                return self._json(503, {'error': 'Leaderboard unavailable'}, {**headers, 'Retry-After': '1'})
+            entries, total, snapshot = page
+            current_slot = await self._run_sync(get_current_slot)
+
+        try:
+            details = await self._submission_details([sub_id for sub_id, _ in entries], first_rank=offset + 1)
+        except exc.SQLAlchemyError as e:
+            logger.error("Error fetching leaderboard submissions: %s", e)
+            return self._json(500, {'error': 'Database error occurred'}, headers)
+
+        has_more = offset + len(entries) < total
+        payload = {
+            'leaderboard': details,
+            'window': 'all',
+            'offset': offset,
+            'limit': limit,
+            'total': total,
+            'next_cursor': encode_cursor(*entries[-1], offset + len(entries)) if entries and has_more else None,
+            'current_slot': current_slot
+        }
+        if snapshot:
+            payload['degraded'] = snapshot.freshness()
+        return self._json(200, payload, {**headers, **self._degraded_headers(snapshot)})
+
+    async def stream_leaderboard(self, request):
+        """GET /leaderboard/stream: routes.stream_leaderboard, awaiting frames on the event loop"""
+        headers, rejection = await self._check_limits(
+            request, 'stream_leaderboard', limiter.endpoint_limits['stream_leaderboard']
+        )
+        if rejection:
+            return rejection
+
+        after = broadcaster.resume_point(request.headers.get('last-event-id'))
+        snapshot = None
+        if after is None:
+            # Waits for the subscription only while it is coming up
+            after = await self._run_sync(broadcaster.subscribe)
+            if breaker.allow():
+                version, etag, body = await self._cached_leaderboard()
+                rendered = (etag, body) if body is not None else await self._shared_render(version)
+            else:
+                rendered = await self._run_sync(render_leaderboard)
+            if rendered is None:
+                return self._json(503, {'error': 'Leaderboard unavailable'}, headers)
+            snapshot = sse_frame(rendered[1], 'snapshot', broadcaster.event_id(after))
+        headers.update({'Content-Type': 'text/event-stream; charset=utf-8', **STREAM_HEADERS})
+        return 200, headers, self._stream_frames(after, snapshot)
+
+    async def _stream_frames(self, after, snapshot):
+        """routes.stream_leaderboard's generator, on the queue broadcaster.listen() feeds"""
+        queue = broadcaster.listen(after)
+        try:
+            yield opening_frame(Config.STREAM_RETRY_MS, snapshot)
+            deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    frames = [await asyncio.wait_for(queue.get(), Config.STREAM_KEEPALIVE_SECONDS)]
+                except asyncio.TimeoutError:
+                    # A comment line keeps proxies from closing an idle stream
+                    yield ': keepalive\n\n'
+                    continue
+                while not queue.empty():
+                    frames.append(queue.get_nowait())
+                yield ''.join(frames)
+        finally:
+            broadcaster.unlisten(queue)
+
+    async def _pipeline(self, queue):
+        """
+        Run the reads queued by queue(pipe) and a read of the slot lease in one
+        round trip; returns the replies, the lease's GET and PTTL last, or None on failure
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            queue(pipe)
+            pipe.get(SLOT_LEASE_KEY)
+            pipe.pttl(SLOT_LEASE_KEY)
+            return await pipe.execute()
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error("Redis error fetching leaderboard: %s", e)
+            return None
+
+    @staticmethod
+    def _lease(holder, ttl_ms):
+        return slot_info(int(holder), ttl_ms) if holder is not None and ttl_ms > 0 else None
+
+    @staticmethod
+    def _degraded_headers(snapshot):
+        if not snapshot:
+            return {}
+        return {'X-Leaderboard-Source': snapshot.freshness()['source'], 'Age': str(int(snapshot.age()))}
+
+    async def _submission_details(self, submission_ids, first_rank=1):
+        """routes.fetch_submission_details() on the async engine"""
+        if not submission_ids:
+            return []
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(submission_details_query(submission_ids))).all()
+        return submission_details(rows, submission_ids, first_rank)
+
+    async def _to_flask(self, scope, body, receive, send):
+        """Serve a request with the Flask app on the thread pool, streaming its response back"""
+        loop = asyncio.get_running_loop()
+        gone = threading.Event()
+
+        def forward(message):
+            if not gone.is_set():
+                try:
+                    asyncio.run_coroutine_threadsafe(send(message), loop).result()
+                except Exception:
+                    gone.set()
+
+        def run():
+            start = []
+
+            def start_response(status, headers, exc_info=None):
+                start[:] = [int(status.split(' ', 1)[0]),
+                            [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+
+            chunks = self.flask(self._environ(scope, body), start_response)
+            started = False
+            try:
+                for chunk in chunks:
+                    if gone.is_set():
+                        break
+                    if not started:
+                        forward({'type': 'http.response.start', 'status': start[0], 'headers': start[1]})
+                        started = True
+                    if chunk:
+                        forward({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if not started:
+                    forward({'type': 'http.response.start', 'status': start[0], 'headers': start[1]})
+                forward({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+
+        async def watch_disconnect():
+            # Lets a long response (the event stream) stop once its client has gone
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            gone.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await loop.run_in_executor(self._threads, run)
+        finally:
+            watcher.cancel()
+
+    @staticmethod
+    def _environ(scope, body):
+        """WSGI environ for an ASGI HTTP scope"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('127.0.0.1', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name, value = name.decode('latin-1'), value.decode('latin-1')
+            if name == 'content-length':
+                continue
+            key = 'CONTENT_TYPE' if name == 'content-type' else f"HTTP_{name.upper().replace('-', '_')}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+def create_asgi_app(flask_app=None):
+    """Build the ASGI application around the Flask app (see module docstring)"""
+    return AsgiApp(flask_app or create_app())
@@ -1,9 +1,9 @@
 from flask_jwt_extended import create_access_token
 from datetime import timedelta
-from app import app
+from flask import current_app
 
 def generate_token(user_id):
-    expires = timedelta(seconds=app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+    expires = timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES'])
     return create_access_token(
         identity=user_id,
         expires_delta=expires
@@ -0,0 +1,210 @@
+"""
+Response encoding
+
+JSON is written by orjson when it is installed (Config.JSON_PROVIDER), through
+a Flask JSON provider so jsonify() and the views are unchanged. Keys are
+sorted, as Flask's own provider does, so bodies and their ETags stay the same
+whichever provider wrote them. Every encoder writes datetimes as ISO 8601, so
+payloads can carry datetime values instead of strings.
+
+On top of that, for clients that ask:
+- MessagePack instead of JSON, when Accept prefers application/msgpack to
+  application/json (Config.RESPONSE_MSGPACK, needs msgpack)
+- brotli or gzip compression of bodies of at least Config.COMPRESS_MIN_BYTES,
+  in the order of Config.COMPRESS_ALGORITHMS (brotli needs brotli)
+
+Cached bodies (the rendered leaderboard) are JSON text. cached_variant() turns
+one into the representation a client negotiated and keeps the result per
+process, keyed by ETag, so a cache hit is served without re-encoding or
+re-compressing. Each representation has its own ETag: the JSON body's ETag
+with the format and content coding appended.
+"""
+import base64
+import gzip
+import json
+import threading
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from app import logger
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MIMETYPES = {'json': JSON_MIMETYPE, 'msgpack': MSGPACK_MIMETYPE}
+COMPRESSIBLE = {JSON_MIMETYPE, MSGPACK_MIMETYPE, 'application/x-ndjson', 'text/plain', 'text/csv', 'text/html'}
+VARIANT_CACHE_SIZE = 64  # Encoded bodies kept per process
+
+_variants = {}
+_variants_lock = threading.Lock()
+
+def _default(value):
+    """Values the encoders don't handle themselves"""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def use_orjson():
+    return orjson is not None and Config.JSON_PROVIDER == 'orjson'
+
+def dumps(obj):
+    """Compact JSON with sorted keys, as bytes"""
+    if use_orjson():
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(',', ':')).encode()
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def encode(obj, fmt='json'):
+    """Serialise a payload; returns tuple (body, mimetype)"""
+    if fmt == 'msgpack':
+        return msgpack.packb(obj, default=_default), MSGPACK_MIMETYPE
+    return dumps(obj) + b'\n', JSON_MIMETYPE
+
+def compress(data, coding):
+    if coding == 'br':
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.GZIP_LEVEL, mtime=0)
+
+def response_format(accept):
+    """'msgpack' if the Accept header prefers MessagePack to JSON and it can be sent, else 'json'"""
+    if not accept or msgpack is None or not Config.RESPONSE_MSGPACK:
+        return 'json'
+    return _preferred_format(accept)
+
+@lru_cache(maxsize=256)
+def _preferred_format(accept):
+    best = parse_accept_header(accept, MIMEAccept).best_match(
+        [JSON_MIMETYPE, MSGPACK_MIMETYPE, 'application/x-msgpack']
+    )
+    return 'json' if best in (None, JSON_MIMETYPE) else 'msgpack'
+
+def _codings():
+    codings = (coding.strip() for coding in Config.COMPRESS_ALGORITHMS.split(','))
+    return tuple(coding for coding in codings if coding == 'gzip' or (coding == 'br' and brotli is not None))
+
+def content_coding(accept_encoding):
+    """The first of Config.COMPRESS_ALGORITHMS the Accept-Encoding header allows, or None"""
+    if not accept_encoding:
+        return None
+    return _accepted_coding(accept_encoding, _codings())
+
+@lru_cache(maxsize=256)
+def _accepted_coding(accept_encoding, codings):
+    accepted = parse_accept_header(accept_encoding)
+    return next((coding for coding in codings if accepted.quality(coding) > 0), None)
+
+def vary(mimetype):
+    """Request headers a response of this type is negotiated on"""
+    if mimetype not in COMPRESSIBLE:
+        return []
+    headers = ['Accept'] if mimetype in MIMETYPES.values() and msgpack is not None and Config.RESPONSE_MSGPACK else []
+    return headers + ['Accept-Encoding'] if _codings() else headers
+
+def cached_variant(etag, body, accept, accept_encoding):
+    """
+    A JSON body rendered earlier (str or bytes), in the format and content coding
+    the request negotiated. Returns tuple (etag, mimetype, content coding or None, data).
+    """
+    fmt = response_format(accept)
+    coding = content_coding(accept_encoding) if len(body) >= Config.COMPRESS_MIN_BYTES else None
+    variant_etag = '-'.join(part for part in (etag, fmt if fmt != 'json' else None, coding) if part)
+
+    data = _variants.get(variant_etag)
+    if data is None:
+        data = body.encode() if isinstance(body, str) else body
+        if fmt == 'msgpack':
+            data = msgpack.packb(loads(data))
+        if coding:
+            data = compress(data, coding)
+        with _variants_lock:
+            while len(_variants) >= VARIANT_CACHE_SIZE:
+                del _variants[next(iter(_variants))]
+            _variants[variant_etag] = data
+    return variant_etag, MIMETYPES[fmt], coding, data
+
+def encode_record_body(body):
+    """A response body for a JSON record: text as is, binary (MessagePack) as {'base64': ...}"""
+    if isinstance(body, bytes):
+        try:
+            return body.decode()
+        except UnicodeDecodeError:
+            return {'base64': base64.b64encode(body).decode()}
+    return body
+
+def decode_record_body(body):
+    return base64.b64decode(body['base64']) if isinstance(body, dict) else body
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, writing datetimes as ISO 8601 and offering MessagePack"""
+    default = staticmethod(_default)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        fmt = response_format(request.headers.get('Accept')) if has_request_context() else 'json'
+        body, mimetype = encode(obj, fmt)
+        return self._app.response_class(body, mimetype=mimetype)
+
+class OrjsonProvider(IsoJSONProvider):
+    """JSON provider on orjson, which encodes datetimes natively"""
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+def json_provider(app):
+    """The JSON provider for an app, per Config.JSON_PROVIDER"""
+    if Config.JSON_PROVIDER == 'orjson' and orjson is None:
+        logger.warning("orjson is not installed; using the standard library JSON encoder")
+    return OrjsonProvider(app) if use_orjson() else IsoJSONProvider(app)
+
+def init_app(app):
+    """Install the JSON provider and compress responses the views didn't encode themselves"""
+    app.json = json_provider(app)
+
+    def compress_response(response):
+        negotiated_on = vary(response.mimetype)
+        if not negotiated_on:
+            return response
+        response.vary.update(negotiated_on)
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers \
+                or response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        coding = content_coding(request.headers.get('Accept-Encoding'))
+        data = response.get_data()
+        if coding is None or len(data) < Config.COMPRESS_MIN_BYTES:
+            return response
+
+        response.set_data(compress(data, coding))
+        response.headers['Content-Encoding'] = coding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{coding}", weak)
+        return response
+
+    app.after_request(compress_response)
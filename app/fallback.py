@@ -0,0 +1,185 @@
+"""
+Leaderboard reads that survive a Redis outage
+
+All-time leaderboard reads go through top_submissions(), leaderboard_page()
+and leaderboard_page_after(). They read Redis first, and every successful read
+of the top of the board is kept as this process's snapshot. When Redis is unavailable, or answers with an
+empty board (e.g. a fresh replica after failover, before the reconciler has
+rebuilt it), reads fall back in tiers:
+
+1. The snapshot, while it is younger than Config.FALLBACK_REFRESH_SECONDS.
+2. An ORDER BY score DESC, id DESC LIMIT n query on ix_submissions_score_desc.
+   At most Config.FALLBACK_DB_CONCURRENCY of these run at once per process.
+   The result becomes the new snapshot, so during an outage each process
+   queries Postgres about once per refresh interval however busy it is.
+3. The snapshot again, while it is younger than Config.FALLBACK_SNAPSHOT_TTL,
+   when Postgres fails or all query slots are taken.
+
+Fallback reads also return the Snapshot they were served from, so responses
+can say how stale they are (Snapshot.freshness() and Snapshot.age()). Reads
+from Redis return None there.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import exc
+from app import db, logger
+from app.ranking import estimate_rank, estimate_total, fetch_overflow_page
+from app.redis_client import get_leaderboard_page, get_leaderboard_page_after, get_top_submissions
+from config import Config
+
+class Snapshot:
+    """The top of the leaderboard as last seen, with when and where it was read"""
+    def __init__(self, entries, total, origin):
+        self.entries = entries
+        self.total = total  # None when only the first len(entries) are known
+        self.origin = origin  # 'redis' or 'database'
+        self.taken_at = time.monotonic()
+        self.as_of = datetime.utcnow()
+        self.rendered = None  # Response body built from this snapshot, reused while it is served
+
+    def age(self):
+        return time.monotonic() - self.taken_at
+
+    def covers(self, count):
+        """True if the snapshot holds the first `count` entries (or the whole board)"""
+        return len(self.entries) >= (count if self.total is None else min(count, self.total))
+
+    def known_total(self):
+        return self.total if self.total is not None else len(self.entries)
+
+    def freshness(self):
+        """Staleness indicator for responses served from this snapshot"""
+        return {
+            'source': 'snapshot' if self.origin == 'redis' else 'database',
+            'as_of': self.as_of.isoformat()
+        }
+
+_snapshot = None
+_db_slots = threading.BoundedSemaphore(Config.FALLBACK_DB_CONCURRENCY)
+
+def _reset_after_fork():
+    global _snapshot, _db_slots
+    _snapshot = None
+    _db_slots = threading.BoundedSemaphore(Config.FALLBACK_DB_CONCURRENCY)
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def remember(entries, total=None):
+    """Keep a Redis read of the top of the board unless a recent one covers more of it"""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot.origin != 'redis' or len(entries) >= len(snapshot.entries) \
+            or snapshot.age() > Config.FALLBACK_REFRESH_SECONDS:
+        _snapshot = Snapshot(entries, total, 'redis')
+
+def _usable(snapshot, count, max_age):
+    return snapshot is not None and snapshot.covers(count) and snapshot.age() < max_age
+
+def _fallback_top(count):
+    """The first `count` entries of the board from the snapshot or Postgres, or None"""
+    global _snapshot
+    snapshot = _snapshot
+    if _usable(snapshot, count, Config.FALLBACK_REFRESH_SECONDS):
+        return snapshot
+
+    # Don't queue behind other readers while there is something to show
+    wait = 0 if _usable(snapshot, count, Config.FALLBACK_SNAPSHOT_TTL) else Config.FALLBACK_DB_WAIT_SECONDS
+    if _db_slots.acquire(timeout=wait):
+        try:
+            # Another reader may have refreshed it while this one waited
+            snapshot = _snapshot
+            if _usable(snapshot, count, Config.FALLBACK_REFRESH_SECONDS):
+                return snapshot
+            size = max(count, Config.FALLBACK_SNAPSHOT_SIZE)
+            entries = fetch_overflow_page(size)
+            total = len(entries) if len(entries) < size else estimate_total()
+            db.session.commit()
+            _snapshot = snapshot = Snapshot(entries, total, 'database')
+            logger.warning(f"Serving leaderboard from Postgres ({len(entries)} entries)")
+            return snapshot
+        except exc.SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Database error reading fallback leaderboard: {str(e)}")
+        finally:
+            _db_slots.release()
+
+    snapshot = _snapshot
+    if _usable(snapshot, count, Config.FALLBACK_SNAPSHOT_TTL):
+        return snapshot
+    return None
+
+def top_submissions(limit):
+    """
+    The top `limit` entries as (submission_id, score)
+    Returns tuple (entries, snapshot) with snapshot None when read from Redis,
+    or None when no tier can answer
+    """
+    entries = get_top_submissions(limit)
+    if entries:
+        remember(entries)
+        return entries, None
+
+    snapshot = _fallback_top(limit)
+    if snapshot is None:
+        return None
+    return snapshot.entries[:limit], snapshot
+
+def leaderboard_page(offset, limit):
+    """
+    One page of the all-time leaderboard by rank offset
+    Returns tuple (entries, total, snapshot) with snapshot None when read from
+    Redis, or None when no tier can answer
+    """
+    page = get_leaderboard_page(offset, limit)
+    if page is not None and page[1] > 0:
+        entries, total = page
+        if offset == 0:
+            remember(entries, total)
+        return entries, total, None
+
+    end = offset + limit
+    if end <= Config.FALLBACK_SNAPSHOT_SIZE:
+        snapshot = _fallback_top(end)
+        if snapshot is None:
+            return None
+        return snapshot.entries[offset:end], snapshot.known_total(), snapshot
+
+    # Deep pages are not kept; read them directly, within the same concurrency limit
+    def read():
+        entries = fetch_overflow_page(limit, offset=offset)
+        return entries, max(estimate_total(), offset + len(entries))
+    return _guarded_page(read)
+
+def leaderboard_page_after(submission_id, score, limit, offset=None):
+    """
+    The page following the entry (submission_id, score) of the all-time leaderboard
+    `offset` is that page's rank offset when the caller knows it
+    Returns tuple (offset, entries, total, snapshot) with snapshot None when read
+    from Redis, or None when no tier can answer
+    """
+    page = get_leaderboard_page_after(submission_id, score, limit)
+    if page is not None and page[2] > 0:
+        return (*page, None)
+
+    def read():
+        entries = fetch_overflow_page(limit, after=(submission_id, score))
+        page_offset = offset if offset is not None else estimate_rank(score)
+        return entries, max(estimate_total(), page_offset + len(entries)), page_offset
+    return _guarded_page(read)
+
+def _guarded_page(read):
+    """Run a Postgres page read within the fallback concurrency limit"""
+    if not _db_slots.acquire(timeout=Config.FALLBACK_DB_WAIT_SECONDS):
+        return None
+    try:
+        entries, total, *page_offset = read()
+        db.session.commit()
+        return (*page_offset, entries, total, Snapshot(entries, total, 'database'))
+    except exc.SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error reading fallback leaderboard page: {str(e)}")
+        return None
+    finally:
+        _db_slots.release()
@@ -0,0 +1,201 @@
+"""
+Idempotent submissions
+
+Clients retry submissions on timeouts. Without deduplication each retry adds a
+row, a leaderboard entry and a slot check at the moment the system is slowest.
+The @idempotent decorator keys a request by its client (the rate limit key)
+and its Idempotency-Key header, or a hash of its JSON body when the header is
+absent, and:
+- claims the key with an in-flight marker (SET NX PX) and runs the view
+- stores a 2xx response under the key for Config.IDEMPOTENCY_TTL seconds
+  (Config.IDEMPOTENCY_BODY_TTL for body hashes, since a client may genuinely
+  submit the same metrics twice)
+- answers later duplicates from that record, without running the view
+- makes concurrent duplicates poll the key until the first request finishes,
+  then replays its response (409 with Retry-After if it takes too long)
+
+Any other response drops the marker so a retry runs again. Reusing an
+Idempotency-Key with a different body gets 422. Without Redis, requests run
+as if the decorator were not there.
+
+claim_async() and finish_async() do the same for the ASGI app (app.asgi),
+with the same keys and records, so retries are deduplicated whichever server
+handles them.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+from flask import current_app, jsonify, request
+import redis
+from app import limiter, logger
+from app.encoding import decode_record_body, encode_record_body
+from app.metrics import metrics
+from app.redis_client import get_async_script, get_redis_client, get_script, record_redis_error
+from config import Config
+
+IDEMPOTENCY_PREFIX = 'idempotency:'
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+CONFLICT_ERROR = f'{HEADER} was already used with a different request body'
+IN_PROGRESS_ERROR = 'A request with this key is still in progress'
+
+# Drop the in-flight marker only if this request still owns it
+RELEASE_SCRIPT = """
+local record = redis.call('GET', KEYS[1])
+if record and cjson.decode(record)['token'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def body_fingerprint(data, raw):
+    """Hash of a request body; JSON is canonicalised so key order and whitespace don't matter"""
+    if data is not None:
+        raw = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+def request_key(endpoint, client_key, header, fingerprint):
+    """
+    Redis key for a request, scoped to the endpoint and to the client, so one
+    client's key or body never replays another client's response
+    """
+    if header:
+        return f"{IDEMPOTENCY_PREFIX}{endpoint}:{client_key}:key:{hashlib.sha256(header.encode()).hexdigest()}"
+    return f"{IDEMPOTENCY_PREFIX}{endpoint}:{client_key}:body:{fingerprint}"
+
+def invalid_header(header):
+    """Error message for an unusable Idempotency-Key header, or None"""
+    if header is not None and not 0 < len(header) <= MAX_KEY_LENGTH:
+        return f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'
+    return None
+
+def _marker(token, fingerprint):
+    return json.dumps({'token': token, 'fingerprint': fingerprint})
+
+def stored_response(fingerprint, status, mimetype, body):
+    """The record kept for a 2xx response (body as str or bytes)"""
+    return json.dumps({
+        'fingerprint': fingerprint, 'status': status, 'mimetype': mimetype, 'body': encode_record_body(body)
+    })
+
+def record_ttl(header):
+    return Config.IDEMPOTENCY_TTL if header else Config.IDEMPOTENCY_BODY_TTL
+
+def _state(raw, fingerprint):
+    """
+    Classify what is stored under a key as tuple (state, record), state being
+    'free', 'conflict' (another body), 'done' (a stored response) or 'in_flight'
+    """
+    if raw is None:
+        return 'free', None
+    record = json.loads(raw)
+    if record['fingerprint'] != fingerprint:
+        return 'conflict', record
+    return ('done' if 'status' in record else 'in_flight'), record
+
+def _replay(record):
+    response = current_app.response_class(
+        decode_record_body(record['body']), status=record['status'], mimetype=record['mimetype']
+    )
+    response.headers[REPLAYED_HEADER] = 'true'
+    metrics.inc('idempotent_replays_total', endpoint=request.endpoint)
+    return response
+
+def _resolve(client, key, fingerprint):
+    """
+    Wait for an existing record to hold a response; returns the response to send,
+    or None once the key is free again
+    """
+    deadline = time.monotonic() + Config.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        state, record = _state(client.get(key), fingerprint)
+        if state == 'free':
+            return None
+        if state == 'conflict':
+            return jsonify({'error': CONFLICT_ERROR}), 422
+        if state == 'done':
+            return _replay(record)
+        if time.monotonic() >= deadline:
+            response = jsonify({'error': IN_PROGRESS_ERROR})
+            response.headers['Retry-After'] = str(max(1, int(Config.IDEMPOTENCY_WAIT_SECONDS)))
+            return response, 409
+        time.sleep(POLL_INTERVAL)
+
+async def claim_async(client, key, fingerprint):
+    """
+    The decorator's claim for the ASGI app, on a redis.asyncio client
+    Returns tuple (token, None) once this request owns the key, or (None, (state, record))
+    with state 'conflict', 'done' or 'timeout'. Raises redis.RedisError.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + Config.IDEMPOTENCY_WAIT_SECONDS
+    while not await client.set(key, _marker(token, fingerprint), nx=True, px=Config.IDEMPOTENCY_LOCK_TTL * 1000):
+        while True:
+            state, record = _state(await client.get(key), fingerprint)
+            if state == 'free':
+                break
+            if state != 'in_flight':
+                return None, (state, record)
+            if time.monotonic() >= deadline:
+                return None, ('timeout', None)
+            await asyncio.sleep(POLL_INTERVAL)
+    return token, None
+
+async def finish_async(client, key, token, record, ttl):
+    """Store `record` (from stored_response()) for a 2xx response, or free the key when it is None"""
+    try:
+        if record is not None:
+            await client.set(key, record, ex=ttl)
+        else:
+            await get_async_script(client, RELEASE_SCRIPT)(keys=[key], args=[token])
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Failed to record idempotent response: {str(e)}")
+
+def idempotent(f):
+    """Decorator deduplicating retries of a view (see module docstring)"""
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        header = request.headers.get(HEADER)
+        error = invalid_header(header)
+        if error:
+            return jsonify({'error': error}), 400
+        client = get_redis_client()
+        if not client:
+            return f(*args, **kwargs)
+
+        fingerprint = body_fingerprint(request.get_json(silent=True), request.get_data())
+        key = request_key(request.endpoint, limiter.key_func(), header, fingerprint)
+        token = uuid.uuid4().hex
+        marker = _marker(token, fingerprint)
+        try:
+            while not client.set(key, marker, nx=True, px=Config.IDEMPOTENCY_LOCK_TTL * 1000):
+                result = _resolve(client, key, fingerprint)
+                if result is not None:
+                    return result
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.warning(f"Idempotency check unavailable: {str(e)}")
+            return f(*args, **kwargs)
+
+        response = None
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+            return response
+        finally:
+            try:
+                if response is not None and 200 <= response.status_code < 300:
+                    client.set(key, stored_response(
+                        fingerprint, response.status_code, response.mimetype, response.get_data()
+                    ), ex=record_ttl(header))
+                else:
+                    get_script(RELEASE_SCRIPT)(keys=[key], args=[token])
+            except redis.RedisError as e:
+                record_redis_error(e)
+                logger.error(f"Failed to record idempotent response: {str(e)}")
+    return wrapped
@@ -0,0 +1,240 @@
+"""
+Write-behind submission ingestion through a Redis Stream
+
+With Config.ASYNC_INGEST enabled, the submit endpoints validate and score a
+submission, append it to the ingest stream and answer 202 with a provisional
+id. A separate worker process drains the stream in batches through a consumer
+group (at-least-once delivery), bulk-inserts into submissions and updates the
+leaderboard and slot. Inserts are keyed by the provisional id with
+ON CONFLICT DO NOTHING, so redelivered entries are written only once.
+
+Redis and database errors leave a batch pending, to be retried. Any other
+error while writing one is narrowed down to the entry causing it, which is
+moved to the dead-letter stream (DEAD_LETTER_KEY) with the error, so it
+cannot hold up the entries behind it.
+
+Run a worker with:
+    python -m app.ingest
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import uuid
+from datetime import datetime
+import redis
+from sqlalchemy import select, exc
+from app import create_app, db, logger
+from app.metrics import metrics
+from app.models import Submission
+from app.redis_client import get_redis_client, record_redis_error, update_leaderboard_bulk
+from app.slots import allocate_slot
+from app.stats import metric_columns, record_submissions
+from config import Config
+
+STREAM_KEY = 'submissions:ingest'
+DEAD_LETTER_KEY = 'submissions:ingest:dead'
+DEAD_LETTER_MAXLEN = 10000  # Approximate cap on dead-lettered entries kept
+GROUP = 'submission-writers'
+
+def enqueue_submissions(items, score_version=1):
+    """
+    Append scored submissions to the ingest stream in one round trip
+    Takes (metrics, score, timestamp) tuples scored with profile score_version;
+    returns their provisional ids in the same order, or None if Redis is unavailable
+    """
+    client = get_redis_client()
+    if not client:
+        return None
+
+    ingest_ids = [uuid.uuid4().hex for _ in items]
+    try:
+        pipe = client.pipeline(transaction=False)
+        for ingest_id, (data, score, timestamp) in zip(ingest_ids, items):
+            pipe.xadd(STREAM_KEY, {
+                'ingest_id': ingest_id,
+                'metrics': json.dumps(data),
+                'score': repr(score),
+                'score_version': score_version,
+                'timestamp': timestamp.isoformat()
+            })
+        pipe.execute()
+        return ingest_ids
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error queueing submissions: {str(e)}")
+        return None
+
+def _insert(table):
+    """Dialect-specific INSERT supporting ON CONFLICT DO NOTHING"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def write_submissions(rows):
+    """
+    Idempotently insert submission rows carrying an ingest_id, then update the
+    leaderboard and slot for them
+    Returns a mapping of ingest_id to submission id
+    """
+    # A redelivered entry may share a batch with its original
+    rows = list({row['ingest_id']: {**row, **metric_columns(row['metrics'])} for row in rows}.values())
+
+    inserted = set(db.session.scalars(
+        _insert(Submission).values(rows).on_conflict_do_nothing(index_elements=['ingest_id'])
+        .returning(Submission.ingest_id)
+    ))
+    # Only rows inserted now are counted: a replayed entry was counted with its original
+    record_submissions(row for row in rows if row['ingest_id'] in inserted)
+    ingest_ids = [row['ingest_id'] for row in rows]
+    submission_ids = dict(db.session.execute(
+        select(Submission.ingest_id, Submission.id).where(Submission.ingest_id.in_(ingest_ids))
+    ).all())
+    db.session.commit()
+
+    # ZADD is idempotent, so replays simply rewrite the same scores
+    leader = update_leaderboard_bulk(
+        [(submission_ids[row['ingest_id']], row['score']) for row in rows],
+        [row['metrics'] for row in rows],
+        [row['timestamp'] for row in rows]
+    )
+    if not leader:
+        logger.error(f"Failed to update leaderboard for {len(rows)} ingested submissions")
+    elif leader[0] in set(submission_ids.values()):
+        allocate_slot(leader[0])
+    return submission_ids
+
+def lookup_ingested(ingest_id):
+    """Return (submission_id, score) once a queued submission is stored, else None"""
+    row = db.session.execute(
+        select(Submission.id, Submission.score).where(Submission.ingest_id == ingest_id)
+    ).first()
+    return tuple(row) if row else None
+
+class IngestWorker:
+    """Drain the ingest stream into Postgres in batches"""
+    def __init__(self, app, consumer=None, batch_size=None, block_ms=1000, claim_idle_ms=None):
+        self.app = app
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms or Config.INGEST_CLAIM_IDLE_MS
+        self.stopping = threading.Event()
+        self.written = 0
+
+    def ensure_group(self, client):
+        try:
+            # Start from the beginning so entries queued before the group existed are kept
+            client.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read_batch(self, client):
+        """Entries abandoned by dead consumers first, then new ones"""
+        _, claimed, *_ = client.xautoclaim(
+            STREAM_KEY, GROUP, self.consumer, self.claim_idle_ms, '0-0', count=self.batch_size
+        )
+        if claimed:
+            return claimed
+
+        reply = client.xreadgroup(
+            GROUP, self.consumer, {STREAM_KEY: '>'}, count=self.batch_size, block=self.block_ms
+        )
+        return reply[0][1] if reply else []
+
+    def process(self, client, entries):
+        """Write a batch and acknowledge it, dead-lettering any entry that cannot be written"""
+        try:
+            self._write(client, entries)
+        except (redis.RedisError, exc.SQLAlchemyError):
+            raise
+        except Exception as e:
+            db.session.rollback()
+            if len(entries) == 1:
+                self.dead_letter(client, entries[0], e)
+                return
+            logger.warning(f"Writing {len(entries)} ingest entries one at a time after: {str(e)}")
+            for entry in entries:
+                self.process(client, [entry])
+
+    def dead_letter(self, client, entry, error):
+        message_id, fields = entry
+        logger.error(f"Dead-lettering ingest entry {message_id}: {str(error)}")
+        pipe = client.pipeline()
+        pipe.xadd(DEAD_LETTER_KEY, {**fields, 'message_id': message_id, 'error': str(error)},
+                  maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+        pipe.xack(STREAM_KEY, GROUP, message_id)
+        pipe.xdel(STREAM_KEY, message_id)
+        pipe.execute()
+        metrics.inc('ingest_dead_letters_total')
+
+    def _write(self, client, entries):
+        rows = []
+        for _, fields in entries:
+            try:
+                rows.append({
+                    'ingest_id': fields['ingest_id'],
+                    'metrics': json.loads(fields['metrics']),
+                    'score': float(fields['score']),
+                    'score_version': int(fields.get('score_version', 1)),
+                    'timestamp': datetime.fromisoformat(fields['timestamp']),
+                    'slot_allocated': False
+                })
+            except (KeyError, TypeError, ValueError) as e:
+                # Acknowledged below and dropped, so one bad entry cannot block the stream
+                logger.error(f"Dropping malformed ingest entry {fields}: {str(e)}")
+
+        if rows:
+            write_submissions(rows)
+
+        message_ids = [message_id for message_id, _ in entries]
+        pipe = client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP, *message_ids)
+        pipe.xdel(STREAM_KEY, *message_ids)
+        pipe.execute()
+        self.written += len(rows)
+        logger.info(f"Ingested {len(rows)} submissions ({self.written} total)")
+
+    def run(self):
+        logger.info(f"Ingest worker {self.consumer} starting")
+        metrics.start_flusher()
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                client = get_redis_client()
+                if not client:
+                    self.stopping.wait(1)
+                    continue
+
+                try:
+                    self.ensure_group(client)
+                    entries = self.read_batch(client)
+                    if entries:
+                        self.process(client, entries)
+                except redis.RedisError as e:
+                    record_redis_error(e)
+                    logger.error(f"Redis error in ingest worker: {str(e)}")
+                    self.stopping.wait(1)
+                except exc.SQLAlchemyError as e:
+                    # Entries stay pending and are retried once claim_idle_ms passes
+                    db.session.rollback()
+                    logger.error(f"Database error in ingest worker: {str(e)}")
+                    self.stopping.wait(1)
+                except Exception:
+                    # Keep consuming: a dead worker would leave the stream growing unread
+                    db.session.rollback()
+                    logger.exception("Unexpected error in ingest worker")
+                    self.stopping.wait(1)
+        logger.info(f"Ingest worker {self.consumer} stopped after {self.written} submissions")
+
+    def stop(self, *_):
+        self.stopping.set()
+
+if __name__ == "__main__":
+    worker = IngestWorker(create_app())
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
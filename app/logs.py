@@ -0,0 +1,178 @@
+"""
+Non-blocking structured logging
+
+Application threads only put records on an in-process queue (QueueHandler);
+a QueueListener thread formats them as JSON lines and does the write, so a
+slow stderr or log shipper never stalls a request.
+
+- Every record carries the request's correlation id, taken from an incoming
+  X-Request-ID header or generated, and echoed back on the response.
+- Records below WARNING are sampled per request at Config.LOG_SAMPLE_RATE, so
+  a sampled request keeps its whole trail; warnings and errors are always kept.
+- Config.LOG_LEVEL sets the root level and Config.LOG_LEVELS overrides it per
+  logger, e.g. "app.routes=WARNING,sqlalchemy.engine=INFO".
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+from config import Config
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+_sampled_var = contextvars.ContextVar('log_sampled', default=None)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        record.request_id = getattr(record, 'request_id', None) or '-'
+        return super().format(record)
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that samples success-path records and stamps the correlation id
+    Formatting is left to the listener thread
+    """
+    def __init__(self, log_queue, sample_rate):
+        super().__init__(log_queue)
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            sampled = _sampled_var.get()
+            if sampled is None:
+                sampled = random.random() < self.sample_rate
+            if not sampled:
+                return False
+        record.request_id = request_id_var.get()
+        return super().filter(record)
+
+    def prepare(self, record):
+        # The queue never leaves the process, so only render %-style arguments
+        # now, before the objects they refer to can change
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+def parse_levels(spec):
+    """Parse "name=LEVEL,name=LEVEL" into {name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener = None
+_handler = None
+
+def configure_logging(level=None, levels=None, log_format=None, sample_rate=None, stream=None):
+    """(Re)configure the root logger; arguments default to Config"""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(TextFormatter() if (log_format or Config.LOG_FORMAT) == 'text' else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    rate = Config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    _handler = ContextQueueHandler(log_queue, rate)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root.addHandler(_handler)
+    root.setLevel(level or Config.LOG_LEVEL)
+    spec = Config.LOG_LEVELS if levels is None else levels
+    for name, logger_level in parse_levels(spec).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+def flush_logs():
+    """Wait until every queued record has been written"""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+def _restart_after_fork():
+    # The listener thread does not survive fork; give the child its own queue and thread
+    global _listener
+    if _listener is not None:
+        handlers = _listener.handlers
+        _handler.queue = queue.SimpleQueue()
+        _listener = QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+def begin_request(incoming):
+    """
+    Set the correlation id (from an incoming X-Request-ID if well formed) and
+    sampling decision for the current context; returns tuple (request_id, tokens)
+    """
+    request_id = incoming if incoming and REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    return request_id, (
+        request_id_var.set(request_id),
+        _sampled_var.set(random.random() < _handler.sample_rate if _handler else True)
+    )
+
+def end_request(tokens):
+    request_id_var.reset(tokens[0])
+    _sampled_var.reset(tokens[1])
+
+def init_app(app):
+    """Assign each request a correlation id and a sampling decision"""
+    def start_request_context():
+        g.request_id, g.log_context = begin_request(request.headers.get(REQUEST_ID_HEADER, ''))
+
+    def add_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    def end_request_context(_exc):
+        tokens = g.pop('log_context', None)
+        if tokens:
+            end_request(tokens)
+
+    app.before_request(start_request_context)
+    app.after_request(add_request_id)
+    app.teardown_request(end_request_context)
@@ -0,0 +1,325 @@
+"""
+Prometheus metrics aggregated across worker processes
+
+Each process records into in-memory counters and histograms (a dict update
+under a lock on the hot path). A background thread adds the accumulated deltas
+to a Redis hash every Config.METRICS_FLUSH_INTERVAL seconds, so /metrics
+reports totals for every worker and instance whichever process serves the
+scrape. Gauges (connection pool usage) are published per process with a short
+TTL and summed, or maxed, over the processes still reporting. If Redis is
+unavailable, /metrics falls back to the serving process's own numbers.
+
+Instrumented:
+- request latency per endpoint (Flask before/after_request)
+- SQL statement latency (SQLAlchemy cursor events)
+- connection pool checkout wait and saturation (InstrumentedQueuePool)
+- Redis command latency (InstrumentedRedis)
+- rate limiter rejections
+"""
+import atexit
+import os
+import socket
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from flask import g, request
+import redis
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from app import logger
+from config import Config
+
+# Upper bounds in seconds; a final +Inf bucket catches the rest
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (type, help, how gauges combine across processes)
+FAMILIES = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint', None),
+    'db_statement_duration_seconds': ('histogram', 'SQL statement latency by operation', None),
+    'db_pool_checkout_wait_seconds': ('histogram', 'Time spent waiting for a pooled database connection', None),
+    'db_pool_checkout_timeouts_total': ('counter', 'Checkouts that gave up after pool_timeout', None),
+    'db_pool_checked_out': ('gauge', 'Database connections currently checked out', 'sum'),
+    'db_pool_capacity': ('gauge', 'Database connections available (pool_size + max_overflow)', 'sum'),
+    'db_pool_saturation': ('gauge', 'Highest share of pool capacity in use by any process', 'max'),
+    'redis_command_duration_seconds': ('histogram', 'Redis command latency (pipelines count once)', None),
+    'redis_command_errors_total': ('counter', 'Redis commands that raised', None),
+    'ratelimit_rejections_total': ('counter', 'Requests rejected by the rate limiter by scope', None),
+    'idempotent_replays_total': ('counter', 'Duplicate submissions answered from a stored response', None),
+    'metrics_processes': ('gauge', 'Processes currently reporting metrics', 'sum'),
+}
+
+SERIES_KEY = 'metrics:series'
+PROCESSES_KEY = 'metrics:processes'
+GAUGES_KEY_PREFIX = 'metrics:gauges:'
+SEPARATOR = '\x1f'
+
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK'}
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items()))
+
+def _sample(name, labels, value):
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+class Metrics:
+    """Process-local metric buffers plus cross-process aggregation through Redis"""
+    def __init__(self):
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.pools = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flusher = None
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+        atexit.register(self.flush)
+
+    def _reset_after_fork(self):
+        # The parent's buffered deltas are flushed by the parent
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flusher = None
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        bucket = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (not cumulative), +Inf, then the sum
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += seconds
+
+    def _series(self, counters, histograms):
+        """Flatten buffered metrics into {field: value} for the Redis series hash"""
+        series = {}
+        for (name, labels), value in counters.items():
+            series[SEPARATOR.join((name, labels, 'value'))] = value
+        for (name, labels), histogram in histograms.items():
+            for bucket, count in enumerate(histogram[:-1]):
+                if count:
+                    series[SEPARATOR.join((name, labels, str(bucket)))] = count
+            series[SEPARATOR.join((name, labels, 'sum'))] = histogram[-1]
+        return series
+
+    def _gauges(self):
+        checked_out = sum(pool.checkedout() for pool in self.pools)
+        capacity = sum(pool.size() + max(pool._max_overflow, 0) for pool in self.pools)
+        return {
+            'db_pool_checked_out': checked_out,
+            'db_pool_capacity': capacity,
+            'db_pool_saturation': checked_out / capacity if capacity else 0.0,
+            'metrics_processes': 1,
+        }
+
+    def _drain(self):
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        return counters, histograms
+
+    def _restore(self, counters, histograms):
+        """Put deltas back after a failed flush so they go out with the next one"""
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, histogram in histograms.items():
+                current = self._histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+                for i, value in enumerate(histogram):
+                    current[i] += value
+
+    def flush(self):
+        """Add this process's deltas to the shared series and publish its gauges"""
+        from app.redis_client import get_redis_client, record_redis_error
+        client = get_redis_client()
+        if not client:
+            return False
+
+        counters, histograms = self._drain()
+        gauges_ttl = max(1, int(Config.METRICS_FLUSH_INTERVAL * 3))
+        try:
+            pipe = client.pipeline(transaction=False)
+            for field, value in self._series(counters, histograms).items():
+                pipe.hincrbyfloat(SERIES_KEY, field, value)
+            gauges_key = GAUGES_KEY_PREFIX + self.process_id
+            pipe.hset(gauges_key, mapping=self._gauges())
+            pipe.expire(gauges_key, gauges_ttl)
+            pipe.zadd(PROCESSES_KEY, {self.process_id: time.time()})
+            pipe.execute()
+            return True
+        except redis.RedisError as e:
+            record_redis_error(e)
+            self._restore(counters, histograms)
+            logger.error(f"Redis error flushing metrics: {str(e)}")
+            return False
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(Config.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing metrics: {str(e)}")
+
+    def start_flusher(self):
+        """Start this process's background flusher (first call only)"""
+        if self._flusher is None and Config.METRICS_FLUSH_INTERVAL > 0:
+            self._flusher = threading.Thread(target=self._flush_forever, name='metrics-flusher', daemon=True)
+            self._flusher.start()
+
+    def collect(self):
+        """
+        Return (series, gauges) for the whole deployment, or for this process
+        alone if Redis is unavailable. gauges maps a name to per-process values.
+        """
+        from app.redis_client import get_redis_client, record_redis_error
+        client = get_redis_client()
+        if client and self.flush():
+            try:
+                live_after = time.time() - Config.METRICS_FLUSH_INTERVAL * 3
+                pipe = client.pipeline(transaction=False)
+                pipe.hgetall(SERIES_KEY)
+                pipe.zremrangebyscore(PROCESSES_KEY, '-inf', live_after)
+                pipe.zrange(PROCESSES_KEY, 0, -1)
+                series, _, processes = pipe.execute()
+
+                pipe = client.pipeline(transaction=False)
+                for process_id in processes:
+                    pipe.hgetall(GAUGES_KEY_PREFIX + process_id)
+                gauges = {}
+                for values in pipe.execute():
+                    for name, value in values.items():
+                        gauges.setdefault(name, []).append(float(value))
+                return {field: float(value) for field, value in series.items()}, gauges
+            except redis.RedisError as e:
+                record_redis_error(e)
+                logger.error(f"Redis error collecting metrics: {str(e)}")
+
+        with self._lock:
+            series = self._series(self._counters, self._histograms)
+        return series, {name: [value] for name, value in self._gauges().items()}
+
+    def render(self):
+        """Prometheus text exposition (format 0.0.4) of collect()"""
+        series, gauges = self.collect()
+        grouped = {}
+        for field, value in series.items():
+            name, labels, slot = field.split(SEPARATOR)
+            grouped.setdefault(name, {}).setdefault(labels, {})[slot] = value
+
+        lines = []
+        for name, (kind, help_text, combine) in FAMILIES.items():
+            if kind == 'gauge':
+                if name not in gauges:
+                    continue
+                values = gauges[name]
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge",
+                          f"{name} {max(values) if combine == 'max' else sum(values):g}"]
+                continue
+
+            if name not in grouped:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, slots in sorted(grouped[name].items()):
+                if kind == 'counter':
+                    lines.append(_sample(name, labels, f"{slots.get('value', 0):g}"))
+                    continue
+                prefix = f"{labels}," if labels else ''
+                cumulative = 0
+                for bucket, bound in enumerate(BUCKETS + ('+Inf',)):
+                    cumulative += slots.get(str(bucket), 0)
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative:g}')
+                lines.append(_sample(f"{name}_sum", labels, f"{slots.get('sum', 0):.6f}"))
+                lines.append(_sample(f"{name}_count", labels, f"{cumulative:g}"))
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+    # Log under SQLAlchemy's own pool logger rather than this module's
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.pools.add(self)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.inc('db_pool_checkout_timeouts_total')
+            raise
+        finally:
+            metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - started)
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that times every command and pipeline"""
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except redis.RedisError:
+            metrics.inc('redis_command_errors_total', command=str(args[0]).upper())
+            raise
+        finally:
+            metrics.observe('redis_command_duration_seconds', time.perf_counter() - started,
+                            command=str(args[0]).upper())
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        command = 'MULTI' if self.transaction else 'PIPELINE'
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except redis.RedisError:
+            metrics.inc('redis_command_errors_total', command=command)
+            raise
+        finally:
+            metrics.observe('redis_command_duration_seconds', time.perf_counter() - started, command=command)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        metrics.observe('db_statement_duration_seconds', time.perf_counter() - started,
+                        operation=operation if operation in SQL_OPERATIONS else 'OTHER')
+
+def init_app(app):
+    """Time every request and start the flusher in each serving process"""
+    def start_timer():
+        metrics.start_flusher()
+        g.metrics_started = time.perf_counter()
+
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                            method=request.method, endpoint=request.endpoint or 'unmatched',
+                            status=response.status_code)
+        return response
+
+    app.before_request(start_timer)
+    app.after_request(record_request)
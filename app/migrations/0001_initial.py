@@ -0,0 +1,28 @@
+"""Baseline schema: users and submissions as originally created by db.create_all()"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Float, Boolean, JSON, ForeignKey
+
+metadata = MetaData()
+
+users = Table(
+    'users', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(64), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password_hash', String(256)),
+    Column('created_at', DateTime),
+    Column('last_submission', DateTime)
+)
+
+submissions = Table(
+    'submissions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=True),
+    Column('metrics', JSON, nullable=False),
+    Column('score', Float),
+    Column('timestamp', DateTime),
+    Column('slot_allocated', Boolean)
+)
+
+def upgrade(connection):
+    # checkfirst keeps this a no-op on databases created before migrations existed
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,31 @@
+"""
+Indexes for the submissions hot queries
+
+- slot history: partial index on timestamp, only over rows that held the slot
+- fallback ranking: score descending
+- per-user history: (user_id, timestamp)
+
+On PostgreSQL the indexes are built CONCURRENTLY so an existing, large
+submissions table keeps accepting writes while they build. A build that fails
+leaves an INVALID index behind; a re-run drops it and builds it again.
+"""
+from sqlalchemy import text
+from app.migrations import drop_invalid_index
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    ('ix_submissions_slot_timestamp', '(timestamp) WHERE slot_allocated'),
+    ('ix_submissions_score_desc', '(score DESC)'),
+    ('ix_submissions_user_timestamp', '(user_id, timestamp)'),
+]
+
+def upgrade(connection):
+    is_postgres = connection.dialect.name == 'postgresql'
+    concurrently = 'CONCURRENTLY ' if is_postgres else ''
+    for name, definition in INDEXES:
+        if is_postgres:
+            drop_invalid_index(connection, name)
+        connection.execute(text(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS {name} ON submissions {definition}'
+        ))
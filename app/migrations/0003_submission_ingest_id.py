@@ -0,0 +1,29 @@
+"""
+Idempotency key for write-behind ingestion
+
+Submissions queued on the ingest stream carry a provisional ingest_id. The
+unique index lets the stream worker insert with ON CONFLICT DO NOTHING, so a
+redelivered stream entry never creates a second row.
+
+Not transactional, so every step tolerates a re-run after a failure part way:
+the column is only added if missing, and an INVALID index left by a failed
+concurrent build is dropped before building it again.
+"""
+from sqlalchemy import inspect, text
+from app.migrations import drop_invalid_index
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE submissions ADD COLUMN IF NOT EXISTS ingest_id VARCHAR(32)'))
+        drop_invalid_index(connection, 'ix_submissions_ingest_id')
+        concurrently = 'CONCURRENTLY '
+    else:
+        # SQLite has no ADD COLUMN IF NOT EXISTS
+        if 'ingest_id' not in {column['name'] for column in inspect(connection).get_columns('submissions')}:
+            connection.execute(text('ALTER TABLE submissions ADD COLUMN ingest_id VARCHAR(32)'))
+        concurrently = ''
+    connection.execute(text(
+        f'CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS ix_submissions_ingest_id ON submissions (ingest_id)'
+    ))
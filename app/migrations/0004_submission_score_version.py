@@ -0,0 +1,13 @@
+"""
+Record which scoring profile produced each submission's score
+
+Existing rows were all scored with profile 1. On PostgreSQL 11+ adding a
+column with a constant default is a catalog-only change, so this does not
+rewrite the table.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text(
+        'ALTER TABLE submissions ADD COLUMN score_version INTEGER NOT NULL DEFAULT 1'
+    ))
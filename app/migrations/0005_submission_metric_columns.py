@@ -0,0 +1,35 @@
+"""
+Typed metric columns and the submission_histograms summary table
+
+The five metrics get nullable DOUBLE PRECISION columns next to the JSON blob.
+Adding a nullable column without a default is a catalog-only change, so this
+does not rewrite the table; 0006 fills the columns for existing rows.
+submission_histograms holds the bucket counts and sums GET /stats reads (see
+app.stats).
+
+Every step tolerates a re-run after a failure part way: columns are only added
+if missing, as in 0003.
+"""
+from sqlalchemy import inspect, text
+
+METRIC_COLUMNS = ('gpu_utilization', 'memory_usage', 'power_efficiency', 'completion_time', 'accuracy')
+
+def upgrade(connection):
+    if connection.dialect.name == 'postgresql':
+        for name in METRIC_COLUMNS:
+            connection.execute(text(f'ALTER TABLE submissions ADD COLUMN IF NOT EXISTS {name} DOUBLE PRECISION'))
+    else:
+        # SQLite has no ADD COLUMN IF NOT EXISTS
+        existing = {column['name'] for column in inspect(connection).get_columns('submissions')}
+        for name in METRIC_COLUMNS:
+            if name not in existing:
+                connection.execute(text(f'ALTER TABLE submissions ADD COLUMN {name} DOUBLE PRECISION'))
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS submission_histograms ('
+        'field VARCHAR(32) NOT NULL, '
+        'bucket INTEGER NOT NULL, '
+        'shard SMALLINT NOT NULL, '
+        'count BIGINT NOT NULL DEFAULT 0, '
+        'total DOUBLE PRECISION NOT NULL DEFAULT 0, '
+        'PRIMARY KEY (field, bucket, shard))'
+    ))
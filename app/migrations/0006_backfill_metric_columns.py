@@ -0,0 +1,80 @@
+"""
+Backfill the typed metric columns and the submission statistics
+
+Walks submissions whose metric columns are all NULL in primary-key order,
+Config.BACKFILL_CHUNK_SIZE rows at a time. Each chunk is one short
+transaction: read the ids, scores and JSON metrics, write the five columns
+back, and add the rows to submission_histograms (app.stats). A row is counted
+in the same transaction that fills its columns, and rows written by the new
+code already have them, so an interrupted or repeated run never counts a row
+twice. Run it again after a rolling deploy to pick up rows that old workers
+wrote meanwhile:
+    python -m app.migrations.0006_backfill_metric_columns
+"""
+from sqlalchemy import JSON, Float, Integer, bindparam, column, select, table, text, update
+from app import logger
+from app.stats import histogram_deltas, metric_columns, summary_upsert
+from config import Config
+
+TRANSACTIONAL = False
+
+METRIC_COLUMNS = ('gpu_utilization', 'memory_usage', 'power_efficiency', 'completion_time', 'accuracy')
+
+submissions = table(
+    'submissions',
+    column('id', Integer), column('metrics', JSON), column('score', Float),
+    *(column(name, Float) for name in METRIC_COLUMNS)
+)
+
+def _write_columns(connection, values):
+    """Bulk-write the metric columns of a chunk"""
+    if connection.dialect.name == 'postgresql':
+        # One statement per chunk: the values arrive as one array per column
+        assignments = ', '.join(f'{name} = v.{name}' for name in METRIC_COLUMNS)
+        arrays = ', '.join(f'CAST(:{name} AS double precision[])' for name in METRIC_COLUMNS)
+        connection.execute(
+            text(
+                f'UPDATE submissions AS s SET {assignments} '
+                f'FROM unnest(CAST(:ids AS bigint[]), {arrays}) AS v(id, {", ".join(METRIC_COLUMNS)}) '
+                'WHERE s.id = v.id'
+            ),
+            {'ids': [row['id'] for row in values], **{name: [row[name] for row in values] for name in METRIC_COLUMNS}}
+        )
+    else:
+        connection.execute(
+            update(submissions)
+            .where(submissions.c.id == bindparam('row_id'))
+            .values({name: bindparam(f'new_{name}') for name in METRIC_COLUMNS}),
+            [{'row_id': row['id'], **{f'new_{name}': row[name] for name in METRIC_COLUMNS}} for row in values]
+        )
+
+def upgrade(connection):
+    unfilled = [submissions.c[name].is_(None) for name in METRIC_COLUMNS]
+    last_id, filled = 0, 0
+    while True:
+        with connection.engine.begin() as conn:
+            rows = conn.execute(
+                select(submissions.c.id, submissions.c.score, submissions.c.metrics)
+                .where(submissions.c.id > last_id, *unfilled)
+                .order_by(submissions.c.id)
+                .limit(Config.BACKFILL_CHUNK_SIZE)
+            ).all()
+            if not rows:
+                break
+
+            values = [{'id': row.id, 'score': row.score, **metric_columns(row.metrics)} for row in rows]
+            # Rows without any numeric metric stay unfilled and uncounted
+            values = [value for value in values if any(value[name] is not None for name in METRIC_COLUMNS)]
+            if values:
+                _write_columns(conn, values)
+                conn.execute(summary_upsert(conn.dialect.name, histogram_deltas(values)))
+
+        last_id = rows[-1].id
+        filled += len(values)
+        logger.info(f"Backfilled metric columns of {filled} submissions, up to id {last_id}")
+
+if __name__ == "__main__":
+    # Re-run outside the migration table, after old workers have stopped
+    from app import create_app, db
+    with create_app().app_context(), db.engine.connect() as connection:
+        upgrade(connection)
@@ -0,0 +1,110 @@
+"""
+Versioned schema migrations
+
+Each module in this package named NNNN_description.py is one migration. It
+defines upgrade(connection) and may set TRANSACTIONAL = False for statements
+that cannot run inside a transaction (e.g. CREATE INDEX CONCURRENTLY).
+Applied versions are recorded in the schema_migrations table, and on
+PostgreSQL an advisory lock keeps concurrent workers from racing each other.
+
+Run pending migrations with:
+    python -m app.migrations
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, String, DateTime, select, text
+from app import logger
+
+# Arbitrary constant identifying the migration lock in pg_advisory_lock
+ADVISORY_LOCK_ID = 72_410_001
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', String(255), primary_key=True),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+def available_migrations():
+    """Return migration module names in the order they must be applied"""
+    return sorted(
+        info.name for info in pkgutil.iter_modules(__path__)
+        if info.name[:4].isdigit()
+    )
+
+def applied_migrations(engine):
+    """Return the set of migration versions already applied"""
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return set(conn.scalars(select(schema_migrations.c.version)))
+
+_migrated_engines = set()
+
+def pending_migrations(engine):
+    """
+    Return the versions not yet applied, in order
+    Once an engine's schema is current it stays current, so later calls skip the query
+    """
+    if engine.url in _migrated_engines:
+        return []
+    applied = applied_migrations(engine)
+    pending = [version for version in available_migrations() if version not in applied]
+    if not pending:
+        _migrated_engines.add(engine.url)
+    return pending
+
+def upgrade(engine, target=None):
+    """
+    Apply pending migrations up to and including `target` (default: all)
+    `target` may be a full version name or just its NNNN prefix
+    Returns the list of versions applied by this call
+    """
+    is_postgres = engine.dialect.name == 'postgresql'
+    applied_now = []
+
+    with engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text('SELECT pg_advisory_lock(:id)'), {'id': ADVISORY_LOCK_ID})
+            lock_conn.commit()
+        try:
+            applied = applied_migrations(engine)
+            for version in available_migrations():
+                if version in applied:
+                    continue
+                if target is not None and version[:4] > target[:4]:
+                    break
+
+                module = importlib.import_module(f'{__name__}.{version}')
+                logger.info(f"Applying migration {version}")
+                if getattr(module, 'TRANSACTIONAL', True):
+                    with engine.begin() as conn:
+                        module.upgrade(conn)
+                        conn.execute(schema_migrations.insert().values(
+                            version=version, applied_at=datetime.utcnow()))
+                else:
+                    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        module.upgrade(conn)
+                        conn.execute(schema_migrations.insert().values(
+                            version=version, applied_at=datetime.utcnow()))
+                applied_now.append(version)
+        finally:
+            if is_postgres:
+                lock_conn.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': ADVISORY_LOCK_ID})
+                lock_conn.commit()
+
+    if applied_now:
+        logger.info(f"Applied {len(applied_now)} migration(s): {', '.join(applied_now)}")
+    return applied_now
+
+def drop_invalid_index(connection, name):
+    """
+    Drop index `name` if an interrupted CREATE INDEX CONCURRENTLY left it INVALID (PostgreSQL)
+    CREATE INDEX IF NOT EXISTS would otherwise take the unusable index as built
+    """
+    invalid = connection.scalar(text(
+        'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+        'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+    ), {'name': name})
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
@@ -0,0 +1,9 @@
+from app import create_app, db, logger
+from app.migrations import upgrade, available_migrations, applied_migrations
+
+if __name__ == "__main__":
+    with create_app().app_context():
+        upgrade(db.engine)
+        applied = applied_migrations(db.engine)
+        for version in available_migrations():
+            logger.info(f"{'[x]' if version in applied else '[ ]'} {version}")
@@ -19,6 +19,9 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Metrics also stored as typed columns, for SQL aggregates (see app.stats)
+METRIC_COLUMNS = ('gpu_utilization', 'memory_usage', 'power_efficiency', 'completion_time', 'accuracy')
+
 class Submission(db.Model):
     __tablename__ = 'submissions'
 
@@ -27,4 +30,22 @@ class Submission(db.Model):
     metrics = db.Column(db.JSON, nullable=False)
     score = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    slot_allocated = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    slot_allocated = db.Column(db.Boolean, default=False)
+    ingest_id = db.Column(db.String(32), unique=True, nullable=True)  # Provisional id from async ingestion
+    score_version = db.Column(db.Integer, nullable=False, default=1)  # Scoring profile that produced score
+    # Copies of the numeric values in metrics; NULL until migration 0006 backfills older rows
+    gpu_utilization = db.Column(db.Float)
+    memory_usage = db.Column(db.Float)
+    power_efficiency = db.Column(db.Float)
+    completion_time = db.Column(db.Float)
+    accuracy = db.Column(db.Float)
+
+class SubmissionHistogram(db.Model):
+    """Summary of submissions: how many values of a field fall in a bucket, and their sum (see app.stats)"""
+    __tablename__ = 'submission_histograms'
+
+    field = db.Column(db.String(32), primary_key=True)  # 'score' or a metric column
+    bucket = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)  # Spreads concurrent writers over rows
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
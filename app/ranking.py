@@ -0,0 +1,139 @@
+"""
+Leaderboard ranks beyond the Redis top K
+
+With Config.LEADERBOARD_TOP_K set, Redis only holds the best K submissions.
+Pages and ranks below that are answered from Postgres: pages walk the
+ix_submissions_score_desc index, and ranks are estimated from the planner's
+statistics for submissions.score (pg_stats histogram and most common values)
+instead of counting every higher-scoring row.
+
+Redis orders equal scores by member, i.e. by the submission id as a string
+compared bytewise. Postgres breaks ties the same way, so the entries on
+either side of rank K line up with the zset.
+"""
+from bisect import bisect_right
+from sqlalchemy import String, and_, cast, func, or_, select, text
+from app import db
+from app.models import Submission
+from config import Config
+
+SCORE_STATS_QUERY = text(
+    "SELECT null_frac, "
+    "       most_common_vals::text::float8[] AS common_values, most_common_freqs AS common_freqs, "
+    "       histogram_bounds::text::float8[] AS bounds "
+    "FROM pg_stats "
+    "WHERE schemaname = current_schema() AND tablename = 'submissions' AND attname = 'score'"
+)
+
+def _member():
+    """Submission.id in the zset's tie order: as text, compared bytewise"""
+    member = cast(Submission.id, String)
+    # SQLite compares text bytewise already; Postgres needs the C collation for it
+    if db.engine.dialect.name == 'postgresql':
+        member = member.collate('C')
+    return member
+
+def _ranked():
+    return (
+        select(Submission.id, Submission.score)
+        .where(Submission.score.isnot(None))
+        .order_by(Submission.score.desc(), _member().desc())
+    )
+
+def fetch_overflow_page(limit, offset=0, after=None):
+    """
+    Leaderboard entries as (submission_id, score) straight from Postgres,
+    either at a rank offset or following the entry `after` = (submission_id, score)
+    """
+    query = _ranked().limit(limit)
+    if after:
+        submission_id, score = after
+        query = query.where(or_(
+            Submission.score < score,
+            and_(Submission.score == score, _member() < str(submission_id))
+        ))
+    else:
+        query = query.offset(offset)
+    return [tuple(row) for row in db.session.execute(query).all()]
+
+def estimate_total():
+    """Number of ranked submissions, from planner statistics on PostgreSQL"""
+    if db.engine.dialect.name == 'postgresql':
+        reltuples = db.session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'submissions'::regclass")
+        )
+        # -1 or 0 until the table has been analyzed
+        if reltuples and reltuples > 0:
+            return int(reltuples)
+    return db.session.scalar(
+        select(func.count()).select_from(Submission).where(Submission.score.isnot(None))
+    )
+
+def _fraction_above(stats, score):
+    """Estimated share of rows scoring above `score`, from a pg_stats row"""
+    above = sum(
+        freq for value, freq in zip(stats.common_values or [], stats.common_freqs or [])
+        if value > score
+    )
+    bounds = stats.bounds or []
+    if len(bounds) < 2:
+        return above
+
+    # The histogram splits the remaining rows into equally populated buckets
+    histogram_share = 1 - (stats.null_frac or 0) - sum(stats.common_freqs or [])
+    bucket = bisect_right(bounds, score) - 1
+    if bucket < 0:
+        below = 0.0
+    elif bucket >= len(bounds) - 1:
+        below = 1.0
+    else:
+        low, high = bounds[bucket], bounds[bucket + 1]
+        within = (score - low) / (high - low) if high > low else 1.0
+        below = (bucket + within) / (len(bounds) - 1)
+    return above + histogram_share * (1 - below)
+
+def estimate_rank(score):
+    """
+    1-based rank of a score that is not in the Redis top K
+    Estimated from pg_stats on PostgreSQL, counted exactly elsewhere or without statistics
+    """
+    rank = None
+    if db.engine.dialect.name == 'postgresql':
+        stats = db.session.execute(SCORE_STATS_QUERY).first()
+        if stats is not None:
+            rank = round(_fraction_above(stats, score) * estimate_total()) + 1
+    if rank is None:
+        rank = db.session.scalar(
+            select(func.count()).select_from(Submission).where(Submission.score > score)
+        ) + 1
+    return max(rank, Config.LEADERBOARD_TOP_K + 1)
+
+def estimate_submission_rank(submission_id, neighbours):
+    """
+    Approximate counterpart of get_submission_rank() for submissions outside the top K
+    Returns the same dict with approximate=True, or False if the submission has no score
+    """
+    score = db.session.scalar(select(Submission.score).where(Submission.id == submission_id))
+    if score is None:
+        return False
+
+    rank = estimate_rank(score)
+    above = db.session.execute(
+        select(Submission.id, Submission.score)
+        .where(or_(
+            Submission.score > score,
+            and_(Submission.score == score, _member() > str(submission_id))
+        ))
+        .order_by(Submission.score.asc(), _member().asc())
+        .limit(neighbours)
+    ).all()
+    below = fetch_overflow_page(neighbours, after=(submission_id, score))
+    around = [tuple(row) for row in reversed(above)] + [(submission_id, score)] + below
+    return {
+        'rank': rank - 1,
+        'score': score,
+        'total': max(estimate_total(), rank),
+        'neighbours_offset': rank - 1 - len(above),
+        'neighbours': around,
+        'approximate': True
+    }
@@ -0,0 +1,401 @@
+"""
+Cluster-wide rate limiting backed by Redis
+
+Every check is one atomic GCRA (generic cell rate algorithm) Lua script, so
+limits hold across gunicorn workers and autoscaled instances. A limit such as
+"10 per hour" admits a burst of 10 and then one request every 6 minutes.
+
+To skip the round trip for clients that are clearly under their limit, the
+script may reserve a small share of the remaining allowance for the calling
+process (Config.RATELIMIT_LOCAL_SHARE of it, for at most
+Config.RATELIMIT_LOCAL_TTL seconds), which then admits that many requests
+locally. The reservation is debited in the same atomic step, so however many
+processes hold one, together they never admit more than the limit. What a
+process leaves unused is given back on the key's next sync, or by a background
+thread soon after the reservation expires, so a client spread over many
+workers is not held back by reservations those workers no longer use. Clients
+near their limit always go to Redis.
+"""
+import atexit
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+from flask import current_app, g, jsonify, request
+import redis
+from app import logger
+from app.metrics import metrics
+from app.redis_client import get_async_script, get_redis_client, get_script, record_redis_error
+from config import Config
+
+# KEYS[1] = theoretical arrival time (ms), KEYS[2] = counters hash
+# ARGV = emission interval (ms), limit,
+#        requests admitted locally since the last call (already debited, only counted),
+#        reserved requests left unused (given back),
+#        requests to admit now (0 just settles the local allowance),
+#        share of the remaining allowance to reserve for local admission
+# Returns {admitted, remaining, retry after (ms), requests reserved}
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local emission = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local used = tonumber(ARGV[3])
+local unused = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+local share = tonumber(ARGV[6])
+local period = emission * limit
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+tat = math.max(tat - unused * emission, now)
+
+local allowed = 0
+local retry_after = 0
+if tat + cost * emission - now <= period then
+    allowed = cost
+    tat = tat + cost * emission
+else
+    retry_after = tat + cost * emission - period - now
+end
+
+local remaining = math.floor((period - (tat - now)) / emission)
+if remaining < 0 then
+    remaining = 0
+end
+local reserved = 0
+if cost > 0 and allowed == cost then
+    reserved = math.floor(remaining * share)
+    tat = tat + reserved * emission
+end
+
+if tat > now then
+    redis.call('SET', KEYS[1], string.format('%d', tat), 'PX', tat - now)
+end
+if used + allowed > 0 then
+    redis.call('HINCRBY', KEYS[2], 'allowed', used + allowed)
+end
+if allowed < cost then
+    redis.call('HINCRBY', KEYS[2], 'rejected', cost)
+end
+redis.call('PEXPIRE', KEYS[2], period)
+
+return {allowed == cost and 1 or 0, remaining, retry_after, reserved}
+"""
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+LIMIT_PATTERN = re.compile(r'^\s*(\d+)\s+per\s+(\d+\s+)?(second|minute|hour|day)s?\s*$')
+
+def get_remote_address():
+    """Rate limit key: the client's IP address"""
+    return request.remote_addr or '127.0.0.1'
+
+@dataclass(frozen=True)
+class RateLimit:
+    amount: int
+    period: int  # seconds
+    spec: str
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse limits written like "10 per hour" or "100 per 5 minutes" """
+        match = LIMIT_PATTERN.match(spec)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {spec!r}")
+        amount, multiplier, unit = match.groups()
+        return cls(int(amount), int(multiplier or 1) * PERIODS[unit], spec)
+
+    @property
+    def emission_ms(self):
+        return max(1, self.period * 1000 // self.amount)
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    retry_after: float  # seconds
+
+@dataclass
+class _LocalAllowance:
+    limit: RateLimit
+    allowance: int  # Reserved requests not admitted yet
+    used: int  # Reserved requests admitted, not yet counted in the Redis stats
+    remaining: int
+    expires_at: float
+
+def rejection_body(result):
+    return {'error': 'Rate limit exceeded', 'details': result.limit.spec}
+
+def rate_limit_headers(result):
+    """X-RateLimit-* (and Retry-After when rejected) headers describing a result"""
+    headers = {
+        'X-RateLimit-Limit': str(result.limit.amount),
+        'X-RateLimit-Remaining': str(max(0, result.remaining))
+    }
+    if not result.allowed:
+        headers['Retry-After'] = str(max(1, int(result.retry_after + 0.999)))
+    return headers
+
+class RedisRateLimiter:
+    """
+    Flask rate limiter with a flask-limiter style API
+
+    limiter = RedisRateLimiter(app, key_func=get_remote_address, default_limits=["200 per day"])
+
+    @app.route(...)
+    @limiter.limit("10 per hour")
+    def view(): ...
+
+    Default limits apply to every endpoint without its own limit. Each endpoint
+    keeps separate counters. If Redis is unavailable, requests are let through.
+    With enabled=False (Config.RATELIMIT_ENABLED) nothing is checked at all.
+    """
+    def __init__(self, app=None, key_func=None, default_limits=(),
+                 local_share=None, local_ttl=None, key_prefix='ratelimit', enabled=None):
+        self.enabled = Config.RATELIMIT_ENABLED if enabled is None else enabled
+        self.key_func = key_func or get_remote_address
+        self.default_limits = [RateLimit.parse(spec) for spec in default_limits]
+        self.local_share = Config.RATELIMIT_LOCAL_SHARE if local_share is None else local_share
+        self.local_ttl = Config.RATELIMIT_LOCAL_TTL if local_ttl is None else local_ttl
+        self.key_prefix = key_prefix
+        self.endpoint_limits = {}
+        self.local_hits = 0
+        self._local = {}
+        self._lock = threading.Lock()
+        self._releaser = None
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+        atexit.register(self.flush)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._check_default_limits)
+        app.after_request(self._inject_headers)
+
+    def _reset_after_fork(self):
+        self._local = {}
+        self._lock = threading.Lock()
+        self._releaser = None
+        self.local_hits = 0
+
+    def storage_key(self, scope, limit, client_key):
+        return f"{self.key_prefix}:{scope}:{limit.amount}/{limit.period}:{client_key}"
+
+    def _take_local(self, key, limit, now):
+        """
+        Admit one request from the local allowance if possible
+        Returns tuple (result, used, unused): result is None when Redis must
+        decide, with the spent allowance's admitted and unused requests to
+        settle on that call
+        """
+        with self._lock:
+            local = self._local.get(key)
+            if local and local.allowance > 0 and local.expires_at > now:
+                local.allowance -= 1
+                local.used += 1
+                local.remaining -= 1
+                self.local_hits += 1
+                return RateLimitResult(True, limit, local.remaining, 0), 0, 0
+            local = self._local.pop(key, None)
+            return None, local.used if local else 0, local.allowance if local else 0
+
+    def _gcra_args(self, limit, used, unused, cost=1):
+        return [limit.emission_ms, limit.amount, used, unused, cost, self.local_share if cost else 0]
+
+    def _settle(self, key, limit, reply, now):
+        """Turn a GCRA reply into a result, keeping the local allowance Redis reserved"""
+        if reply is None:
+            # Fail open while Redis is unavailable
+            return RateLimitResult(True, limit, limit.amount, 0)
+
+        allowed, remaining, retry_after_ms, reserved = reply
+        if reserved >= 1:
+            with self._lock:
+                self._local[key] = _LocalAllowance(limit, reserved, 0, remaining, now + self.local_ttl)
+                if self._releaser is None:
+                    self._releaser = threading.Thread(target=self._release_forever, name='ratelimit-releaser',
+                                                      daemon=True)
+                    self._releaser.start()
+        return RateLimitResult(bool(allowed), limit, remaining, retry_after_ms / 1000)
+
+    def hit(self, key, limit):
+        """Count one request against `limit` for storage key `key`"""
+        now = time.monotonic()
+        result, used, unused = self._take_local(key, limit, now)
+        if result:
+            return result
+        return self._settle(key, limit, self._sync(key, limit, used, unused), now)
+
+    async def hit_async(self, client, key, limit):
+        """hit() on a redis.asyncio client, for the ASGI app"""
+        now = time.monotonic()
+        result, used, unused = self._take_local(key, limit, now)
+        if result:
+            return result
+        try:
+            reply = await get_async_script(client, GCRA_SCRIPT)(
+                keys=[key, f"{key}:stats"],
+                args=self._gcra_args(limit, used, unused)
+            )
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error(f"Redis error checking rate limit: {str(e)}")
+            reply = None
+        return self._settle(key, limit, reply, now)
+
+    def _sync(self, key, limit, used, unused, cost=1):
+        client = get_redis_client()
+        if not client:
+            return None
+
+        try:
+            return get_script(GCRA_SCRIPT)(
+                keys=[key, f"{key}:stats"],
+                args=self._gcra_args(limit, used, unused, cost)
+            )
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error(f"Redis error checking rate limit: {str(e)}")
+            return None
+
+    def flush(self, expired_only=False):
+        """
+        Give unused local allowances back to Redis and count the requests they
+        admitted; with expired_only, just those past their expiry
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key, local in self._local.items() if not expired_only or local.expires_at <= now]
+            entries = [(key, self._local.pop(key)) for key in keys]
+        for key, local in entries:
+            if local.used or local.allowance:
+                self._sync(key, local.limit, local.used, local.allowance, cost=0)
+
+    def _release_forever(self):
+        # Without this, a reservation a process stops using stays debited until
+        # that process checks the same key again or exits
+        while True:
+            time.sleep(max(self.local_ttl, 0.1))
+            try:
+                self.flush(expired_only=True)
+            except Exception as e:
+                logger.error(f"Error releasing local rate limit allowances: {str(e)}")
+
+    def _outcome(self, scope, client_key, results):
+        """The result to report in headers, and whether any limit rejected the request"""
+        shown = min(results, key=lambda result: result.remaining)
+        rejected = [result for result in results if not result.allowed]
+        if not rejected:
+            return shown, False
+
+        worst = max(rejected, key=lambda result: result.retry_after)
+        metrics.inc('ratelimit_rejections_total', scope=scope)
+        logger.warning(f"Rate limit {worst.limit.spec} exceeded for {client_key} on {scope}")
+        return worst, True
+
+    def check(self, scope, limits):
+        """Enforce limits for the current request; returns a 429 response or None"""
+        if not self.enabled:
+            return None
+        client_key = self.key_func()
+        results = [self.hit(self.storage_key(scope, limit, client_key), limit) for limit in limits]
+        if not results:
+            return None
+
+        g.rate_limit, rejected = self._outcome(scope, client_key, results)
+        if not rejected:
+            return None
+        return jsonify(rejection_body(g.rate_limit)), 429
+
+    async def check_async(self, client, scope, limits, client_key):
+        """
+        check() for the ASGI app, which has no Flask request to read the client key from
+        Returns tuple (result for rate_limit_headers() or None, rejected)
+        """
+        if not self.enabled or not limits:
+            return None, False
+        results = [await self.hit_async(client, self.storage_key(scope, limit, client_key), limit)
+                   for limit in limits]
+        return self._outcome(scope, client_key, results)
+
+    def limit(self, spec):
+        """Decorator applying a limit to one view instead of the default limits"""
+        limit = RateLimit.parse(spec)
+
+        def decorator(f):
+            self.endpoint_limits.setdefault(f.__name__, []).append(limit)
+            limits = self.endpoint_limits[f.__name__]
+
+            @wraps(f)
+            def wrapped(*args, **kwargs):
+                rejected = self.check(f.__name__, limits)
+                if rejected:
+                    return rejected
+                return f(*args, **kwargs)
+
+            wrapped.rate_limited = True
+            return wrapped
+        return decorator
+
+    def exempt(self, f):
+        """Decorator excluding a view from the default limits"""
+        f.rate_limited = True
+        return f
+
+    def _check_default_limits(self):
+        if not self.default_limits or request.endpoint is None:
+            return None
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, 'rate_limited', False):
+            return None
+        return self.check(request.endpoint, self.default_limits)
+
+    def _inject_headers(self, response):
+        result = g.pop('rate_limit', None)
+        if result:
+            response.headers.update(rate_limit_headers(result))
+        return response
+
+    def inspect(self, client_key):
+        """
+        Return the Redis-side state of every limit for one client:
+        remaining allowance and allowed/rejected counters within the current period
+        """
+        client = get_redis_client()
+        if not client:
+            return None
+
+        scopes = [(scope, limit) for scope, limits in self.endpoint_limits.items() for limit in limits]
+        for endpoint, view in current_app.view_functions.items():
+            if endpoint != 'static' and not getattr(view, 'rate_limited', False):
+                scopes.extend((endpoint, limit) for limit in self.default_limits)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.time()
+            for scope, limit in scopes:
+                key = self.storage_key(scope, limit, client_key)
+                pipe.get(key)
+                pipe.hgetall(f"{key}:stats")
+            replies = pipe.execute()
+        except redis.RedisError as e:
+            record_redis_error(e)
+            logger.error(f"Redis error inspecting rate limits: {str(e)}")
+            return None
+
+        seconds, micros = replies[0]
+        now = seconds * 1000 + micros // 1000
+        state = []
+        for i, (scope, limit) in enumerate(scopes):
+            tat, stats = replies[1 + 2 * i], replies[2 + 2 * i]
+            used_ms = max(0, int(tat) - now) if tat else 0
+            state.append({
+                'scope': scope,
+                'limit': limit.spec,
+                'remaining': max(0, (limit.period * 1000 - used_ms) // limit.emission_ms),
+                'reset_in': round(used_ms / 1000, 3),
+                'allowed': int(stats.get('allowed', 0)),
+                'rejected': int(stats.get('rejected', 0))
+            })
+        return state
@@ -0,0 +1,343 @@
+"""
+Leaderboard rebuild and continuous reconciliation from Postgres
+
+Redis runs without persistence, so gpu_leaderboard can vanish on a restart,
+and writes Redis refuses at maxmemory leave it behind Postgres. rebuild_leaderboard() streams (id, score,
+metrics, timestamp) from submissions through a server-side cursor, loads them
+into temporary zsets (the composite board and one per metric) in pipelined
+chunks and RENAMEs them into place atomically. Rows from the last week are
+also added back to their hourly window buckets, which only ever grow. reconcile_once()
+catches up incrementally from a high-water mark on submissions.id, and falls
+back to a full rebuild when the leaderboard, its mark or the per-metric boards
+are missing, or when a periodic count check finds entries below the mark have gone missing.
+The count check is incremental: it counts only the rows added since the last
+check and keeps a running total (VERIFIED_COUNT_KEY).
+
+Rows can commit out of id order, so an id the mark has passed may still appear.
+Ids up to Config.RECONCILE_LOOKBACK below the mark that no pass has seen are
+kept in a small zset and looked up again on each pass until they turn up or
+fall out of the lookback; a pass with nothing new reads and writes nothing else.
+
+A background thread in each web process runs reconcile_once() every
+Config.RECONCILE_INTERVAL seconds; a Redis lock makes sure only one process
+in the deployment does the work at a time. A rebuild extends the lock as it
+goes, so a long one keeps it until the swap. Run either step by hand with:
+    python -m app.reconcile rebuild
+    python -m app.reconcile reconcile
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+import redis
+from flask import current_app
+from sqlalchemy import func, select
+from app import create_app, db, logger
+from app.models import Submission
+from app.redis_client import (
+    LEADERBOARD_KEY, LEADERBOARD_VERSION_KEY, LEADERBOARD_METRICS, METRIC_LEADERBOARD_PREFIX,
+    add_metric_values, add_to_windows, get_redis_client, get_script, publish_leaderboard_event,
+    record_redis_error, trim_leaderboard
+)
+from config import Config
+
+HIGH_WATER_MARK_KEY = 'gpu_leaderboard:high_water_mark'
+SYNC_LOCK_KEY = 'gpu_leaderboard:sync_lock'
+# Metrics whose per-metric boards were last rebuilt; a mismatch forces a rebuild
+METRIC_SETS_KEY = 'gpu_leaderboard:metric_sets'
+# Ids below the high-water mark not seen yet (scored by id)
+UNSEEN_IDS_KEY = 'gpu_leaderboard:unseen_ids'
+# "<mark>:<scored rows up to it>" as of the last count check
+VERIFIED_COUNT_KEY = 'gpu_leaderboard:verified_count'
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class SyncLock:
+    """Deployment-wide lock so only one process rebuilds or reconciles at a time"""
+    def __init__(self, client, ttl_ms):
+        self.client = client
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self):
+        return bool(self.client.set(SYNC_LOCK_KEY, self.token, nx=True, px=self.ttl_ms))
+
+    def __exit__(self, *exc_info):
+        get_script(RELEASE_LOCK_SCRIPT)(keys=[SYNC_LOCK_KEY], args=[self.token])
+        return False
+
+    def extend(self):
+        """Renew the lock's TTL; raises LockNotOwnedError if it expired and another process took it"""
+        if not get_script(EXTEND_LOCK_SCRIPT)(keys=[SYNC_LOCK_KEY], args=[self.token, self.ttl_ms]):
+            raise redis.exceptions.LockNotOwnedError("Lost the leaderboard sync lock")
+
+def _stream_scores(after_id=0, chunk_size=None):
+    """Yield lists of (id, score, metrics, timestamp) rows with id > after_id, using a server-side cursor"""
+    result = db.session.execute(
+        select(Submission.id, Submission.score, Submission.metrics, Submission.timestamp)
+        .where(Submission.id > after_id, Submission.score.isnot(None))
+        .order_by(Submission.id)
+        .execution_options(yield_per=chunk_size or Config.RECONCILE_CHUNK_SIZE)
+    )
+    for partition in result.partitions():
+        yield partition
+
+def recent_ids(recent, ids):
+    """Keep the streamed ids within RECONCILE_LOOKBACK of the newest, for unseen_ids()"""
+    if not ids:
+        return recent
+    return [sub_id for sub_id in (*recent, *ids) if sub_id > ids[-1] - Config.RECONCILE_LOOKBACK]
+
+def unseen_ids(seen, after_id, high_water_mark):
+    """Ids in (after_id, high_water_mark], at most RECONCILE_LOOKBACK below the mark, missing from seen"""
+    seen = set(seen)
+    low = max(after_id, high_water_mark - Config.RECONCILE_LOOKBACK)
+    return [sub_id for sub_id in range(low + 1, high_water_mark + 1) if sub_id not in seen]
+
+def queue_unseen_ids(pipe, ids, high_water_mark, replace=False):
+    """Record ids passed over below the mark, forgetting those now beyond the lookback"""
+    if replace:
+        pipe.delete(UNSEEN_IDS_KEY)
+    if ids:
+        pipe.zadd(UNSEEN_IDS_KEY, {str(sub_id): sub_id for sub_id in ids})
+    pipe.zremrangebyscore(UNSEEN_IDS_KEY, '-inf', high_water_mark - Config.RECONCILE_LOOKBACK)
+
+def _add_windows(pipe, rows):
+    rows = [row for row in rows if row.timestamp is not None]
+    add_to_windows(pipe, [(sub_id, score) for sub_id, score, _, _ in rows], [row.timestamp for row in rows])
+
+def _load(client, key, metric_prefix, rows):
+    """
+    Load rows into the composite zset, the per-metric zsets and the live window
+    buckets; returns the metrics written
+    """
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(key, {str(sub_id): score for sub_id, score, _, _ in rows})
+    trim_leaderboard(pipe, key)
+    pipe.expire(key, 3600)
+    metrics_written = add_metric_values(pipe, ((sub_id, data) for sub_id, _, data, _ in rows), metric_prefix)
+    for metric in metrics_written:
+        pipe.expire(f"{metric_prefix}{metric}", 3600)
+    _add_windows(pipe, rows)
+    pipe.execute()
+    return metrics_written
+
+def rebuild_leaderboard(client, lock=None):
+    """
+    Rebuild the whole leaderboard from Postgres into a temporary zset and swap it in,
+    extending `lock` (a held SyncLock) after every chunk
+    Returns the number of entries loaded
+    """
+    started = time.perf_counter()
+    temp_key = f"{LEADERBOARD_KEY}:rebuild:{uuid.uuid4().hex}"
+    temp_metric_prefix = f"{temp_key}:metric:"
+    loaded = 0
+    high_water_mark = 0
+    recent = []
+    metrics_loaded = set()
+    try:
+        for rows in _stream_scores():
+            # The temporary keys expire on their own if this process dies mid-rebuild
+            metrics_loaded.update(_load(client, temp_key, temp_metric_prefix, rows))
+            loaded += len(rows)
+            high_water_mark = rows[-1][0]
+            recent = recent_ids(recent, [row[0] for row in rows])
+            if lock:
+                lock.extend()
+        db.session.commit()
+
+        if lock:
+            lock.extend()
+        pipe = client.pipeline()
+        if loaded:
+            pipe.persist(temp_key)
+            pipe.rename(temp_key, LEADERBOARD_KEY)
+        else:
+            pipe.delete(LEADERBOARD_KEY)
+        for metric in LEADERBOARD_METRICS:
+            if metric in metrics_loaded:
+                pipe.persist(f"{temp_metric_prefix}{metric}")
+                pipe.rename(f"{temp_metric_prefix}{metric}", f"{METRIC_LEADERBOARD_PREFIX}{metric}")
+            else:
+                pipe.delete(f"{METRIC_LEADERBOARD_PREFIX}{metric}")
+        pipe.set(METRIC_SETS_KEY, ','.join(LEADERBOARD_METRICS))
+        pipe.set(HIGH_WATER_MARK_KEY, high_water_mark)
+        pipe.set(VERIFIED_COUNT_KEY, f"{high_water_mark}:{loaded}")
+        queue_unseen_ids(pipe, unseen_ids(recent, 0, high_water_mark), high_water_mark, replace=True)
+        pipe.incr(LEADERBOARD_VERSION_KEY)
+        publish_leaderboard_event('reset', pipe)
+        pipe.execute()
+    except Exception:
+        client.delete(temp_key, *(f"{temp_metric_prefix}{metric}" for metric in LEADERBOARD_METRICS))
+        db.session.rollback()
+        raise
+
+    logger.info(
+        f"Rebuilt leaderboard with {loaded} entries in {time.perf_counter() - started:.2f}s "
+        f"(high-water mark {high_water_mark})"
+    )
+    return loaded
+
+def _queue_rows(pipe, rows):
+    pipe.zadd(LEADERBOARD_KEY, {str(sub_id): score for sub_id, score, _, _ in rows})
+    trim_leaderboard(pipe, LEADERBOARD_KEY)
+    add_metric_values(pipe, ((sub_id, data) for sub_id, _, data, _ in rows), METRIC_LEADERBOARD_PREFIX)
+    _add_windows(pipe, rows)
+    pipe.incr(LEADERBOARD_VERSION_KEY)
+
+def _catch_up_unseen(client, high_water_mark):
+    """Add rows that committed after the mark passed their id; returns the number written"""
+    unseen = [int(sub_id) for sub_id in client.zrange(UNSEEN_IDS_KEY, 0, -1)]
+    if not unseen:
+        return 0
+    rows = db.session.execute(
+        select(Submission.id, Submission.score, Submission.metrics, Submission.timestamp)
+        .where(Submission.id.in_(unseen))
+    ).all()
+    scored = [row for row in rows if row.score is not None]
+
+    pipe = client.pipeline()
+    if scored:
+        _queue_rows(pipe, scored)
+    if rows:
+        pipe.zrem(UNSEEN_IDS_KEY, *(str(row.id) for row in rows))
+    queue_unseen_ids(pipe, [], high_water_mark)
+    pipe.execute()
+    return len(scored)
+
+def catch_up(client, high_water_mark):
+    """
+    Add submissions above the high-water mark to the leaderboard, and those
+    below it that committed after the mark passed them (see UNSEEN_IDS_KEY)
+    Returns the number of entries written
+    """
+    written = _catch_up_unseen(client, high_water_mark)
+    for rows in _stream_scores(high_water_mark):
+        ids = [row[0] for row in rows]
+        pipe = client.pipeline()
+        _queue_rows(pipe, rows)
+        queue_unseen_ids(pipe, unseen_ids(ids, high_water_mark, ids[-1]), ids[-1])
+        pipe.set(HIGH_WATER_MARK_KEY, ids[-1])
+        pipe.execute()
+        high_water_mark = ids[-1]
+        written += len(rows)
+    db.session.commit()
+    return written
+
+def _missing_entries(client, high_water_mark):
+    """
+    True if the leaderboard holds fewer entries than Postgres has up to the mark
+    Only rows above the previous check's mark are counted, on the primary key
+    """
+    verified = client.get(VERIFIED_COUNT_KEY)
+    counted_to, expected = (int(part) for part in verified.split(':')) if verified else (0, 0)
+    if counted_to > high_water_mark:
+        counted_to, expected = 0, 0
+    expected += db.session.scalar(
+        select(func.count()).select_from(Submission)
+        .where(Submission.id > counted_to, Submission.id <= high_water_mark, Submission.score.isnot(None))
+    )
+    db.session.commit()
+    client.set(VERIFIED_COUNT_KEY, f"{high_water_mark}:{expected}")
+    if Config.LEADERBOARD_TOP_K > 0:
+        expected = min(expected, Config.LEADERBOARD_TOP_K)
+    return client.zcard(LEADERBOARD_KEY) < expected
+
+def reconcile_once(verify=False):
+    """
+    Bring the leaderboard in line with Postgres: full rebuild if it is missing
+    (or, with verify, short of entries), incremental catch-up otherwise
+    Returns 'rebuilt', 'caught_up', 'locked' or 'unavailable'
+    """
+    client = get_redis_client()
+    if not client:
+        return 'unavailable'
+
+    try:
+        lock = SyncLock(client, Config.RECONCILE_LOCK_TTL * 1000)
+        with lock as acquired:
+            if not acquired:
+                return 'locked'
+
+            pipe = client.pipeline(transaction=False)
+            pipe.exists(LEADERBOARD_KEY)
+            pipe.get(HIGH_WATER_MARK_KEY)
+            pipe.get(METRIC_SETS_KEY)
+            exists, high_water_mark, metric_sets = pipe.execute()
+
+            if (high_water_mark is None or (not exists and int(high_water_mark) > 0)
+                    or metric_sets != ','.join(LEADERBOARD_METRICS)
+                    or (verify and _missing_entries(client, int(high_water_mark)))):
+                logger.warning("Leaderboard missing or incomplete in Redis, rebuilding from Postgres")
+                rebuild_leaderboard(client, lock)
+                return 'rebuilt'
+
+            written = catch_up(client, int(high_water_mark))
+            if written:
+                logger.debug(f"Reconciled {written} leaderboard entries")
+            return 'caught_up'
+    except redis.exceptions.LockNotOwnedError:
+        logger.warning("Leaderboard sync lock expired during a rebuild; another process took over")
+        return 'locked'
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error reconciling leaderboard: {str(e)}")
+        return 'unavailable'
+
+_reconciler = None
+
+def _reset_after_fork():
+    global _reconciler
+    _reconciler = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _reconcile_forever(app):
+    passes = 0
+    with app.app_context():
+        while True:
+            try:
+                reconcile_once(verify=passes % Config.RECONCILE_VERIFY_EVERY == 0)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error reconciling leaderboard: {str(e)}")
+            passes += 1
+            time.sleep(Config.RECONCILE_INTERVAL)
+
+def start_reconciler():
+    """Start this process's background reconciler (first call only, inside a request)"""
+    global _reconciler
+    if _reconciler is None and Config.RECONCILE_INTERVAL > 0:
+        _reconciler = threading.Thread(
+            target=_reconcile_forever, args=(current_app._get_current_object(),),
+            name='leaderboard-reconciler', daemon=True
+        )
+        _reconciler.start()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'reconcile'
+    with create_app().app_context():
+        if command == 'rebuild':
+            redis_client = get_redis_client()
+            lock = SyncLock(redis_client, Config.RECONCILE_LOCK_TTL * 1000)
+            with lock as acquired:
+                if not acquired:
+                    sys.exit("Another process is rebuilding or reconciling the leaderboard")
+                rebuild_leaderboard(redis_client, lock)
+        elif command == 'reconcile':
+            logger.info(f"Reconcile result: {reconcile_once(verify=True)}")
+        else:
+            sys.exit("Usage: python -m app.reconcile [rebuild|reconcile]")
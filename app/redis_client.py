@@ -1,91 +1,767 @@
+import json
+import math
 import os
-import redis
-from app import logger
+import threading
 import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+import redis
+import redis.asyncio
 from redis.connection import ConnectionPool
+from app import logger
+from app.metrics import InstrumentedRedis
+from app.scoring import GPUScorer
+from config import Config
+
+LEADERBOARD_KEY = 'gpu_leaderboard'
+LEADERBOARD_VERSION_KEY = 'gpu_leaderboard:version'
+LEADERBOARD_CACHE_KEY = 'gpu_leaderboard:cache'
+SLOT_LEASE_KEY = 'gpu_slot:lease'
+
+# One zset per scored metric, member = submission id, score = the raw metric value
+METRIC_LEADERBOARD_PREFIX = 'gpu_leaderboard:metric:'
+LEADERBOARD_METRICS = tuple(GPUScorer().weights)
+
+# Time-windowed leaderboards: one zset per UTC hour (by submission timestamp),
+# expiring once no window covers it. Multi-hour windows are ZUNIONSTORE rollups
+# of their hourly buckets, cached per window and hour and kept current by
+# adding new entries to them as they arrive.
+HOUR_BUCKET_PREFIX = 'gpu_leaderboard:hour:'
+WINDOW_ROLLUP_PREFIX = 'gpu_leaderboard:window:'
+LEADERBOARD_WINDOWS = {'hour': 1, 'day': 24, 'week': 168}  # window name -> hours covered
+
+# Changes to the top of the leaderboard and to the slot are published here and
+# pushed to /leaderboard/stream clients by app.stream
+LEADERBOARD_EVENTS_CHANNEL = 'gpu_leaderboard:events'
+STREAM_TOP_N = 10  # Ranks whose changes are published, as many as /leaderboard shows
+
+# Take the slot lease if it is free, otherwise report the current holder.
+# Winning also bumps the leaderboard version so cached payloads show the slot.
+SLOT_LEASE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('INCR', KEYS[2])
+    return {1, ARGV[1], tonumber(ARGV[2])}
+end
+return {0, redis.call('GET', KEYS[1]), redis.call('PTTL', KEYS[1])}
+"""
+
+# Continue a descending page after the cursor member. If the member is not in
+# the set (it left, or lies past rank K), resume where it would sort: after the
+# entries scoring above it and the ties whose member sorts after it.
+LEADERBOARD_PAGE_AFTER_SCRIPT = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    rank = redis.call('ZCOUNT', KEYS[1], '(' .. ARGV[2], '+inf') - 1
+    for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[2], ARGV[2])) do
+        if member > ARGV[1] then
+            rank = rank + 1
+        end
+    end
+end
+local start = rank + 1
+return {start, redis.call('ZCARD', KEYS[1]),
+        redis.call('ZREVRANGE', KEYS[1], start, start + tonumber(ARGV[3]) - 1, 'WITHSCORES')}
+"""
+
+# ZADD entries to each rollup that already exists (and re-apply the top-K trim).
+# A missing rollup is left alone: it is built from the buckets on first read.
+# ARGV = top K (0 keeps all), then member, score pairs
+WINDOW_ADD_SCRIPT = """
+local top_k = tonumber(ARGV[1])
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        for i = 2, #ARGV, 2 do
+            redis.call('ZADD', key, ARGV[i + 1], ARGV[i])
+        end
+        if top_k > 0 then
+            redis.call('ZREMRANGEBYRANK', key, 0, -(top_k + 1))
+        end
+    end
+end
+return 0
+"""
+
+# Build a window rollup from its hourly buckets unless it already exists.
+# KEYS[1] = rollup, KEYS[2..] = buckets; ARGV = expire-at (unix seconds), top K
+WINDOW_ROLLUP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local command = {'ZUNIONSTORE', KEYS[1], #KEYS - 1}
+for i = 2, #KEYS do
+    command[#command + 1] = KEYS[i]
+end
+command[#command + 1] = 'AGGREGATE'
+command[#command + 1] = 'MAX'
+redis.call(unpack(command))
+if tonumber(ARGV[2]) > 0 then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[2]) + 1))
+end
+redis.call('EXPIREAT', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Rank, score, set size and the surrounding entries of one member
+SUBMISSION_RANK_SCRIPT = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    return false
+end
+local start = math.max(rank - tonumber(ARGV[2]), 0)
+return {rank, redis.call('ZSCORE', KEYS[1], ARGV[1]), redis.call('ZCARD', KEYS[1]), start,
+        redis.call('ZREVRANGE', KEYS[1], start, rank + tonumber(ARGV[2]), 'WITHSCORES')}
+"""
+
+class RedisUnavailableError(redis.ConnectionError):
+    """Raised instead of contacting Redis while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Fail-fast guard around Redis
+
+    The breaker trips open after `threshold` connection failures within `window`
+    seconds. While open, callers are refused immediately instead of waiting on
+    socket timeouts, and a background thread pings Redis every `retry_interval`
+    seconds, closing the breaker as soon as Redis answers again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, probe, threshold, window, retry_interval):
+        self.probe = probe
+        self.threshold = threshold
+        self.window = window
+        self.retry_interval = retry_interval
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.last_error = None
+        self._failures = deque()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if Redis calls should be attempted"""
+        return self.state == self.CLOSED
+
+    def record_failure(self, error):
+        """Count a connection failure, tripping the breaker past the threshold"""
+        with self._lock:
+            now = time.monotonic()
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            self.last_error = str(error)
+
+            if self.state == self.CLOSED and len(self._failures) >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = datetime.utcnow()
+                logger.error(f"Redis circuit breaker opened after {len(self._failures)} failures: {error}")
+                threading.Thread(target=self._probe_until_healthy, name='redis-breaker-probe', daemon=True).start()
+
+    def _probe_until_healthy(self):
+        while True:
+            time.sleep(self.retry_interval)
+            try:
+                self.probe()
+            except Exception as e:
+                self.last_error = str(e)
+                continue
+
+            with self._lock:
+                self.state = self.CLOSED
+                self.opened_at = None
+                self._failures.clear()
+            logger.info("Redis reachable again, circuit breaker closed")
+            return
+
+    def reset(self):
+        """Forget all failures and close the breaker (used in freshly forked workers)"""
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.last_error = None
+        self._failures.clear()
+
+    def status(self):
+        """Describe the breaker state for health reporting"""
+        return {
+            'state': self.state,
+            'recent_failures': len(self._failures),
+            'opened_at': self.opened_at.isoformat() if self.opened_at else None,
+            'last_error': self.last_error
+        }
 
 # Configure Redis connection pool
-def create_redis_pool():
-    """Create a Redis connection pool with retry logic"""
-    redis_host = os.getenv('REDIS_HOST', 'localhost')
-    redis_port = int(os.getenv('REDIS_PORT', 6379))
-
-    return ConnectionPool(
-        host=redis_host,
-        port=redis_port,
-        db=0,
+def _connection_settings():
+    """Server address and socket limits shared by the sync and async pools"""
+    return dict(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
         decode_responses=True,
-        max_connections=10,
-        socket_timeout=5,
-        socket_connect_timeout=5,
+        max_connections=Config.REDIS_MAX_CONNECTIONS,
+        socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
         retry_on_timeout=True
     )
 
+def create_redis_pool():
+    """Create a Redis connection pool"""
+    return ConnectionPool(**_connection_settings())
+
+def create_async_redis_client():
+    """
+    Create a redis.asyncio client for the ASGI app (one per event loop)
+    Requests wait up to the socket timeout for a free connection instead of failing
+    """
+    pool = redis.asyncio.BlockingConnectionPool(timeout=Config.REDIS_SOCKET_TIMEOUT, **_connection_settings())
+    return redis.asyncio.Redis(connection_pool=pool)
+
+_client = None
+_client_lock = threading.Lock()
+_scripts = {}
+_async_scripts = {}
+
+def _process_client():
+    """Return this process's Redis client, creating its pool on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = InstrumentedRedis(
+                    connection_pool=create_redis_pool(),
+                    health_check_interval=30
+                )
+    return _client
+
+breaker = CircuitBreaker(
+    probe=lambda: _process_client().ping(),
+    threshold=Config.REDIS_BREAKER_THRESHOLD,
+    window=Config.REDIS_BREAKER_WINDOW,
+    retry_interval=Config.REDIS_BREAKER_RETRY_INTERVAL
+)
+
+def _reset_after_fork():
+    # Sockets, locks and the probe thread do not survive fork; start clean
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+    _scripts.clear()
+    _async_scripts.clear()
+    breaker.reset()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 def get_redis_client():
-    """Get Redis client with connection retry logic"""
-    max_retries = 3
-    retry_delay = 2
+    """Get the process-local Redis client, or None while the circuit breaker is open"""
+    if not breaker.allow():
+        return None
+    return _process_client()
+
+def get_script(source):
+    """Return a Lua script registered on this process's client (EVALSHA with EVAL fallback)"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = _process_client().register_script(source)
+    return script
+
+def get_async_script(client, source):
+    """get_script() for a redis.asyncio client"""
+    script = _async_scripts.get(source)
+    if script is None or script.registered_client is not client:
+        script = _async_scripts[source] = client.register_script(source)
+    return script
+
+def load_pipeline_scripts(pipe):
+    """
+    Have a redis.asyncio pipeline check for (and load) the Lua scripts queued on it
+    by the helpers below before it runs, as sync pipelines do by themselves
+    """
+    pipe.scripts.update(_scripts.values())
+
+def record_redis_error(error):
+    """Feed connection-level failures to the circuit breaker"""
+    if isinstance(error, (redis.ConnectionError, redis.TimeoutError)) \
+            and not isinstance(error, RedisUnavailableError):
+        breaker.record_failure(error)
+
+def get_redis_status():
+    """Return the circuit breaker state"""
+    return breaker.status()
+
+def ping_redis():
+    """Return True if Redis answers a PING"""
+    client = get_redis_client()
+    if not client:
+        return False
+
+    try:
+        return bool(client.ping())
+    except redis.RedisError as e:
+        record_redis_error(e)
+        return False
+
+class RedisPipeline:
+    """
+    Batch several Redis commands into one round trip
 
-    for attempt in range(max_retries):
+    Usage:
+        batch = RedisPipeline()
+        with batch as pipe:
+            pipe.zadd(...)
+            pipe.incr(...)
+        zadd_result, incr_result = batch.results
+
+    Commands queued inside the block are sent on exit (wrapped in MULTI/EXEC
+    when transaction=True). Raises RedisUnavailableError without touching the
+    network while the circuit breaker is open.
+    """
+    def __init__(self, transaction=True):
+        self.transaction = transaction
+        self.results = None
+        self._pipe = None
+
+    def __enter__(self):
+        client = get_redis_client()
+        if not client:
+            raise RedisUnavailableError("Redis circuit breaker is open")
+        self._pipe = client.pipeline(transaction=self.transaction)
+        return self._pipe
+
+    def __exit__(self, exc_type, exc_value, traceback):
         try:
-            # Use connection pool for better resource management
-            client = redis.Redis(
-                connection_pool=create_redis_pool(),
-                health_check_interval=30
-            )
-            # Test connection
-            client.ping()
-            return client
-        except redis.ConnectionError as e:
-            if attempt == max_retries - 1:
-                logger.error(f"Failed to connect to Redis after {max_retries} attempts: {str(e)}")
-                raise
-            logger.warning(f"Redis connection attempt {attempt + 1} failed, retrying in {retry_delay}s")
-            time.sleep(retry_delay)
-
-# Initialize Redis client
-try:
-    redis_client = get_redis_client()
-    logger.info("Successfully connected to Redis")
-except Exception as e:
-    logger.error(f"Could not initialize Redis client: {str(e)}")
-    redis_client = None
-
-def update_leaderboard(submission_id, score):
-    """Update the leaderboard with a new submission score"""
-    if not redis_client:
-        logger.error("Redis client not initialized")
+            if exc_type is None:
+                self.results = self._pipe.execute()
+        except redis.RedisError as e:
+            record_redis_error(e)
+            raise
+        finally:
+            self._pipe.reset()
         return False
 
+def trim_leaderboard(pipe, key, ascending=False):
+    """
+    Queue the top-K trim on a pipeline: with Config.LEADERBOARD_TOP_K set, keep only
+    the best K entries (lower-ranked ones stay answerable from Postgres).
+    With ascending=True the best entries are the lowest scores.
+    """
+    if Config.LEADERBOARD_TOP_K > 0:
+        if ascending:
+            pipe.zremrangebyrank(key, Config.LEADERBOARD_TOP_K, -1)
+        else:
+            pipe.zremrangebyrank(key, 0, -(Config.LEADERBOARD_TOP_K + 1))
+
+def metric_ascending(metric):
+    """True if the metric's leaderboard ranks lower values first"""
+    return metric in GPUScorer.LOWER_IS_BETTER
+
+def add_metric_values(pipe, rows, key_prefix=None):
+    """
+    Queue ZADDs (and top-K trims) of every metric's value on a pipeline
+    rows holds (submission_id, metrics dict) pairs; non-numeric values are skipped
+    key_prefix defaults to METRIC_LEADERBOARD_PREFIX
+    Returns the metrics that received at least one value
+    """
+    key_prefix = key_prefix or METRIC_LEADERBOARD_PREFIX
+    values = {metric: {} for metric in LEADERBOARD_METRICS}
+    for sub_id, data in rows:
+        if not isinstance(data, dict):
+            continue
+        for metric, by_id in values.items():
+            value = data.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+                by_id[str(sub_id)] = value
+
+    written = []
+    for metric, by_id in values.items():
+        if by_id:
+            key = f"{key_prefix}{metric}"
+            pipe.zadd(key, by_id)
+            trim_leaderboard(pipe, key, ascending=metric_ascending(metric))
+            written.append(metric)
+    return written
+
+def _hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _unix(timestamp):
+    """Naive UTC datetime to unix seconds"""
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp())
+
+def hour_bucket_key(hour):
+    return f"{HOUR_BUCKET_PREFIX}{hour:%Y%m%d%H}"
+
+def window_rollup_key(window, hour):
+    return f"{WINDOW_ROLLUP_PREFIX}{window}:{hour:%Y%m%d%H}"
+
+def add_to_windows(pipe, entries, timestamps, now=None):
+    """
+    Queue ZADDs of (submission_id, score) entries into the hourly buckets of their
+    timestamps, and into the current rollups of every window covering those hours
+    Entries older than the longest window are skipped
+    """
+    now_hour = _hour(now or datetime.utcnow())
+    longest = max(LEADERBOARD_WINDOWS.values())
+    by_hour = defaultdict(dict)
+    for (sub_id, score), timestamp in zip(entries, timestamps):
+        by_hour[_hour(timestamp)][str(sub_id)] = score
+
+    for hour, members in by_hour.items():
+        age = (now_hour - hour) // timedelta(hours=1)
+        if age >= longest:
+            continue
+        key = hour_bucket_key(hour)
+        pipe.zadd(key, members)
+        trim_leaderboard(pipe, key)
+        # Reclaimed as soon as the longest window has moved past this hour
+        pipe.expireat(key, _unix(hour + timedelta(hours=longest + 1)))
+
+        rollups = [window_rollup_key(window, now_hour) for window, hours in LEADERBOARD_WINDOWS.items()
+                   if hours > 1 and 0 <= age < hours]
+        if rollups:
+            args = [Config.LEADERBOARD_TOP_K]
+            for member, score in members.items():
+                args += [member, score]
+            get_script(WINDOW_ADD_SCRIPT)(keys=rollups, args=args, client=pipe)
+
+def _window_source(pipe, window, now=None):
+    """
+    Return the key holding a window's ranking, queueing the build of its rollup
+    for the current hour on the pipeline in case this is the first read of the hour
+    """
+    now_hour = _hour(now or datetime.utcnow())
+    hours = LEADERBOARD_WINDOWS[window]
+    if hours == 1:
+        return hour_bucket_key(now_hour)
+
+    key = window_rollup_key(window, now_hour)
+    buckets = [hour_bucket_key(now_hour - timedelta(hours=i)) for i in range(hours)]
+    # Kept a few minutes into the next hour, whose readers build the next rollup
+    expire_at = _unix(now_hour + timedelta(hours=1, minutes=5))
+    get_script(WINDOW_ROLLUP_SCRIPT)(keys=[key, *buckets], args=[expire_at, Config.LEADERBOARD_TOP_K], client=pipe)
+    return key
+
+def update_leaderboard(submission_id, score, metrics=None, timestamp=None):
+    """
+    Update the leaderboard with a new submission score, the per-metric
+    leaderboards with its metrics when given, and the time windows
+    Returns the current leader as (submission_id, score), or None on failure
+    """
+    return update_leaderboard_bulk(
+        [(submission_id, score)], [metrics] if metrics else None, [timestamp] if timestamp else None
+    )
+
+def queue_leaderboard_update(pipe, entries, metrics_list=None, timestamps=None):
+    """
+    Queue the writes for new (submission_id, score) entries (see update_leaderboard_bulk),
+    followed by a read of the top STREAM_TOP_N as the pipeline's last reply
+    """
+    pipe.zadd(LEADERBOARD_KEY, {str(sub_id): score for sub_id, score in entries})
+    trim_leaderboard(pipe, LEADERBOARD_KEY)
+    if metrics_list:
+        add_metric_values(pipe, zip((sub_id for sub_id, _ in entries), metrics_list))
+    add_to_windows(pipe, entries, timestamps or [datetime.utcnow()] * len(entries))
+    pipe.incr(LEADERBOARD_VERSION_KEY)
+    pipe.zrevrange(LEADERBOARD_KEY, 0, STREAM_TOP_N - 1, withscores=True)
+
+def entered_top(top, entries):
+    """The new entries found in a top-STREAM_TOP_N reply, as 'entered' event items"""
+    new_ids = {str(sub_id) for sub_id, _ in entries}
+    return [{'submission_id': int(sub_id), 'score': score, 'rank': rank}
+            for rank, (sub_id, score) in enumerate(top, 1) if sub_id in new_ids]
+
+def update_leaderboard_bulk(entries, metrics_list=None, timestamps=None):
+    """
+    Update the leaderboard with many (submission_id, score) pairs in one round trip
+    metrics_list, parallel to entries, also feeds the per-metric leaderboards;
+    timestamps, also parallel, pick the hourly buckets (default: now).
+    The ZADDs, the top-K trims, the version bump and the leader lookup share a
+    single MULTI/EXEC pipeline.
+    Returns the current leader as (submission_id, score), or None on failure
+    """
+    if not entries:
+        return None
+
     try:
-        redis_client.zadd('gpu_leaderboard', {str(submission_id): score})
-        logger.info(f"Updated leaderboard with submission {submission_id}")
-        return True
+        batch = RedisPipeline()
+        with batch as pipe:
+            queue_leaderboard_update(pipe, entries, metrics_list, timestamps)
+        top = batch.results[-1]
+        logger.info("Updated leaderboard with %s submission(s)", len(entries))
+        entered = entered_top(top, entries)
+        if entered:
+            publish_leaderboard_event('entered', entries=entered)
+        return (int(top[0][0]), top[0][1]) if top else None
+    except RedisUnavailableError:
+        logger.warning("Redis unavailable, leaderboard not updated")
+        return None
     except redis.RedisError as e:
         logger.error(f"Redis error updating leaderboard: {str(e)}")
-        return False
+        return None
     except Exception as e:
         logger.error(f"Error updating leaderboard: {str(e)}")
-        return False
+        return None
+
+def leaderboard_event(event_type, **data):
+    """Encode a leaderboard change for LEADERBOARD_EVENTS_CHANNEL"""
+    return json.dumps({'type': event_type, **data}, separators=(',', ':'))
+
+def publish_leaderboard_event(event_type, pipe=None, **data):
+    """
+    Publish a leaderboard change to /leaderboard/stream subscribers, queued on
+    `pipe` when given so it goes out with the change it describes
+    Event types: 'entered' (entries reaching the top STREAM_TOP_N), 'slot' (a
+    new slot holder) and 'reset' (the board was replaced; clients refetch it)
+    """
+    if pipe is not None:
+        pipe.publish(LEADERBOARD_EVENTS_CHANNEL, leaderboard_event(event_type, **data))
+        return
+    client = get_redis_client()
+    if not client:
+        return
+    try:
+        client.publish(LEADERBOARD_EVENTS_CHANNEL, leaderboard_event(event_type, **data))
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.warning(f"Redis error publishing leaderboard event: {str(e)}")
 
 def get_top_submissions(limit=10):
-    """Get the top N submissions from the leaderboard"""
-    if not redis_client:
-        logger.error("Redis client not initialized")
-        return []
+    """
+    Get the top N submissions from the leaderboard as (submission_id, score)
+    Returns None if Redis is unavailable
+    """
+    client = get_redis_client()
+    if not client:
+        return None
 
     try:
         # Get submission IDs and scores, sorted by score (descending)
-        leaderboard = redis_client.zrevrange(
-            'gpu_leaderboard',
+        leaderboard = client.zrevrange(
+            LEADERBOARD_KEY,
             0,
             limit-1,
             withscores=True
         )
         return [(int(sub_id), score) for sub_id, score in leaderboard]
     except redis.RedisError as e:
+        record_redis_error(e)
         logger.error(f"Redis error fetching leaderboard: {str(e)}")
-        return []
+        return None
     except Exception as e:
         logger.error(f"Error fetching leaderboard: {str(e)}")
-        return []
\ No newline at end of file
+        return None
+
+def bump_leaderboard_version():
+    """Invalidate cached leaderboard payloads by advancing the version counter"""
+    client = get_redis_client()
+    if not client:
+        return None
+
+    try:
+        return client.incr(LEADERBOARD_VERSION_KEY)
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error bumping leaderboard version: {str(e)}")
+        return None
+
+def get_cached_leaderboard():
+    """
+    Fetch the current leaderboard version and cached payload in one round trip
+    Returns tuple (version, etag, body); etag and body are None on a cache miss
+    or when the cached payload was rendered for an older version
+    """
+    client = get_redis_client()
+    if not client:
+        return None, None, None
+
+    try:
+        return decode_cached_leaderboard(*client.mget(LEADERBOARD_VERSION_KEY, LEADERBOARD_CACHE_KEY))
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error fetching cached leaderboard: {str(e)}")
+        return None, None, None
+
+def decode_cached_leaderboard(version, cached):
+    """Turn MGET replies for the version and cache keys into get_cached_leaderboard()'s tuple"""
+    version = int(version or 0)
+    if cached:
+        cached_version, etag, body = cached.split(':', 2)
+        if int(cached_version) == version:
+            return version, etag, body
+    return version, None, None
+
+def encode_cached_leaderboard(version, etag, body):
+    return f"{version}:{etag}:{body}"
+
+def cache_leaderboard(version, etag, body, ttl):
+    """Store a rendered leaderboard payload for the given version"""
+    client = get_redis_client()
+    if not client or version is None or ttl <= 0:
+        return False
+
+    try:
+        client.set(LEADERBOARD_CACHE_KEY, encode_cached_leaderboard(version, etag, body), ex=ttl)
+        return True
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error caching leaderboard: {str(e)}")
+        return False
+
+def acquire_slot_lease(submission_id, duration_ms):
+    """
+    Atomically take the GPU slot lease for a submission if nobody holds it
+    Returns tuple (won, holder_id, ttl_ms) describing the lease after the call,
+    or None if Redis is unavailable
+    """
+    client = get_redis_client()
+    if not client:
+        return None
+
+    try:
+        won, holder, ttl_ms = get_script(SLOT_LEASE_SCRIPT)(
+            keys=[SLOT_LEASE_KEY, LEADERBOARD_VERSION_KEY],
+            args=[str(submission_id), int(duration_ms)]
+        )
+        return bool(won), int(holder) if holder else None, ttl_ms
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error acquiring slot lease: {str(e)}")
+        return None
+
+def get_slot_lease():
+    """
+    Read the current GPU slot lease in one round trip
+    Returns tuple (holder_id, ttl_ms), or None if the slot is free or Redis is unavailable
+    """
+    try:
+        batch = RedisPipeline()
+        with batch as pipe:
+            pipe.get(SLOT_LEASE_KEY)
+            pipe.pttl(SLOT_LEASE_KEY)
+        holder, ttl_ms = batch.results
+        if holder is None or ttl_ms <= 0:
+            return None
+        return int(holder), ttl_ms
+    except RedisUnavailableError:
+        return None
+    except redis.RedisError as e:
+        logger.error(f"Redis error reading slot lease: {str(e)}")
+        return None
+
+def _pairs(flat):
+    """Turn a flat [member, score, ...] reply into [(submission_id, score), ...]"""
+    return [(int(flat[i]), float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+def get_leaderboard_page(offset, limit, window=None):
+    """
+    Get one page of the leaderboard, or of a time window's leaderboard, by rank offset
+    Returns tuple (entries, total) with entries as (submission_id, score), or None on failure
+    """
+    try:
+        batch = RedisPipeline(transaction=False)
+        with batch as pipe:
+            key = _window_source(pipe, window) if window else LEADERBOARD_KEY
+            pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+            pipe.zcard(key)
+        page, total = batch.results[-2:]
+        return [(int(sub_id), score) for sub_id, score in page], total
+    except RedisUnavailableError:
+        return None
+    except redis.RedisError as e:
+        logger.error(f"Redis error fetching leaderboard page: {str(e)}")
+        return None
+
+def get_metric_leaderboard_page(metric, offset, limit):
+    """
+    Get one page of a per-metric leaderboard by rank offset, best value first
+    Returns tuple (entries, total) with entries as (submission_id, value), or None on failure
+    """
+    key = f"{METRIC_LEADERBOARD_PREFIX}{metric}"
+    try:
+        batch = RedisPipeline(transaction=False)
+        with batch as pipe:
+            pipe.zrange(key, offset, offset + limit - 1, desc=not metric_ascending(metric), withscores=True)
+            pipe.zcard(key)
+        page, total = batch.results
+        return [(int(sub_id), value) for sub_id, value in page], total
+    except RedisUnavailableError:
+        return None
+    except redis.RedisError as e:
+        logger.error(f"Redis error fetching {metric} leaderboard page: {str(e)}")
+        return None
+
+def get_leaderboard_page_after(submission_id, score, limit, window=None):
+    """
+    Get the page of the leaderboard (or of a time window's) following a cursor
+    entry, in one round trip
+    Returns tuple (offset, entries, total), or None on failure
+    """
+    try:
+        batch = RedisPipeline(transaction=False)
+        with batch as pipe:
+            key = _window_source(pipe, window) if window else LEADERBOARD_KEY
+            get_script(LEADERBOARD_PAGE_AFTER_SCRIPT)(
+                keys=[key],
+                args=[str(submission_id), repr(float(score)), int(limit)],
+                client=pipe
+            )
+        offset, total, page = batch.results[-1]
+        return offset, _pairs(page), total
+    except RedisUnavailableError:
+        return None
+    except redis.RedisError as e:
+        logger.error(f"Redis error fetching leaderboard page: {str(e)}")
+        return None
+
+def get_submission_rank(submission_id, neighbours):
+    """
+    Look up a submission's rank with ZREVRANK/ZSCORE, plus `neighbours` entries on each side
+    Returns dict with rank (0-based), score, total, neighbours_offset and neighbours,
+    False if the submission is not on the leaderboard, or None on failure
+    """
+    client = get_redis_client()
+    if not client:
+        return None
+
+    try:
+        reply = get_script(SUBMISSION_RANK_SCRIPT)(
+            keys=[LEADERBOARD_KEY],
+            args=[str(submission_id), int(neighbours)]
+        )
+        if not reply:
+            return False
+        rank, score, total, start, around = reply
+        return {
+            'rank': rank,
+            'score': float(score),
+            'total': total,
+            'neighbours_offset': start,
+            'neighbours': _pairs(around)
+        }
+    except redis.RedisError as e:
+        record_redis_error(e)
+        logger.error(f"Redis error fetching submission rank: {str(e)}")
+        return None
+
+def get_leaderboard_memory():
+    """
+    Report the leaderboard zset's size: entries, MEMORY USAGE in bytes and encoding
+    Returns a dict, or None if Redis is unavailable
+    """
+    try:
+        batch = RedisPipeline(transaction=False)
+        with batch as pipe:
+            pipe.zcard(LEADERBOARD_KEY)
+            pipe.memory_usage(LEADERBOARD_KEY)
+            pipe.object('encoding', LEADERBOARD_KEY)
+        entries, memory_bytes, encoding = batch.results
+        return {
+            'entries': entries,
+            'memory_bytes': memory_bytes or 0,
+            'encoding': encoding,
+            'top_k': Config.LEADERBOARD_TOP_K or None
+        }
+    except RedisUnavailableError:
+        return None
+    except redis.RedisError as e:
+        logger.error(f"Redis error reading leaderboard memory usage: {str(e)}")
+        return None
@@ -0,0 +1,230 @@
+"""
+Rescore every submission with a scoring profile
+
+After a new profile is added to app.scoring.SCORING_PROFILES and new
+submissions are being scored with it (Config.SCORING_PROFILE), the stored
+scores and the Redis leaderboard still reflect the old formula. rescore()
+walks submissions in primary-key order, Config.RESCORE_CHUNK_SIZE rows at a
+time, and for each chunk:
+- scores it column by column with GPUScorer.calculate_scores
+- writes the new scores back in one bulk UPDATE, moves them between
+  score buckets in the statistics summary (app.stats), and commits (rows whose
+  metrics no longer score are left as they are and counted as skipped)
+- adds them to a shadow leaderboard zset and to the live hourly window buckets
+- records the last id as a checkpoint next to the shadow zset
+
+Every chunk is its own short keyset query (id > last id ORDER BY id LIMIT n)
+and its own transaction, so the job holds no long-running snapshot and a
+killed run resumes from its checkpoint. Rows already carrying the target
+profile are re-added to the shadow zset but not rewritten. When the walk is
+done, rows added meanwhile are swept up under the reconciler's lock and the
+shadow zset is RENAMEd over gpu_leaderboard in one MULTI/EXEC.
+
+Usage:
+    python -m app.rescore --profile 2
+    python -m app.rescore --profile 2 --chunk-size 100000 --restart
+"""
+import argparse
+import sys
+import time
+from sqlalchemy import or_, select, text, update
+from app import create_app, db, logger
+from app.models import METRIC_COLUMNS, Submission
+from app.reconcile import HIGH_WATER_MARK_KEY, SyncLock, queue_unseen_ids, recent_ids, unseen_ids
+from app.redis_client import (
+    LEADERBOARD_KEY, LEADERBOARD_VERSION_KEY,
+    add_to_windows, get_redis_client, publish_leaderboard_event, trim_leaderboard
+)
+from app.scoring import GPUScorer
+from app.stats import add_deltas, histogram_deltas, summary_upsert
+from config import Config
+
+SHADOW_KEY = 'gpu_leaderboard:rescore:{version}'
+CHECKPOINT_KEY = 'gpu_leaderboard:rescore:{version}:checkpoint'
+# A stalled run's shadow zset and checkpoint are reclaimed after a day
+SHADOW_TTL = 86400
+LOCK_WAIT_SECONDS = 300
+
+def _score_chunk(scorer, metrics_list):
+    """Score a chunk in one pass; rows that cannot be scored get None"""
+    try:
+        return scorer.calculate_scores(metrics_list)
+    except ValueError:
+        pass
+    scores = []
+    for metrics in metrics_list:
+        try:
+            scores.append(scorer.calculate_score(metrics))
+        except ValueError:
+            scores.append(None)
+    return scores
+
+def _write_scores(pairs, version):
+    """Bulk-write (id, score) pairs scored with profile `version`"""
+    if not pairs:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        # One statement per chunk: the new scores arrive as two arrays
+        db.session.execute(
+            text(
+                'UPDATE submissions AS s SET score = v.score, score_version = :version '
+                'FROM unnest(CAST(:ids AS bigint[]), CAST(:scores AS double precision[])) AS v(id, score) '
+                'WHERE s.id = v.id'
+            ),
+            {'ids': [sub_id for sub_id, _ in pairs], 'scores': [score for _, score in pairs], 'version': version}
+        )
+    else:
+        db.session.execute(
+            update(Submission),
+            [{'id': sub_id, 'score': score, 'score_version': version} for sub_id, score in pairs]
+        )
+
+class Rescorer:
+    """One rescoring run towards a scoring profile version"""
+    def __init__(self, client, version, chunk_size=None):
+        self.client = client
+        self.scorer = GPUScorer(version)
+        self.version = self.scorer.version
+        self.chunk_size = chunk_size or Config.RESCORE_CHUNK_SIZE
+        self.shadow_key = SHADOW_KEY.format(version=self.version)
+        self.checkpoint_key = CHECKPOINT_KEY.format(version=self.version)
+        self.last_id = 0
+        self.tracked_from = 0  # Ids after this one were read by this process (see unseen_ids())
+        self.recent = []
+        self.rows = 0
+        self.updated = 0
+        self.skipped = 0
+
+    def load_checkpoint(self, restart=False):
+        """Resume after the last completed chunk, unless restarting or the shadow zset is gone"""
+        if restart:
+            self.client.delete(self.shadow_key, self.checkpoint_key)
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(self.checkpoint_key, 'last_id')
+        pipe.exists(self.shadow_key)
+        last_id, shadow_exists = pipe.execute()
+        if last_id and shadow_exists:
+            self.last_id = self.tracked_from = int(last_id)
+            logger.info(f"Resuming rescore to profile {self.version} after id {self.last_id}")
+        else:
+            self.client.delete(self.checkpoint_key)
+
+    def run_chunk(self):
+        """Rescore the next chunk; returns the number of rows read"""
+        rows = db.session.execute(
+            select(
+                Submission.id, Submission.score, Submission.metrics, Submission.score_version, Submission.timestamp,
+                or_(*(getattr(Submission, name).isnot(None) for name in METRIC_COLUMNS)).label('counted')
+            )
+            .where(Submission.id > self.last_id)
+            .order_by(Submission.id)
+            .limit(self.chunk_size)
+        ).all()
+        if not rows:
+            db.session.commit()
+            return 0
+
+        self.recent = recent_ids(self.recent, [row.id for row in rows])
+        scores = _score_chunk(self.scorer, [row.metrics for row in rows])
+        scored = [(row, score) for row, score in zip(rows, scores) if score is not None]
+        stale = [(row.id, score) for row, score in scored if row.score_version != self.version]
+        _write_scores(stale, self.version)
+        # Rows the summary doesn't count yet are counted, with their new score, by the backfill
+        moved = [(row.score, score) for row, score in scored if row.counted and row.score_version != self.version]
+        if moved:
+            deltas = histogram_deltas({'score': new} for _, new in moved)
+            add_deltas(deltas, ({'score': old} for old, _ in moved), sign=-1)
+            db.session.execute(summary_upsert(db.engine.dialect.name, deltas))
+        db.session.commit()
+
+        # Rows that cannot be scored keep their stored score, so the board still matches the table
+        board = {str(row.id): row.score for row, score in zip(rows, scores) if score is None and row.score is not None}
+        board.update((str(row.id), score) for row, score in scored)
+        pipe = self.client.pipeline()
+        if board:
+            pipe.zadd(self.shadow_key, board)
+            trim_leaderboard(pipe, self.shadow_key)
+        pipe.expire(self.shadow_key, SHADOW_TTL)
+        timed = [(row, score) for row, score in scored if row.timestamp is not None]
+        add_to_windows(pipe, [(row.id, score) for row, score in timed], [row.timestamp for row, _ in timed])
+        pipe.hset(self.checkpoint_key, 'last_id', rows[-1].id)
+        pipe.expire(self.checkpoint_key, SHADOW_TTL)
+        pipe.execute()
+
+        self.last_id = rows[-1].id
+        self.rows += len(rows)
+        self.updated += len(stale)
+        self.skipped += len(rows) - len(scored)
+        return len(rows)
+
+    def swap(self):
+        """Move the shadow zset into place, after sweeping up rows added during the run"""
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while True:
+            with SyncLock(self.client, Config.RECONCILE_LOCK_TTL * 1000) as acquired:
+                if acquired:
+                    while self.run_chunk():
+                        pass
+                    pipe = self.client.pipeline()
+                    if self.client.exists(self.shadow_key):
+                        pipe.persist(self.shadow_key)
+                        pipe.rename(self.shadow_key, LEADERBOARD_KEY)
+                    else:
+                        pipe.delete(LEADERBOARD_KEY)
+                    # Rows written after the swap are picked up by the reconciler's catch-up
+                    pipe.set(HIGH_WATER_MARK_KEY, self.last_id)
+                    queue_unseen_ids(pipe, unseen_ids(self.recent, self.tracked_from, self.last_id),
+                                     self.last_id, replace=True)
+                    pipe.incr(LEADERBOARD_VERSION_KEY)
+                    publish_leaderboard_event('reset', pipe)
+                    pipe.delete(self.checkpoint_key)
+                    pipe.execute()
+                    return
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for the leaderboard sync lock")
+            time.sleep(1)
+
+def rescore(version, chunk_size=None, restart=False):
+    """
+    Rescore all submissions with scoring profile `version` and swap in the new leaderboard
+    Returns a summary dict with rows read, rows rewritten, rows skipped and rows/sec
+    """
+    client = get_redis_client()
+    if not client:
+        raise RuntimeError("Redis is unavailable")
+
+    rescorer = Rescorer(client, version, chunk_size)
+    rescorer.load_checkpoint(restart)
+    started = time.perf_counter()
+    while rescorer.run_chunk():
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Rescored {rescorer.rows} rows up to id {rescorer.last_id} "
+            f"({rescorer.rows / elapsed:,.0f} rows/s)"
+        )
+    rescorer.swap()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'profile': rescorer.version,
+        'rows': rescorer.rows,
+        'updated': rescorer.updated,
+        'skipped': rescorer.skipped,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rescorer.rows / elapsed) if elapsed else None,
+    }
+    logger.info(f"Rescore to profile {rescorer.version} finished: {summary}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore all submissions with a scoring profile")
+    parser.add_argument('--profile', type=int, default=None, help='Profile version (default: Config.SCORING_PROFILE)')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Rows per chunk (default: Config.RESCORE_CHUNK_SIZE)')
+    parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start from the first row')
+    args = parser.parse_args()
+    with create_app().app_context():
+        try:
+            print(rescore(args.profile, args.chunk_size, args.restart))
+        except (RuntimeError, ValueError) as e:
+            sys.exit(str(e))
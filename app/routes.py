@@ -1,75 +1,98 @@
-from flask import jsonify, request
-from datetime import datetime, timedelta
-from sqlalchemy import text
-from app import app, db, limiter, logger
+import base64
+import binascii
+import hashlib
+import json
+import time
+from flask import Blueprint, current_app, jsonify, request
+from datetime import datetime
+from sqlalchemy import text, insert, select
+from app import db, fallback, limiter, logger
 from app.schemas import validate_submission
 from app.scoring import GPUScorer
 from app.models import Submission
-from app.redis_client import update_leaderboard, get_top_submissions
+from app.slots import allocate_slot, get_current_slot
+from app.stats import metric_columns, record_submissions, summary as stats_summary
+from app.stream import STREAM_HEADERS, broadcaster, opening_frame, sse_frame
+from app.encoding import cached_variant, vary
+from app.idempotency import idempotent
+from app.ingest import enqueue_submissions, lookup_ingested
+from app.metrics import metrics
+from app.migrations import pending_migrations
+from app.ranking import estimate_rank, estimate_submission_rank, estimate_total, fetch_overflow_page
+from app.redis_client import (
+    update_leaderboard, update_leaderboard_bulk,
+    get_cached_leaderboard, cache_leaderboard,
+    get_leaderboard_page, get_leaderboard_page_after, get_submission_rank,
+    get_leaderboard_memory, ping_redis, get_redis_status,
+    LEADERBOARD_METRICS, LEADERBOARD_WINDOWS, get_metric_leaderboard_page, metric_ascending
+)
 from sqlalchemy import exc
+from config import Config
 
+bp = Blueprint('api', __name__)
 scorer = GPUScorer()
 
-@app.route('/')
+@bp.route('/')
 def health_check():
     """Simple health check endpoint"""
     try:
         # Test database connection with proper text() wrapper
         db.session.execute(text('SELECT 1'))
-        # Test Redis connection by getting leaderboard
-        get_top_submissions(1)
+        # Test Redis connection; an outage degrades the service but is not fatal
+        redis_connected = ping_redis()
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "services": {
                 "database": "connected",
-                "redis": "connected"
-            }
+                "redis": "connected" if redis_connected else "unavailable"
+            },
+            "redis_circuit": get_redis_status(),
+            "leaderboard": get_leaderboard_memory() if redis_connected else None
         }), 200
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         return jsonify({
             "status": "unhealthy",
             "timestamp": datetime.utcnow().isoformat(),
             "error": str(e)
         }), 500
 
-def allocate_slot(submission):
-    """Allocate GPU slot to the given submission with proper locking"""
+@bp.route('/ready')
+@limiter.exempt
+def readiness_check():
+    """Readiness: the database answers and its schema is fully migrated"""
     try:
-        # Use serializable isolation level for the entire operation
-        with db.session.begin():
-            # Clear any expired slots first
-            expired = Submission.query.filter_by(slot_allocated=True).filter(
-                Submission.timestamp <= datetime.utcnow() - timedelta(hours=24)
-            ).with_for_update().all()
-
-            for exp in expired:
-                exp.slot_allocated = False
-
-            # Check if there's any active slot with row-level locking
-            active_slot = Submission.query.filter_by(slot_allocated=True).filter(
-                Submission.timestamp > datetime.utcnow() - timedelta(hours=24)
-            ).with_for_update().first()
+        pending = pending_migrations(db.engine)
+    except exc.SQLAlchemyError as e:
+        logger.error("Readiness check failed: %s", e)
+        return jsonify({'ready': False, 'database': 'unavailable'}), 503
 
-            if not active_slot:
-                submission.slot_allocated = True
-                db.session.commit()
-                logger.info(f"Allocated slot to submission {submission.id}")
-                return True
+    # Redis outages degrade the service but never make it unready
+    ready = not pending
+    return jsonify({
+        'ready': ready,
+        'database': 'connected',
+        'pending_migrations': pending,
+        'redis': 'connected' if ping_redis() else 'unavailable'
+    }), 200 if ready else 503
 
-            return False
+@bp.route('/rate_limits', methods=['GET'])
+def get_rate_limits():
+    """Show the caller's remaining allowance and counters for every rate limit"""
+    state = limiter.inspect(limiter.key_func())
+    if state is None:
+        return jsonify({'error': 'Rate limit state unavailable'}), 503
+    return jsonify({'client': limiter.key_func(), 'limits': state}), 200
 
-    except exc.SQLAlchemyError as e:
-        logger.error(f"Database error in slot allocation: {str(e)}")
-        db.session.rollback()
-        return False
-    except Exception as e:
-        logger.error(f"Error allocating slot: {str(e)}")
-        db.session.rollback()
-        return False
+@bp.route('/metrics', methods=['GET'])
+@limiter.exempt
+def get_metrics():
+    """Prometheus metrics for every process in the deployment"""
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/submit_qualification', methods=['POST'])
+@bp.route('/submit_qualification', methods=['POST'])
+@idempotent  # Outside the limit, so replays of a stored response aren't charged
 @limiter.limit("10 per hour")  # Changed to use "per" instead of "/" for consistency
 def submit_qualification():
     try:
@@ -88,29 +111,47 @@ def submit_qualification():
         except ValueError as e:
             return jsonify({'error': 'Score calculation failed', 'details': str(e)}), 400
 
+        timestamp = datetime.utcnow()
+
+        # In async mode, queue the scored submission for the ingest worker
+        if Config.ASYNC_INGEST:
+            ingest_ids = enqueue_submissions([(data, score, timestamp)], scorer.version)
+            if ingest_ids:
+                return jsonify({
+                    'success': True,
+                    'status': 'queued',
+                    'score': score,
+                    'provisional_id': ingest_ids[0]
+                }), 202
+            logger.warning("Ingest stream unavailable, writing submission synchronously")
+
         # Create submission within a transaction
+        columns = metric_columns(data)
         submission = Submission(
             metrics=data,
             score=score,
-            timestamp=datetime.utcnow()
+            score_version=scorer.version,
+            timestamp=timestamp,
+            **columns
         )
 
         try:
             db.session.add(submission)
             db.session.flush()  # Get the ID without committing
+            record_submissions([{'score': score, **columns}])
 
-            # Update Redis leaderboard
-            if not update_leaderboard(submission.id, score):
-                logger.error(f"Failed to update leaderboard for submission {submission.id}")
+            # Update Redis leaderboard and read back the leader in one round trip
+            leader = update_leaderboard(submission.id, score, data, timestamp)
+            if not leader:
+                logger.error("Failed to update leaderboard for submission %s", submission.id)
 
             db.session.commit()
 
             # Try to allocate slot if score is high enough
-            top_submissions = get_top_submissions(1)
-            if top_submissions and top_submissions[0][0] == submission.id:
-                allocate_slot(submission)
+            if leader and leader[0] == submission.id:
+                allocate_slot(submission.id)
 
-            logger.info(f"New submission processed successfully with score {score}")
+            logger.info("New submission processed successfully with score %s", score)
             return jsonify({
                 'success': True,
                 'score': score,
@@ -119,63 +160,539 @@ def submit_qualification():
 
         except exc.SQLAlchemyError as e:
             db.session.rollback()
-            logger.error(f"Database error processing submission: {str(e)}")
+            logger.error("Database error processing submission: %s", e)
             return jsonify({'error': 'Database error occurred'}), 500
 
     except Exception as e:
-        logger.error(f"Error processing submission: {str(e)}")
+        logger.error("Error processing submission: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/leaderboard', methods=['GET'])
-def get_leaderboard():
+def parse_batch_body():
+    """Parse a batch body sent either as a JSON array or as NDJSON (one object per line)"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+
+    data = request.get_json(silent=True)
+    if data is not None and not isinstance(data, list):
+        raise ValueError("Batch body must be a JSON array or NDJSON")
+    return data
+
+@bp.route('/submit_qualification/batch', methods=['POST'])
+@idempotent
+@limiter.limit("10 per hour")
+def submit_qualification_batch():
+    try:
+        try:
+            items = parse_batch_body()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid batch format', 'details': str(e)}), 400
+
+        if not items:
+            return jsonify({'error': 'No data provided'}), 400
+
+        if len(items) > Config.MAX_BATCH_SIZE:
+            return jsonify({
+                'error': 'Batch too large',
+                'details': f"At most {Config.MAX_BATCH_SIZE} submissions per batch"
+            }), 400
+
+        # Validate every item, keeping per-item errors in input order
+        results = [None] * len(items)
+        valid_indices = []
+        for index, data in enumerate(items):
+            validation_error = validate_submission(data)
+            if validation_error:
+                results[index] = {
+                    'index': index,
+                    'success': False,
+                    'error': 'Invalid submission format',
+                    'details': validation_error
+                }
+            else:
+                valid_indices.append(index)
+
+        if not valid_indices:
+            return jsonify({'error': 'No valid submissions in batch', 'results': results}), 400
+
+        valid_items = [items[index] for index in valid_indices]
+        try:
+            scores = scorer.calculate_scores(valid_items)
+        except ValueError as e:
+            return jsonify({'error': 'Score calculation failed', 'details': str(e)}), 400
+
+        timestamp = datetime.utcnow()
+
+        # In async mode, queue the scored submissions for the ingest worker
+        if Config.ASYNC_INGEST:
+            ingest_ids = enqueue_submissions(
+                [(data, score, timestamp) for data, score in zip(valid_items, scores)], scorer.version
+            )
+            if ingest_ids:
+                for index, ingest_id, score in zip(valid_indices, ingest_ids, scores):
+                    results[index] = {
+                        'index': index,
+                        'success': True,
+                        'status': 'queued',
+                        'score': score,
+                        'provisional_id': ingest_id
+                    }
+                return jsonify({
+                    'success': True,
+                    'accepted': len(valid_indices),
+                    'rejected': len(items) - len(valid_indices),
+                    'results': results
+                }), 202
+            logger.warning("Ingest stream unavailable, writing batch synchronously")
+
+        rows = [
+            {'metrics': data, 'score': score, 'score_version': scorer.version,
+             'timestamp': timestamp, 'slot_allocated': False, **metric_columns(data)}
+            for data, score in zip(valid_items, scores)
+        ]
+
+        try:
+            # One multi-row INSERT ... RETURNING id, in input order
+            submission_ids = db.session.scalars(
+                insert(Submission).returning(Submission.id, sort_by_parameter_order=True),
+                rows
+            ).all()
+            record_submissions(rows)
+
+            # Update Redis leaderboard with a single ZADD and read back the leader
+            leader = update_leaderboard_bulk(
+                list(zip(submission_ids, scores)), valid_items, [timestamp] * len(scores)
+            )
+            if not leader:
+                logger.error("Failed to update leaderboard for batch of %s submissions", len(submission_ids))
+
+            db.session.commit()
+
+        except exc.SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error("Database error processing batch: %s", e)
+            return jsonify({'error': 'Database error occurred'}), 500
+
+        for index, submission_id, score in zip(valid_indices, submission_ids, scores):
+            results[index] = {
+                'index': index,
+                'success': True,
+                'score': score,
+                'submission_id': submission_id
+            }
+
+        # Try to allocate slot if one of the new submissions took the top spot
+        if leader and leader[0] in set(submission_ids):
+            allocate_slot(leader[0])
+
+        logger.info(
+            "Batch processed successfully: %s accepted, %s rejected",
+            len(valid_indices), len(items) - len(valid_indices)
+        )
+        return jsonify({
+            'success': True,
+            'accepted': len(valid_indices),
+            'rejected': len(items) - len(valid_indices),
+            'results': results
+        }), 200
+
+    except Exception as e:
+        logger.error("Error processing batch submission: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def fetch_submission_details(submission_ids, first_rank=1):
+    """
+    Fetch leaderboard rows for the given ids with a single IN query, keeping the given order
+    Ids are expected in rank order starting at `first_rank` (1-based)
+    """
+    if not submission_ids:
+        return []
+
+    rows = db.session.execute(submission_details_query(submission_ids)).all()
+    return submission_details(rows, submission_ids, first_rank)
+
+def submission_details_query(submission_ids):
+    return select(Submission.id, Submission.score, Submission.timestamp).where(Submission.id.in_(submission_ids))
+
+def submission_details(rows, submission_ids, first_rank=1):
+    """Leaderboard rows from submission_details_query(), in the order of submission_ids"""
+    by_id = {row.id: row for row in rows}
+
+    return [
+        {
+            'rank': first_rank + position,
+            'submission_id': by_id[sub_id].id,
+            'score': by_id[sub_id].score,
+            'timestamp': by_id[sub_id].timestamp
+        }
+        for position, sub_id in enumerate(submission_ids) if sub_id in by_id
+    ]
+
+def encode_cursor(submission_id, score, next_offset):
+    """Opaque pagination cursor pointing at the last entry of a page and the offset after it"""
+    return base64.urlsafe_b64encode(f"{score!r}:{submission_id}:{next_offset}".encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Return (submission_id, score, next_offset) from a cursor, raising ValueError if malformed
+    next_offset is None for cursors issued before it was included
+    """
+    try:
+        score, submission_id, *next_offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        if len(next_offset) > 1:
+            raise ValueError("Too many cursor fields")
+        return int(submission_id), float(score), int(next_offset[0]) if next_offset else None
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+def leaderboard_page():
+    """Serve one page of the leaderboard, all-time or for a time window, by offset/limit or by cursor"""
+    limit = request.args.get('limit', 10, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor')
+    window = request.args.get('window', 'all')
+    if not 1 <= limit <= Config.LEADERBOARD_MAX_PAGE_SIZE or offset < 0:
+        return jsonify({
+            'error': 'Invalid pagination parameters',
+            'details': f"limit must be 1-{Config.LEADERBOARD_MAX_PAGE_SIZE} and offset must be >= 0"
+        }), 400
+    if window != 'all' and window not in LEADERBOARD_WINDOWS:
+        return jsonify({
+            'error': 'Invalid window',
+            'details': f"window must be one of: all, {', '.join(LEADERBOARD_WINDOWS)}"
+        }), 400
+    window_name = None if window == 'all' else window
+
+    # The all-time board falls back to a snapshot or Postgres when Redis is down
+    snapshot = None
+    if cursor:
+        try:
+            cursor_id, cursor_score, cursor_offset = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if window_name:
+            page = get_leaderboard_page_after(cursor_id, cursor_score, limit, window_name)
+        else:
+            page = fallback.leaderboard_page_after(cursor_id, cursor_score, limit, cursor_offset)
+        if page is None:
+            return unavailable_response()
+        offset, entries, total, *snapshot = page
+    else:
+        if window_name:
+            page = get_leaderboard_page(offset, limit, window_name)
+        else:
+            page = fallback.leaderboard_page(offset, limit)
+        if page is None:
+            return unavailable_response()
+        entries, total, *snapshot = page
+    snapshot = snapshot[0] if snapshot else None
+
+    has_more = offset + len(entries) < total
     try:
-        # Get top 10 submissions from Redis with error handling
-        top_submissions_redis = get_top_submissions(10)
-        if top_submissions_redis is None:
-            return jsonify({'error': 'Failed to fetch leaderboard data'}), 500
+        # In top-K mode Redis ends at rank K; the rest of the all-time board is in Postgres
+        if 0 < Config.LEADERBOARD_TOP_K <= total and not window_name and not snapshot:
+            total = max(total, estimate_total())
+            if len(entries) < limit:
+                # Fetch one extra row to tell whether another page follows
+                wanted = limit - len(entries) + 1
+                if entries:
+                    overflow = fetch_overflow_page(wanted, after=entries[-1])
+                elif cursor:
+                    overflow = fetch_overflow_page(wanted, after=(cursor_id, cursor_score))
+                    offset = cursor_offset if cursor_offset is not None else estimate_rank(cursor_score)
+                else:
+                    overflow = fetch_overflow_page(wanted, offset=offset)
+                has_more = len(overflow) == wanted
+                entries = entries + overflow[:wanted - 1]
+                total = max(total, offset + len(entries) + has_more)
+            else:
+                has_more = offset + len(entries) < total
 
-        # Get submission details from database
+        submissions_details = fetch_submission_details(
+            [sub_id for sub_id, _ in entries], first_rank=offset + 1
+        )
+    except exc.SQLAlchemyError as e:
+        logger.error("Error fetching leaderboard submissions: %s", e)
+        return jsonify({'error': 'Database error occurred'}), 500
+
+    payload = {
+        'leaderboard': submissions_details,
+        'window': window,
+        'offset': offset,
+        'limit': limit,
+        'total': total,
+        'next_cursor': encode_cursor(*entries[-1], offset + len(entries)) if entries and has_more else None,
+        'current_slot': get_current_slot()
+    }
+    if snapshot:
+        payload['degraded'] = snapshot.freshness()
+    return degraded_headers(jsonify(payload), snapshot), 200
+
+def unavailable_response():
+    response = jsonify({'error': 'Leaderboard unavailable'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def degraded_headers(response, snapshot):
+    """Mark a response built without Redis: Age gives how old its data is"""
+    if snapshot:
+        response.headers['X-Leaderboard-Source'] = snapshot.freshness()['source']
+        response.headers['Age'] = str(int(snapshot.age()))
+    return response
+
+def leaderboard_response(etag, body):
+    """
+    Wrap a rendered leaderboard payload in the representation the client
+    negotiated (see app.encoding), answering 304 when the client's ETag matches
+    """
+    etag, mimetype, coding, data = cached_variant(
+        etag, body, request.headers.get('Accept'), request.headers.get('Accept-Encoding')
+    )
+    # Compared here rather than with make_conditional(), which adds a second
+    # Date header next to the server's
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.vary.update(vary(mimetype))
+    else:
+        response = current_app.response_class(data, mimetype=mimetype)
+        if coding:
+            response.headers['Content-Encoding'] = coding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def render_leaderboard():
+    """
+    Return (etag, body, snapshot) for the default top-10 view, from the cache
+    when it is current. snapshot is set when Redis could not serve the board
+    (see app.fallback). Returns None if no tier can answer.
+    """
+    # Serve the cached payload if it was rendered for the current version
+    version, etag, body = get_cached_leaderboard()
+    if body is not None:
+        return etag, body, None
+
+    # Get top 10 submissions from Redis, or from the fallback tiers
+    top = fallback.top_submissions(10)
+    if top is None:
+        return None
+    top_submissions, snapshot = top
+    if snapshot and snapshot.rendered:
+        return (*snapshot.rendered, snapshot)
+
+    # Get submission details from database in one query
+    try:
+        submissions_details = fetch_submission_details(
+            [sub_id for sub_id, _ in top_submissions]
+        )
+    except exc.SQLAlchemyError as e:
+        logger.error("Error fetching leaderboard submissions: %s", e)
+        if snapshot:
+            return None
         submissions_details = []
-        for sub_id, score in top_submissions_redis:
-            try:
-                submission = Submission.query.get(sub_id)
-                if submission:
-                    submissions_details.append({
-                        'submission_id': submission.id,
-                        'score': submission.score,
-                        'timestamp': submission.timestamp.isoformat()
-                    })
-            except exc.SQLAlchemyError as e:
-                logger.error(f"Error fetching submission {sub_id}: {str(e)}")
-                continue
-
-        # Get current active slot with proper error handling
+
+    # Get current slot lease, allocating it to the top submission if free
+    current_slot = get_current_slot()
+    if not current_slot and submissions_details and not snapshot:
+        _, current_slot = allocate_slot(submissions_details[0]['submission_id'])
+
+    payload = {
+        'leaderboard': submissions_details,
+        'current_slot': current_slot
+    }
+    if snapshot:
+        payload['degraded'] = snapshot.freshness()
+    etag, body = render_payload(payload)
+
+    # Degraded bodies are kept with their snapshot instead of in Redis
+    if snapshot:
+        snapshot.rendered = (etag, body)
+        return etag, body, snapshot
+
+    cache_leaderboard(version, etag, body, leaderboard_cache_ttl(current_slot))
+    return etag, body, None
+
+def render_payload(payload):
+    """Serialise a leaderboard payload; returns tuple (etag, body)"""
+    body = current_app.json.dumps(payload)
+    return hashlib.sha1(body.encode()).hexdigest(), body
+
+def leaderboard_cache_ttl(current_slot):
+    """Seconds a rendered leaderboard may be cached: never past the slot's expiry"""
+    ttl = Config.LEADERBOARD_CACHE_TTL
+    if current_slot:
+        expires_at = datetime.fromisoformat(current_slot['expires_at'])
+        ttl = min(ttl, int((expires_at - datetime.utcnow()).total_seconds()))
+    return ttl
+
+@bp.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    try:
+        if any(param in request.args for param in ('offset', 'limit', 'cursor', 'window')):
+            return leaderboard_page()
+
+        rendered = render_leaderboard()
+        if rendered is None:
+            return unavailable_response()
+        etag, body, snapshot = rendered
+        return degraded_headers(leaderboard_response(etag, body), snapshot)
+
+    except Exception as e:
+        logger.error("Error fetching leaderboard: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/leaderboard/stream', methods=['GET'])
+@limiter.limit("120 per hour")  # Clients reconnect every STREAM_MAX_SECONDS
+def stream_leaderboard():
+    """
+    Server-Sent Events: a 'snapshot' of the top-10 view, then 'entered', 'slot'
+    and 'reset' events as they are published. The stream ends after
+    Config.STREAM_MAX_SECONDS and the client reconnects with a fresh snapshot,
+    or continues from Last-Event-ID when it comes back to this process.
+    The ASGI app serves streams without a thread each (AsgiApp.stream_leaderboard).
+    """
+    after = broadcaster.resume_point(request.headers.get('Last-Event-ID'))
+    snapshot = None
+    if after is None:
+        after = broadcaster.subscribe()
         try:
-            current_slot = Submission.query.filter_by(
-                slot_allocated=True
-            ).filter(
-                Submission.timestamp > datetime.utcnow() - timedelta(hours=24)
-            ).first()
-
-            # Allocate slot to top submission if no active slot
-            if not current_slot and submissions_details:
-                top_submission = Submission.query.get(submissions_details[0]['submission_id'])
-                if top_submission:
-                    allocate_slot(top_submission)
-                    current_slot = top_submission
+            rendered = render_leaderboard()
+        except Exception as e:
+            logger.error("Error rendering leaderboard snapshot: %s", e)
+            rendered = None
+        if rendered is None:
+            return jsonify({'error': 'Leaderboard unavailable'}), 503
+        snapshot = sse_frame(rendered[1], 'snapshot', broadcaster.event_id(after))
+
+    def generate(after):
+        yield opening_frame(Config.STREAM_RETRY_MS, snapshot)
+        deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            after, frames = broadcaster.frames(after, Config.STREAM_KEEPALIVE_SECONDS)
+            # A comment line keeps proxies from closing an idle stream
+            yield ''.join(frames) if frames else ': keepalive\n\n'
+
+    response = current_app.response_class(generate(after), mimetype='text/event-stream')
+    response.headers.update(STREAM_HEADERS)
+    return response
 
+@bp.route('/leaderboard/<metric>', methods=['GET'])
+def get_metric_leaderboard(metric):
+    """Leaderboard ranked by one raw metric (lowest first for completion_time)"""
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({
+            'error': 'Unknown metric',
+            'details': f"metric must be one of: {', '.join(LEADERBOARD_METRICS)}"
+        }), 404
+
+    limit = request.args.get('limit', 10, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if not 1 <= limit <= Config.LEADERBOARD_MAX_PAGE_SIZE or offset < 0:
+        return jsonify({
+            'error': 'Invalid pagination parameters',
+            'details': f"limit must be 1-{Config.LEADERBOARD_MAX_PAGE_SIZE} and offset must be >= 0"
+        }), 400
+
+    try:
+        page = get_metric_leaderboard_page(metric, offset, limit)
+        if page is None:
+            return jsonify({'error': 'Leaderboard unavailable'}), 503
+        entries, total = page
+
+        values = dict(entries)
+        try:
+            submissions_details = fetch_submission_details(
+                [sub_id for sub_id, _ in entries], first_rank=offset + 1
+            )
+        except exc.SQLAlchemyError as e:
+            logger.error("Error fetching %s leaderboard submissions: %s", metric, e)
+            return jsonify({'error': 'Database error occurred'}), 500
+        for details in submissions_details:
+            details['value'] = values[details['submission_id']]
+
+        return jsonify({
+            'metric': metric,
+            'order': 'ascending' if metric_ascending(metric) else 'descending',
+            'leaderboard': submissions_details,
+            'offset': offset,
+            'limit': limit,
+            'total': total
+        }), 200
+
+    except Exception as e:
+        logger.error("Error fetching %s leaderboard: %s", metric, e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/submissions/queued/<provisional_id>', methods=['GET'])
+def get_queued_submission(provisional_id):
+    """Resolve a provisional id from async ingestion to the stored submission"""
+    try:
+        stored = lookup_ingested(provisional_id)
+        if not stored:
+            return jsonify({'status': 'queued', 'provisional_id': provisional_id}), 202
+        submission_id, score = stored
+        return jsonify({
+            'status': 'stored',
+            'provisional_id': provisional_id,
+            'submission_id': submission_id,
+            'score': score
+        }), 200
+    except exc.SQLAlchemyError as e:
+        logger.error("Database error looking up queued submission: %s", e)
+        return jsonify({'error': 'Database error occurred'}), 500
+
+@bp.route('/submissions/<int:submission_id>/rank', methods=['GET'])
+def get_rank(submission_id):
+    try:
+        neighbours = request.args.get('neighbours', 2, type=int)
+        if not 0 <= neighbours <= Config.RANK_MAX_NEIGHBOURS:
             return jsonify({
-                'leaderboard': submissions_details,
-                'current_slot': {
-                    'submission_id': current_slot.id,
-                    'expires_at': (current_slot.timestamp + timedelta(hours=24)).isoformat()
-                } if current_slot else None
-            }), 200
+                'error': 'Invalid neighbours parameter',
+                'details': f"neighbours must be 0-{Config.RANK_MAX_NEIGHBOURS}"
+            }), 400
+
+        ranking = get_submission_rank(submission_id, neighbours)
+        if ranking is None:
+            return jsonify({'error': 'Leaderboard unavailable'}), 503
+
+        try:
+            # Outside the Redis top K, estimate the rank from Postgres
+            if ranking is False and Config.LEADERBOARD_TOP_K > 0:
+                ranking = estimate_submission_rank(submission_id, neighbours)
+            elif ranking and Config.LEADERBOARD_TOP_K > 0:
+                ranking['total'] = max(ranking['total'], estimate_total())
+            if ranking is False:
+                return jsonify({'error': 'Submission not found on leaderboard'}), 404
 
+            neighbour_details = fetch_submission_details(
+                [sub_id for sub_id, _ in ranking['neighbours']],
+                first_rank=ranking['neighbours_offset'] + 1
+            )
         except exc.SQLAlchemyError as e:
-            logger.error(f"Database error in slot management: {str(e)}")
+            logger.error("Error fetching rank neighbours: %s", e)
             return jsonify({'error': 'Database error occurred'}), 500
 
+        total = ranking['total']
+        return jsonify({
+            'submission_id': submission_id,
+            'rank': ranking['rank'] + 1,
+            'score': ranking['score'],
+            'total': total,
+            # Share of the leaderboard this submission ranks level with or above
+            'percentile': round(100 * (total - ranking['rank']) / total, 2),
+            'approximate': ranking.get('approximate', False),
+            'neighbours': neighbour_details
+        }), 200
+
     except Exception as e:
-        logger.error(f"Error fetching leaderboard: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        logger.error("Error fetching rank for submission %s: %s", submission_id, e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Score and metric distributions across all submissions (see app.stats)"""
+    try:
+        return jsonify(stats_summary()), 200
+    except exc.SQLAlchemyError as e:
+        logger.error("Error reading submission statistics: %s", e)
+        return jsonify({'error': 'Database error occurred'}), 500
@@ -1,4 +1,5 @@
-from jsonschema import validate, ValidationError
+from jsonschema import validators
+from jsonschema.exceptions import best_match
 
 submission_schema = {
     "type": "object",
@@ -50,13 +51,40 @@ submission_schema = {
     "additionalProperties": False
 }
 
+# Compiled once: validate() would re-check the schema and build a validator on every call
+_validator_class = validators.validator_for(submission_schema)
+_validator_class.check_schema(submission_schema)
+_validator = _validator_class(submission_schema)
+
+# (field, minimum, maximum) for the fast path, derived from the schema so the two cannot drift
+_FIELD_BOUNDS = tuple(
+    (name, spec.get('minimum'), spec.get('maximum'))
+    for name, spec in submission_schema['properties'].items()
+)
+
+def _is_plain_valid(data):
+    """
+    Accept the common case without jsonschema: a plain dict holding exactly the
+    five fields, each a plain int or float within range. Comparisons mirror
+    jsonschema's (a value fails only if it is below minimum or above maximum).
+    Anything else is left to the full validator.
+    """
+    if type(data) is not dict or len(data) != len(_FIELD_BOUNDS):
+        return False
+    for name, minimum, maximum in _FIELD_BOUNDS:
+        value = data.get(name)
+        if type(value) is not float and type(value) is not int:
+            return False
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            return False
+    return True
+
 def validate_submission(data):
     """
     Validate submission data against the schema
-    Returns tuple (is_valid, error_message)
+    Returns None if valid, otherwise the validation error message
     """
-    try:
-        validate(instance=data, schema=submission_schema)
-        return None  # No validation errors
-    except ValidationError as e:
-        return str(e)  # Return validation error message
\ No newline at end of file
+    if _is_plain_valid(data):
+        return None
+    error = best_match(_validator.iter_errors(data))
+    return str(error) if error is not None else None
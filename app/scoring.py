@@ -1,3 +1,23 @@
+from config import Config
+
+# Versioned scoring profiles. A published profile is never edited: add a new
+# version, point Config.SCORING_PROFILE at it, then rescore existing rows with
+#   python -m app.rescore --profile <version>
+SCORING_PROFILES = {
+    1: {
+        'weights': {
+            'gpu_utilization': 0.25,  # Higher utilization is better
+            'memory_usage': 0.20,     # Efficient memory usage is better
+            'power_efficiency': 0.25,  # Better power efficiency gets higher score
+            'completion_time': 0.15,   # Faster completion time is better
+            'accuracy': 0.15          # Higher accuracy is better
+        },
+        # Completion time earning the full (best) and zero (worst) time score, in seconds
+        'completion_time_best': 1,
+        'completion_time_worst': 300,
+    },
+}
+
 class GPUScorer:
     """
     GPU Qualification Scoring System
@@ -5,7 +25,7 @@ class GPUScorer:
     This class implements a weighted scoring system for GPU qualification submissions.
     The final score (0-100) is calculated based on five key metrics with different weights:
 
-    Weights:
+    Weights (scoring profile 1):
     - GPU Utilization (25%): Higher utilization indicates better use of GPU resources
     - Memory Usage (20%): Efficient memory usage is crucial for GPU performance
     - Power Efficiency (25%): Emphasizes energy-efficient computing
@@ -19,20 +39,24 @@ class GPUScorer:
     - Completion time of 1 second or less
     - 100% accuracy in calculations
     """
-    def __init__(self):
-        # Weights for different metrics (total = 1.0)
-        self.weights = {
-            'gpu_utilization': 0.25,  # Higher utilization is better
-            'memory_usage': 0.20,     # Efficient memory usage is better
-            'power_efficiency': 0.25,  # Better power efficiency gets higher score
-            'completion_time': 0.15,   # Faster completion time is better
-            'accuracy': 0.15          # Higher accuracy is better
-        }
+    # Metrics where a smaller value ranks higher on a per-metric leaderboard
+    LOWER_IS_BETTER = frozenset({'completion_time'})
+
+    def __init__(self, version=None):
+        # Scoring profile (weights total 1.0), by default the one new submissions use
+        self.version = version or Config.SCORING_PROFILE
+        if self.version not in SCORING_PROFILES:
+            raise ValueError(f"Unknown scoring profile: {self.version}")
+        profile = SCORING_PROFILES[self.version]
+        self.weights = dict(profile['weights'])
+        self.time_best = profile['completion_time_best']
+        self.time_worst = profile['completion_time_worst']
 
     def normalize_completion_time(self, time):
         """
         Normalize completion time to a 0-1 scale
-        Lower is better, max score at 1 second, min at 300 seconds
+        Lower is better, max score at the profile's best time (1 second in
+        profile 1), min at its worst (300 seconds)
 
         Args:
             time (float): Completion time in seconds
@@ -40,7 +64,7 @@ class GPUScorer:
         Returns:
             float: Normalized score between 0 and 1
         """
-        return max(0, min(1, (300 - time) / 299))
+        return max(0, min(1, (self.time_worst - time) / (self.time_worst - self.time_best)))
 
     def calculate_score(self, metrics):
         """
@@ -80,4 +104,53 @@ class GPUScorer:
         except KeyError as e:
             raise ValueError(f"Missing required metric: {str(e)}")
         except Exception as e:
-            raise ValueError(f"Error calculating score: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Error calculating score: {str(e)}")
+
+    def calculate_scores(self, metrics_list):
+        """
+        Calculate scores for a batch of submissions in one pass
+
+        The metrics are transposed into one column per metric and each weighted
+        term is accumulated column by column, in the same order as
+        calculate_score, so every result is identical to the per-item score.
+
+        Args:
+            metrics_list (list): List of metric dictionaries, each containing the
+                               five key metrics accepted by calculate_score
+
+        Returns:
+            list: Final scores from 0-100, rounded to 2 decimal places, in the
+                  same order as the input
+
+        Raises:
+            ValueError: If any required metric is missing or invalid
+        """
+        try:
+            gpu_utilization = [m['gpu_utilization'] for m in metrics_list]
+            memory_usage = [m['memory_usage'] for m in metrics_list]
+            power_efficiency = [m['power_efficiency'] for m in metrics_list]
+            completion_time = [m['completion_time'] for m in metrics_list]
+            accuracy = [m['accuracy'] for m in metrics_list]
+        except KeyError as e:
+            raise ValueError(f"Missing required metric: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"Error calculating score: {str(e)}")
+
+        try:
+            w = self.weights
+            scores = [0] * len(metrics_list)
+            scores = [s + v / 100 * w['gpu_utilization']
+                      for s, v in zip(scores, gpu_utilization)]
+            scores = [s + v / 100 * w['memory_usage']
+                      for s, v in zip(scores, memory_usage)]
+            scores = [s + v / 100 * w['power_efficiency']
+                      for s, v in zip(scores, power_efficiency)]
+            scores = [s + self.normalize_completion_time(v) * w['completion_time']
+                      for s, v in zip(scores, completion_time)]
+            scores = [s + v / 100 * w['accuracy']
+                      for s, v in zip(scores, accuracy)]
+
+            return [round(s * 100, 2) for s in scores]
+
+        except Exception as e:
+            raise ValueError(f"Error calculating score: {str(e)}")
@@ -0,0 +1,82 @@
+"""
+GPU slot management
+
+Slot ownership is a Redis lease (SET NX PX) that expires on its own after
+Config.GPU_SLOT_DURATION, so checking or taking the slot is a single O(1)
+Redis call with no row locks. Postgres keeps the record of which submissions
+held the slot; that write happens on a background thread after the lease is won.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, exc
+from app import db, logger
+from app.models import Submission
+from app.redis_client import acquire_slot_lease, get_slot_lease, publish_leaderboard_event
+from config import Config
+
+_recorder = None
+
+def _get_recorder():
+    global _recorder
+    if _recorder is None:
+        _recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slot-recorder')
+    return _recorder
+
+def _reset_after_fork():
+    global _recorder
+    _recorder = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _record_slot_holder(app, submission_id):
+    """Mark the submission as a slot holder in Postgres"""
+    with app.app_context():
+        try:
+            db.session.execute(
+                update(Submission)
+                .where(Submission.id == submission_id)
+                .values(slot_allocated=True)
+            )
+            db.session.commit()
+            logger.info("Recorded slot allocation for submission %s", submission_id)
+        except exc.SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Database error recording slot allocation: {str(e)}")
+
+def slot_info(submission_id, ttl_ms):
+    """Describe a lease as {'submission_id', 'expires_at'}"""
+    return {
+        'submission_id': submission_id,
+        'expires_at': (datetime.utcnow() + timedelta(milliseconds=ttl_ms)).isoformat()
+    }
+
+def get_current_slot():
+    """
+    Return the active slot as {'submission_id', 'expires_at'}, or None if the
+    slot is free or Redis is unavailable
+    """
+    lease = get_slot_lease()
+    return slot_info(*lease) if lease else None
+
+def allocate_slot(submission_id):
+    """
+    Try to give the GPU slot to a submission
+    Returns tuple (allocated, current_slot): allocated is True only for the
+    caller that won the lease; current_slot describes whoever holds it now
+    (None if Redis is unavailable)
+    """
+    lease = acquire_slot_lease(submission_id, Config.GPU_SLOT_DURATION * 1000)
+    if lease is None:
+        return False, None
+
+    won, holder_id, ttl_ms = lease
+    if won:
+        logger.info("Allocated slot to submission %s", submission_id)
+        _get_recorder().submit(_record_slot_holder, current_app._get_current_object(), submission_id)
+
+    current_slot = slot_info(holder_id, ttl_ms) if holder_id is not None else None
+    if won:
+        publish_leaderboard_event('slot', current_slot=current_slot)
+    return won, current_slot
@@ -0,0 +1,137 @@
+"""
+Submission statistics from an incrementally maintained summary table
+
+Every write of a submission also adds its score and its five metrics (the
+typed columns, see app.models.METRIC_COLUMNS) to submission_histograms, in the
+same transaction. Each (field, bucket, shard) row holds how many values fell
+in the bucket and their sum. GET /stats aggregates that table in one GROUP BY,
+so its cost depends on the number of buckets, not on the number of
+submissions:
+- means are exact: sum / count
+- histograms are the bucket counts
+- percentiles are interpolated within their bucket, so they are accurate to
+  one bucket width
+
+Writers pick one of Config.STATS_SHARDS shards per transaction, so concurrent
+submissions rarely wait on the same summary row, and upsert their rows in key
+order, so two writers cannot deadlock. Rescoring moves scores between buckets
+(app.rescore), and migration 0006 counts the rows that existed before.
+
+Changing a field's bucket layout in HISTOGRAMS needs a migration that
+rebuilds its rows.
+"""
+import math
+import random
+from collections import defaultdict
+from sqlalchemy import func, select
+from app import db
+from app.models import METRIC_COLUMNS, SubmissionHistogram
+from config import Config
+
+# Field -> (bucket width, number of buckets), buckets starting at 0. Values
+# past the last bucket are counted in it, so means stay exact but percentiles
+# there are capped at its upper edge.
+HISTOGRAMS = {
+    'score': (1, 100),
+    'gpu_utilization': (1, 100),
+    'memory_usage': (1, 100),
+    'power_efficiency': (1, 100),
+    'completion_time': (5, 120),  # 0-600 seconds
+    'accuracy': (1, 100),
+}
+
+PERCENTILES = (25, 50, 75, 90, 99)
+
+def metric_columns(data):
+    """Typed column values for a metrics dict; missing or non-numeric metrics are None"""
+    values = {}
+    for name in METRIC_COLUMNS:
+        value = data.get(name) if isinstance(data, dict) else None
+        numeric = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+        values[name] = float(value) if numeric else None
+    return values
+
+def bucket_of(field, value):
+    width, buckets = HISTOGRAMS[field]
+    return min(max(int(value // width), 0), buckets - 1)
+
+def add_deltas(deltas, rows, sign=1):
+    """
+    Count rows (mappings of field -> value, None for absent) into deltas, a
+    defaultdict keyed by (field, bucket) holding [count, total]. sign=-1 removes them.
+    """
+    for row in rows:
+        for field in HISTOGRAMS:
+            value = row.get(field)
+            if value is not None:
+                delta = deltas[(field, bucket_of(field, value))]
+                delta[0] += sign
+                delta[1] += sign * value
+    return deltas
+
+def histogram_deltas(rows, sign=1):
+    return add_deltas(defaultdict(lambda: [0, 0.0]), rows, sign)
+
+def summary_upsert(dialect_name, deltas):
+    """INSERT ... ON CONFLICT statement adding deltas (from histogram_deltas()) to one shard"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = SubmissionHistogram.__table__
+    shard = random.randrange(Config.STATS_SHARDS)
+    stmt = insert(table).values([
+        {'field': field, 'bucket': bucket, 'shard': shard, 'count': count, 'total': total}
+        for (field, bucket), (count, total) in sorted(deltas.items())
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=['field', 'bucket', 'shard'],
+        set_={
+            'count': table.c['count'] + stmt.excluded['count'],
+            'total': table.c['total'] + stmt.excluded['total'],
+        }
+    )
+
+def record_submissions(rows, sign=1):
+    """Add rows (mappings with 'score' and the metric columns) to the summary in the current transaction"""
+    deltas = histogram_deltas(rows, sign)
+    if deltas:
+        db.session.execute(summary_upsert(db.engine.dialect.name, deltas))
+
+def percentile(counts, width, total, p):
+    """Value below which p% of a histogram's values fall, interpolated within its bucket"""
+    rank = p / 100 * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            return round((index + (rank - seen) / count) * width, 4)
+        seen += count
+    return None
+
+def summary():
+    """Count, mean, percentiles and histogram of the score and every metric"""
+    rows = db.session.execute(
+        select(
+            SubmissionHistogram.field, SubmissionHistogram.bucket,
+            func.sum(SubmissionHistogram.count), func.sum(SubmissionHistogram.total)
+        ).group_by(SubmissionHistogram.field, SubmissionHistogram.bucket)
+    ).all()
+
+    counts = {field: [0] * buckets for field, (_, buckets) in HISTOGRAMS.items()}
+    sums = dict.fromkeys(HISTOGRAMS, 0.0)
+    for field, bucket, count, total in rows:
+        if field in counts and 0 <= bucket < len(counts[field]):
+            counts[field][bucket] += int(count)
+            sums[field] += total
+
+    fields = {}
+    for field, (width, _) in HISTOGRAMS.items():
+        total = sum(counts[field])
+        fields[field] = {
+            'count': total,
+            'mean': round(sums[field] / total, 4) if total else None,
+            'percentiles': {f"p{p}": percentile(counts[field], width, total, p) if total else None
+                            for p in PERCENTILES},
+            'histogram': {'bucket_width': width, 'counts': counts[field]},
+        }
+    return {'submissions': fields['score']['count'], 'fields': fields}
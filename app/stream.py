@@ -0,0 +1,182 @@
+"""
+Live leaderboard fan-out for /leaderboard/stream
+
+The write path publishes compact change events on
+LEADERBOARD_EVENTS_CHANNEL (see redis_client.publish_leaderboard_event). Each
+process holds a single subscription to that channel, on a background thread
+started by the first stream. The thread formats every event as a
+Server-Sent Events frame once and appends it to a small ring buffer. Flask
+streams wait on one shared condition and read new frames from the buffer; the
+ASGI app's streams each await an asyncio.Queue the thread feeds. Redis sees one
+subscriber per process however many clients are connected, and an idle stream
+costs no Redis or database work.
+
+Frames carry ids, so a client reconnecting to the same process with
+Last-Event-ID continues from the buffer instead of fetching a new snapshot. A
+stream that falls further behind than the buffer holds, or that was open while
+the subscription dropped, gets a 'reset' event telling it to refetch the board.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+import redis
+from app import logger
+from app.redis_client import (
+    LEADERBOARD_EVENTS_CHANNEL, get_redis_client, leaderboard_event, record_redis_error
+)
+
+BUFFER_SIZE = 256  # Frames kept for streams that are catching up
+SUBSCRIBE_WAIT = 1.0  # Seconds a new stream waits for the subscription to come up
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Stop nginx from buffering the stream
+}
+
+def sse_frame(payload, event=None, event_id=None):
+    """Format a JSON payload as one Server-Sent Events frame"""
+    if event is None:
+        event = json.loads(payload)['type']
+    frame = f"event: {event}\ndata: {payload}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id else frame
+
+def opening_frame(retry_ms, snapshot=None):
+    """The first write of a stream: the reconnect delay, with the snapshot frame if there is one"""
+    return f"retry: {retry_ms}\n" + (snapshot or '\n')
+
+class LeaderboardBroadcaster:
+    """One Redis subscription per process, fanned out to every open stream"""
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self._condition = threading.Condition()
+        self._frames = deque(maxlen=buffer_size)  # (sequence number, frame)
+        self._seq = 0
+        self._epoch = uuid.uuid4().hex[:12]  # Tells this process's event ids from any other's
+        self._queues = {}  # asyncio.Queue of an ASGI stream -> its event loop
+        self._thread = None
+        self._subscribed = threading.Event()
+
+    def _reset_after_fork(self):
+        # The subscriber thread and its connection stay with the parent
+        self.__init__(self._frames.maxlen)
+
+    def event_id(self, seq):
+        return f"{self._epoch}-{seq}"
+
+    def resume_point(self, last_event_id):
+        """
+        The sequence number a reconnecting stream continues after, or None when
+        its Last-Event-ID was not sent by this process and it needs a snapshot
+        """
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        with self._condition:
+            return int(seq) if int(seq) <= self._seq else None
+
+    def _reset_frame(self, seq):
+        return sse_frame(leaderboard_event('reset'), 'reset', self.event_id(seq))
+
+    def _push(self, payload, event=None):
+        with self._condition:
+            seq = self._seq + 1
+            frame = sse_frame(payload, event, self.event_id(seq))
+            self._seq = seq
+            self._frames.append((seq, frame))
+            self._condition.notify_all()
+            for queue, loop in self._queues.items():
+                try:
+                    loop.call_soon_threadsafe(self._deliver, queue, seq, frame)
+                except RuntimeError:
+                    # The stream's loop has closed; it unregisters as it ends
+                    pass
+
+    def _deliver(self, queue, seq, frame):
+        # Runs on the stream's event loop
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # A whole buffer behind: drop what the stream hasn't sent and have it refetch the board
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self._reset_frame(seq))
+
+    def _listen(self):
+        reconnecting = False
+        while True:
+            client = get_redis_client()
+            if not client:
+                time.sleep(1)
+                continue
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(LEADERBOARD_EVENTS_CHANNEL)
+                self._subscribed.set()
+                if reconnecting:
+                    # Anything published while the subscription was down is lost
+                    self._push(leaderboard_event('reset'), 'reset')
+                reconnecting = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message:
+                        continue
+                    try:
+                        self._push(message['data'])
+                    except (ValueError, KeyError):
+                        logger.warning(f"Ignoring malformed leaderboard event: {message['data']!r}")
+            except redis.RedisError as e:
+                record_redis_error(e)
+                logger.warning(f"Leaderboard event subscription interrupted: {str(e)}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def subscribe(self):
+        """Start the subscriber if needed; returns the sequence number a new stream reads after"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='leaderboard-events', daemon=True)
+                self._thread.start()
+        self._subscribed.wait(SUBSCRIBE_WAIT)
+        with self._condition:
+            return self._seq
+
+    def _since(self, after):
+        # With the condition held; a reset stands in for frames that left the buffer
+        if self._seq == after:
+            return after, []
+        if self._frames[0][0] > after + 1:
+            return self._seq, [self._reset_frame(self._seq)]
+        return self._seq, [frame for seq, frame in self._frames if seq > after]
+
+    def frames(self, after, timeout):
+        """
+        Frames published after sequence number `after`, waiting up to `timeout`
+        seconds for the first one. Returns (last sequence number, frames)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after, timeout)
+            return self._since(after)
+
+    def listen(self, after):
+        """
+        An asyncio.Queue receiving frames published after sequence number `after`
+        (those still buffered first), for a stream on the running event loop.
+        Pass it to unlisten() when the stream ends.
+        """
+        queue = asyncio.Queue(self._frames.maxlen)
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            for frame in self._since(after)[1]:
+                queue.put_nowait(frame)
+            self._queues[queue] = loop
+        return queue
+
+    def unlisten(self, queue):
+        with self._condition:
+            self._queues.pop(queue, None)
+
+broadcaster = LeaderboardBroadcaster()
+os.register_at_fork(after_in_child=broadcaster._reset_after_fork)
@@ -0,0 +1,187 @@
+"""
+Benchmark the submissions hot queries before and after the index migration
+
+Seeds a throwaway schema in a local PostgreSQL with millions of submissions,
+then runs each hot query with EXPLAIN (ANALYZE, BUFFERS) and repeated timings,
+first on the baseline schema (0001_initial) and again after
+0002_submission_indexes has been applied.
+
+Everything is created inside --schema (dropped and recreated on every run), so
+the benchmark never touches the application's own tables.
+
+Usage:
+    python benchmarks/index_benchmark.py \
+        --database-url postgresql://localhost:5432/bench --rows 5000000 --output index_bench.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from sqlalchemy import create_engine, text
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'app' / 'migrations'
+
+SEED_CHUNK = 500_000
+
+QUERIES = {
+    'slot_history': (
+        "SELECT id, timestamp FROM submissions "
+        "WHERE slot_allocated AND timestamp > now() - interval '24 hours' "
+        "ORDER BY timestamp DESC LIMIT 1",
+        {}
+    ),
+    'top_by_score': (
+        "SELECT id, score, timestamp FROM submissions ORDER BY score DESC LIMIT 10",
+        {}
+    ),
+    'user_history': (
+        "SELECT id, score, timestamp FROM submissions "
+        "WHERE user_id = :user_id ORDER BY timestamp DESC LIMIT 20",
+        {'user_id': 42}
+    ),
+}
+
+def load_migration(name):
+    """Load a migration module straight from its file, without importing the app"""
+    spec = importlib.util.spec_from_file_location(name, MIGRATIONS_DIR / f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def apply_migration(engine, name):
+    module = load_migration(name)
+    if getattr(module, 'TRANSACTIONAL', True):
+        with engine.begin() as conn:
+            module.upgrade(conn)
+    else:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            module.upgrade(conn)
+
+def seed(engine, rows, users):
+    """Bulk-load users and submissions server-side with generate_series"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, username, email, created_at) "
+            "SELECT g, 'user' || g, 'user' || g || '@bench.local', now() "
+            "FROM generate_series(1, :users) g"
+        ), {'users': users})
+
+    loaded = 0
+    started = time.perf_counter()
+    while loaded < rows:
+        chunk = min(SEED_CHUNK, rows - loaded)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO submissions (user_id, metrics, score, timestamp, slot_allocated) "
+                "SELECT 1 + floor(random() * :users)::int, "
+                "       json_build_object("
+                "           'gpu_utilization', random() * 100, 'memory_usage', random() * 100, "
+                "           'power_efficiency', random() * 100, 'completion_time', random() * 300, "
+                "           'accuracy', random() * 100), "
+                "       round((random() * 100)::numeric, 2), "
+                "       now() - random() * interval '365 days', "
+                "       random() < 0.0005 "
+                "FROM generate_series(1, :chunk)"
+            ), {'users': users, 'chunk': chunk})
+        loaded += chunk
+        print(f"  seeded {loaded:,}/{rows:,} rows ({loaded / (time.perf_counter() - started):,.0f} rows/s)")
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM ANALYZE submissions'))
+        conn.execute(text('VACUUM ANALYZE users'))
+
+def measure(engine, repeat):
+    """Return plan and latency statistics (ms) for every hot query"""
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, params) in QUERIES.items():
+            plan = conn.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {sql}'), params).scalars().all()
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(text(sql), params).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+
+            results[name] = {
+                'plan': plan,
+                'mean_ms': statistics.fmean(timings),
+                'p50_ms': timings[len(timings) // 2],
+                'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+                'max_ms': timings[-1],
+            }
+    return results
+
+def report(label, results):
+    print(f"\n=== {label} ===")
+    for name, stats in results.items():
+        print(f"\n-- {name}: mean {stats['mean_ms']:.2f} ms, p50 {stats['p50_ms']:.2f} ms, "
+              f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+        for line in stats['plan']:
+            print(f"   {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL', os.getenv('DATABASE_URL')))
+    parser.add_argument('--schema', default='bench_indexes')
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write before/after results as JSON to this path')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark schema afterwards')
+    args = parser.parse_args()
+
+    if not args.database_url or not args.database_url.startswith('postgresql'):
+        parser.error('a PostgreSQL --database-url (or BENCH_DATABASE_URL) is required')
+
+    admin = create_engine(args.database_url)
+    with admin.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA {args.schema}'))
+
+    engine = create_engine(args.database_url, connect_args={'options': f'-csearch_path={args.schema}'})
+    try:
+        apply_migration(engine, '0001_initial')
+        print(f"Seeding {args.rows:,} submissions for {args.users:,} users into schema {args.schema}")
+        seed(engine, args.rows, args.users)
+
+        before = measure(engine, args.repeat)
+        report('Before indexes (0001_initial)', before)
+
+        started = time.perf_counter()
+        apply_migration(engine, '0002_submission_indexes')
+        index_build_s = time.perf_counter() - started
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('ANALYZE submissions'))
+
+        after = measure(engine, args.repeat)
+        report(f'After indexes (0002_submission_indexes, built in {index_build_s:.1f}s)', after)
+
+        print("\n=== Summary (p50 ms) ===")
+        for name in QUERIES:
+            b, a = before[name]['p50_ms'], after[name]['p50_ms']
+            print(f"{name:>14}: {b:10.2f} -> {a:8.2f}  ({b / a if a else float('inf'):.0f}x)")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'rows': args.rows,
+                    'users': args.users,
+                    'index_build_s': index_build_s,
+                    'before': before,
+                    'after': after,
+                }, f, indent=2)
+            print(f"\nResults written to {args.output}")
+    finally:
+        engine.dispose()
+        if not args.keep:
+            with admin.begin() as conn:
+                conn.execute(text(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE'))
+        admin.dispose()
+
+if __name__ == "__main__":
+    main()
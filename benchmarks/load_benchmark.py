@@ -0,0 +1,399 @@
+"""
+Open-loop load test: latency and throughput under a configurable traffic mix
+
+Requests arrive as a Poisson process at --rate per second for --duration
+seconds, whatever the server's speed (open loop), and each one's latency is
+measured from its scheduled arrival, so time spent queued behind a slow server
+is counted instead of hidden. Traffic is drawn from a weighted mix of
+scenarios, e.g. --mix submit=1,leaderboard=8,health=1.
+
+Requests go through a small asyncio HTTP/1.1 client with a keep-alive
+connection pool (--connections), so the tool needs nothing outside the
+standard library. One Python event loop tops out at a few thousand requests
+per second; run several copies for more.
+
+--start launches the app itself on a free port, first running migrations:
+- --database-url, or a throwaway SQLite file standing in for Postgres
+- --redis-port for a running Redis, or --spawn-redis for a private,
+  non-persistent redis-server
+- --server flask (threaded), gunicorn (--workers, preloaded) or uvicorn
+  (the ASGI app in asgi.py, --workers)
+Rate limits are disabled for the run unless --keep-rate-limits is given.
+Without --start, --url targets a server that is already running.
+
+Reports p50/p95/p99/max latency, throughput and status counts per scenario.
+--output saves them as JSON and --compare prints the change from an earlier
+report.
+
+Usage:
+    python benchmarks/load_benchmark.py --start --spawn-redis --rate 200 --duration 30 \\
+        --mix submit=1,leaderboard=8,health=1 --seed 5000 --output load.json
+    python benchmarks/load_benchmark.py --url http://localhost:5000 --rate 100 --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVER = r"""
+import sys
+from app import create_app
+create_app().run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+"""
+
+def random_submission(rng):
+    return {
+        'gpu_utilization': round(rng.uniform(0, 100), 2),
+        'memory_usage': round(rng.uniform(0, 100), 2),
+        'power_efficiency': round(rng.uniform(0, 100), 2),
+        'completion_time': round(rng.uniform(1, 3600), 2),
+        'accuracy': round(rng.uniform(0, 100), 2),
+    }
+
+# Scenario name -> builder returning (method, path, JSON body or None)
+SCENARIOS = {
+    'submit': lambda rng: ('POST', '/submit_qualification', random_submission(rng)),
+    'leaderboard': lambda rng: ('GET', '/leaderboard', None),
+    'leaderboard_page': lambda rng: ('GET', f"/leaderboard?limit=50&offset={rng.randrange(0, 500, 50)}", None),
+    'health': lambda rng: ('GET', '/', None),
+    'ready': lambda rng: ('GET', '/ready', None),
+}
+
+class HttpPool:
+    """Minimal HTTP/1.1 client over at most `size` keep-alive connections"""
+    def __init__(self, host, port, size, timeout, headers=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        # Extra request headers, e.g. Accept-Encoding
+        self.headers = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def request(self, method, path, body=None):
+        """Send one request; returns (status, response body)"""
+        payload = json.dumps(body).encode() if body is not None else b''
+        async with self.slots:
+            # A reused connection may have been closed by the server meanwhile; retry once on a fresh one
+            for reused in ([True, False] if self.idle else [False]):
+                conn = self.idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+                try:
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, path, payload), self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn[1].close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    conn[1].close()
+                    raise
+                if keep_alive:
+                    self.idle.append(conn)
+                else:
+                    conn[1].close()
+                return status, data
+
+    async def _exchange(self, conn, method, path, payload):
+        reader, writer = conn
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n{self.headers}\r\n"
+        )
+        writer.write(head.encode() + payload)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b'\r\n')
+        version, status = status_line.split(b' ', 2)[:2]
+        headers = {}
+        while (line := await reader.readuntil(b'\r\n')) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+            keep_alive = headers.get('connection') != 'close' and version == b'HTTP/1.1'
+        elif headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while size := int((await reader.readuntil(b'\r\n')).split(b';')[0], 16):
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            await reader.readuntil(b'\r\n')
+            data = b''.join(chunks)
+            keep_alive = headers.get('connection') != 'close'
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return int(status), data, keep_alive
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+def parse_mix(spec):
+    """Parse "scenario=weight,..." into {scenario: weight}"""
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+async def issue(pool, name, rng, scheduled_at, results):
+    method, path, body = SCENARIOS[name](rng)
+    loop = asyncio.get_running_loop()
+    try:
+        status, _ = await pool.request(method, path, body)
+        outcome = str(status)
+    except Exception as e:
+        outcome = f"error:{type(e).__name__}"
+    results.append((name, outcome, loop.time() - scheduled_at))
+
+async def generate_load(pool, mix, rate, duration, max_in_flight, rng):
+    """Open-loop arrivals; returns (results, dropped, elapsed seconds)"""
+    names, weights = list(mix), list(mix.values())
+    loop = asyncio.get_running_loop()
+    results, dropped, in_flight = [], Counter(), set()
+    started = scheduled_at = loop.time()
+    while True:
+        scheduled_at += rng.expovariate(rate)
+        if scheduled_at - started >= duration:
+            break
+        delay = scheduled_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = rng.choices(names, weights)[0]
+        if len(in_flight) >= max_in_flight:
+            # The server has fallen this far behind; count the arrival instead of queueing forever
+            dropped[name] += 1
+            continue
+        task = asyncio.create_task(issue(pool, name, rng, scheduled_at, results))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.wait(in_flight)
+    return results, dropped, loop.time() - started
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def summarize(results, dropped, elapsed):
+    by_scenario = defaultdict(list)
+    for name, outcome, latency in results:
+        by_scenario[name].append((outcome, latency))
+        by_scenario['all'].append((outcome, latency))
+
+    summary = {}
+    for name, samples in sorted(by_scenario.items()):
+        latencies = sorted(latency * 1000 for _, latency in samples)
+        statuses = Counter(outcome for outcome, _ in samples)
+        ok = sum(count for outcome, count in statuses.items() if outcome[0] in '23')
+        summary[name] = {
+            'requests': len(samples),
+            'ok': ok,
+            'failed': len(samples) - ok,
+            'dropped': sum(dropped.values()) if name == 'all' else dropped.get(name, 0),
+            'throughput_rps': len(samples) / elapsed if elapsed else 0,
+            'statuses': dict(statuses),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else None,
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"{'scenario':>18} {'reqs':>7} {'rps':>8} {'fail':>6} {'drop':>6} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in summary.items():
+        latencies = ' '.join(f"{stats[key]:9.1f}" if stats[key] is not None else f"{'-':>9}"
+                             for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        print(f"{name:>18} {stats['requests']:7d} {stats['throughput_rps']:8.1f} "
+              f"{stats['failed']:6d} {stats['dropped']:6d} {latencies}")
+
+def print_comparison(summary, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)['summary']
+    print(f"\n=== Change from {previous_path} ===")
+    for name, stats in summary.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if stats[key] is not None and before.get(key):
+                changes.append(f"{key} {(stats[key] - before[key]) / before[key] * 100:+6.1f}%")
+        print(f"{name:>18}: {'  '.join(changes)}")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class LocalStack:
+    """The app, and optionally a private Redis, running as child processes"""
+    def __init__(self, args):
+        self.args = args
+        self.workdir = Path(tempfile.mkdtemp(prefix='gpu-load-'))
+        self.processes = []
+        self.server = None
+        self.port = free_port()
+        self.env = dict(os.environ)
+
+    def __enter__(self):
+        args, env = self.args, self.env
+        env['DATABASE_URL'] = args.database_url or f"sqlite:///{self.workdir / 'load.db'}"
+        if args.spawn_redis:
+            redis_port = free_port()
+            self._spawn('redis', ['redis-server', '--port', str(redis_port), '--save', '',
+                                  '--appendonly', 'no', '--dir', str(self.workdir)])
+            env['REDIS_HOST'], env['REDIS_PORT'] = '127.0.0.1', str(redis_port)
+        elif args.redis_port:
+            env['REDIS_PORT'] = str(args.redis_port)
+        if not args.keep_rate_limits:
+            env['RATELIMIT_ENABLED'] = 'false'
+        env.setdefault('LOG_LEVEL', 'WARNING')
+
+        subprocess.run([sys.executable, '-m', 'app.migrations'], cwd=ROOT, env=env, check=True,
+                       capture_output=True, timeout=300)
+        if args.server == 'gunicorn':
+            self.server = self._spawn('server', ['gunicorn', '--preload', '-w', str(args.workers),
+                                                 '--threads', str(args.threads), '-b', f"127.0.0.1:{self.port}",
+                                                 'main:app'])
+        elif args.server == 'uvicorn':
+            self.server = self._spawn('server', [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                                                 '--port', str(self.port), '--workers', str(args.workers),
+                                                 '--log-level', 'warning', '--no-access-log'])
+        else:
+            self.server = self._spawn('server', [sys.executable, '-c', SERVER, str(self.port)])
+        return self
+
+    def _spawn(self, name, command):
+        log = open(self.workdir / f"{name}.log", 'w')
+        process = subprocess.Popen(command, cwd=ROOT, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        return process
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if exc[0] is None and not self.args.keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        else:
+            print(f"Server logs kept in {self.workdir}")
+
+async def wait_ready(pool, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = await pool.request('GET', '/ready')
+            if status == 200:
+                return
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+async def seed(pool, count, rng, batch_size=500):
+    """Fill the leaderboard through the batch endpoint"""
+    for start in range(0, count, batch_size):
+        items = [random_submission(rng) for _ in range(min(batch_size, count - start))]
+        status, data = await pool.request('POST', '/submit_qualification/batch', items)
+        if status >= 400:
+            raise RuntimeError(f"Seeding failed with HTTP {status}: {data[:200]!r}")
+
+async def run(args, host, port):
+    rng = random.Random(args.random_seed)
+    pool = HttpPool(host, port, args.connections, args.timeout)
+    try:
+        await wait_ready(pool)
+        if args.seed:
+            print(f"Seeding {args.seed} submissions...")
+            await seed(pool, args.seed, rng)
+        if args.warmup:
+            await generate_load(pool, args.mix, args.rate, args.warmup, args.max_in_flight, rng)
+        print(f"Running {args.rate:g} req/s for {args.duration:g}s against {host}:{port}...")
+        return await generate_load(pool, args.mix, args.rate, args.duration, args.max_in_flight, rng)
+    finally:
+        pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='Target server (ignored with --start)')
+    parser.add_argument('--rate', type=float, default=50, help='Mean arrivals per second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of unmeasured load first')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('submit=1,leaderboard=8,health=1'),
+                        help=f"Weighted scenarios from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--connections', type=int, default=50, help='Keep-alive connection pool size')
+    parser.add_argument('--max-in-flight', type=int, default=5000, help='Arrivals beyond this are dropped')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0, metavar='N', help='Submissions added before the run')
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--start', action='store_true', help='Start the app locally for the run')
+    parser.add_argument('--server', choices=['flask', 'gunicorn', 'uvicorn'], default='flask')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn or uvicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--database-url', help='Database for --start (default: throwaway SQLite)')
+    parser.add_argument('--redis-port', type=int, help='Redis on localhost for --start')
+    parser.add_argument('--spawn-redis', action='store_true', help='Run a private redis-server for --start')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='Leave rate limiting on with --start')
+    parser.add_argument('--keep-workdir', action='store_true', help='Keep server logs and the SQLite file')
+    parser.add_argument('--label', help='Free-form label stored with the report')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    parser.add_argument('--compare', help='Earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    if args.start:
+        with LocalStack(args) as stack:
+            results, dropped, elapsed = asyncio.run(run(args, '127.0.0.1', stack.port))
+    else:
+        target = urlsplit(args.url)
+        results, dropped, elapsed = asyncio.run(run(args, target.hostname, target.port or 80))
+
+    summary = summarize(results, dropped, elapsed)
+    print()
+    print_summary(summary)
+    if args.compare:
+        print_comparison(summary, args.compare)
+
+    if args.output:
+        report = {
+            'label': args.label,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'config': {
+                'rate': args.rate, 'duration': args.duration, 'mix': args.mix,
+                'connections': args.connections, 'server': args.server if args.start else args.url,
+                'workers': args.workers if args.start and args.server != 'flask' else None,
+            },
+            'summary': summary,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Microbenchmarks for the per-request CPU work, with a regression gate
+
+Times submission validation (app.schemas), scoring (app.scoring), JSON
+decoding/encoding of request and response bodies, for single submissions and
+batches, and the MessagePack and compressed forms of responses (app.encoding;
+cases needing msgpack or brotli are left out when they aren't installed). Inputs come from a fixed random seed, so every run measures the same
+work.
+
+Each case is calibrated to run for about --min-time seconds per repeat, with
+the garbage collector off. It is repeated --repeat times, and the best repeat
+gives ops/sec, the least noisy estimate of what the code costs.
+
+--save writes the results to a baseline file. --compare reads one and exits
+with status 1 if any case's ops/sec has dropped by more than --threshold
+(a fraction). Baselines are only comparable on the same machine and Python,
+so take the baseline on the parent commit right before the comparison.
+
+Usage:
+    git stash && python benchmarks/micro_benchmark.py --save micro_baseline.json && git stash pop
+    python benchmarks/micro_benchmark.py --compare micro_baseline.json --threshold 0.05
+    python benchmarks/micro_benchmark.py --filter validate
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask  # noqa: E402
+from app import encoding  # noqa: E402
+from app.schemas import validate_submission  # noqa: E402
+from app.scoring import GPUScorer  # noqa: E402
+
+BATCH_SIZE = 500
+
+def make_submission(rng):
+    return {
+        'gpu_utilization': round(rng.uniform(0, 100), 2),
+        'memory_usage': round(rng.uniform(0, 100), 2),
+        'power_efficiency': round(rng.uniform(0, 100), 2),
+        'completion_time': round(rng.uniform(1, 600), 2),
+        'accuracy': round(rng.uniform(0, 100), 2),
+    }
+
+def build_cases(seed):
+    """Return {name: (callable, items processed per call)}"""
+    rng = random.Random(seed)
+    scorer = GPUScorer()
+    # Encode with the provider the app uses for responses
+    json_provider = encoding.json_provider(Flask(__name__))
+
+    valid = make_submission(rng)
+    invalid = dict(make_submission(rng), gpu_utilization=150)
+    batch = [make_submission(rng) for _ in range(BATCH_SIZE)]
+    mixed_batch = [dict(item, accuracy=-1) if i % 10 == 0 else item for i, item in enumerate(batch)]
+
+    request_body = json.dumps(valid)
+    batch_body = json.dumps(batch)
+    submit_response = {'success': True, 'message': 'Submission processed successfully',
+                       'score': scorer.calculate_score(valid), 'submission_id': 123456,
+                       'slot_allocated': False}
+    entries = [{'submission_id': i, 'score': 99.5 - i / 10, 'rank': i + 1,
+                'timestamp': '2024-01-01T00:00:00'} for i in range(100)]
+    leaderboard_response = {'leaderboard': entries, 'total': 100000, 'next_cursor': '99.5:123:100'}
+    leaderboard_body = encoding.dumps(leaderboard_response)
+    batch_response = {'results': [{'index': i, 'success': True, 'score': 50.0, 'submission_id': i}
+                                  for i in range(BATCH_SIZE)],
+                      'accepted': BATCH_SIZE, 'rejected': 0}
+
+    cases = {
+        'validate_valid': (lambda: validate_submission(valid), 1),
+        'validate_invalid': (lambda: validate_submission(invalid), 1),
+        'validate_batch': (lambda: [validate_submission(item) for item in batch], BATCH_SIZE),
+        'validate_batch_10pct_invalid': (lambda: [validate_submission(item) for item in mixed_batch], BATCH_SIZE),
+        'score_single': (lambda: scorer.calculate_score(valid), 1),
+        'score_batch': (lambda: scorer.calculate_scores(batch), BATCH_SIZE),
+        'json_decode_request': (lambda: json_provider.loads(request_body), 1),
+        'json_decode_batch': (lambda: json_provider.loads(batch_body), BATCH_SIZE),
+        'json_encode_submit_response': (lambda: json_provider.dumps(submit_response), 1),
+        'json_encode_leaderboard_100': (lambda: json_provider.dumps(leaderboard_response), 100),
+        'json_encode_batch_response': (lambda: json_provider.dumps(batch_response), BATCH_SIZE),
+        'gzip_leaderboard_100': (lambda: encoding.compress(leaderboard_body, 'gzip'), 100),
+        'cached_variant_leaderboard_100': (
+            lambda: encoding.cached_variant('etag', leaderboard_body, 'application/json', 'gzip'), 100
+        ),
+    }
+    if encoding.msgpack is not None:
+        cases['msgpack_encode_leaderboard_100'] = (lambda: encoding.encode(leaderboard_response, 'msgpack'), 100)
+    if encoding.brotli is not None:
+        cases['brotli_leaderboard_100'] = (lambda: encoding.compress(leaderboard_body, 'br'), 100)
+    return cases
+
+def calibrate(func, min_time):
+    """Smallest power-of-two loop count that runs for at least min_time"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= min_time:
+            return loops
+        loops *= 2
+
+def measure(func, items, repeat, min_time):
+    loops = calibrate(func, min_time)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            timings.append((time.perf_counter() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    best = min(timings)
+    return {
+        'ops_per_sec': 1 / best,
+        'items_per_sec': items / best,
+        'best_us': best * 1e6,
+        'median_us': statistics.median(timings) * 1e6,
+        'stdev_pct': statistics.pstdev(timings) / statistics.mean(timings) * 100,
+        'loops': loops,
+    }
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'node': platform.node(),
+    }
+
+def compare(results, baseline, threshold):
+    """Print the change per case; return the names of cases that regressed"""
+    regressions = []
+    print(f"\n{'case':>30} {'baseline op/s':>15} {'now op/s':>15} {'change':>9}")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            print(f"{name:>30} {'-':>15} {result['ops_per_sec']:15,.0f} {'new':>9}")
+            continue
+        change = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:>30} {before['ops_per_sec']:15,.0f} {result['ops_per_sec']:15,.0f} {change * 100:+8.1f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7, help='Timed repeats per case')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per repeat')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for generated inputs')
+    parser.add_argument('--filter', help='Only run cases whose name contains this')
+    parser.add_argument('--save', metavar='PATH', help='Write results as a baseline file')
+    parser.add_argument('--compare', metavar='PATH', help='Baseline file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed drop in ops/sec before --compare fails (fraction)')
+    args = parser.parse_args()
+
+    cases = build_cases(args.seed)
+    if args.filter:
+        cases = {name: case for name, case in cases.items() if args.filter in name}
+
+    results = {}
+    print(f"{'case':>30} {'op/s':>13} {'items/s':>13} {'best us':>10} {'median us':>10} {'stdev':>7}")
+    for name, (func, items) in cases.items():
+        func()  # warm caches before calibrating
+        results[name] = result = measure(func, items, args.repeat, args.min_time)
+        print(f"{name:>30} {result['ops_per_sec']:13,.0f} {result['items_per_sec']:13,.0f} "
+              f"{result['best_us']:10.2f} {result['median_us']:10.2f} {result['stdev_pct']:6.1f}%")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'environment': environment(), 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != environment():
+            print("\nWarning: baseline was recorded on a different machine or Python; "
+                  "changes may not be meaningful")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}: "
+                  f"{', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo case regressed by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Side-by-side serving benchmark: the sync Flask server against the ASGI app
+
+For each server in --servers, starts a fresh stack as load_benchmark.py
+--start does: migrations on a throwaway SQLite file or --database-url, a
+private or given Redis, rate limits off. It then seeds the leaderboard and
+drives every workload closed loop. --concurrency clients each send their next
+request as soon as the last one is answered, for --duration seconds, so the
+run finds each server's throughput ceiling. An open-loop run would only show
+that ceiling as growing latency.
+
+Throughput is reported per second and per core. Per core means requests per
+CPU-second used by the server's processes, read from /proc, so the comparison
+reflects what each request costs in CPU. It does not depend on how many cores
+the machine has or how much of them the load generator takes. Redis and the
+database are not counted. Linux only.
+
+--accept and --accept-encoding are sent with every request, to compare
+response formats and compression (see app.encoding). The mean response body
+size is reported with each result.
+
+Usage:
+    python benchmarks/serving_benchmark.py --spawn-redis --servers flask,uvicorn \\
+        --workloads submit,leaderboard,mixed --duration 20 --concurrency 32 --seed 5000
+    python benchmarks/serving_benchmark.py --spawn-redis --servers flask --workloads leaderboard_page \\
+        --accept-encoding gzip --accept application/msgpack
+    python benchmarks/serving_benchmark.py --database-url postgresql://localhost/gpu_bench \\
+        --redis-port 6379 --servers gunicorn,uvicorn --workers 4 --output serving.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from load_benchmark import (
+    SCENARIOS, HttpPool, LocalStack, parse_mix, percentile, seed, wait_ready
+)
+
+# Workload name -> scenario mix (see load_benchmark.SCENARIOS)
+WORKLOADS = {
+    'submit': 'submit=1',
+    'leaderboard': 'leaderboard=1',
+    'leaderboard_page': 'leaderboard_page=1',
+    'mixed': 'submit=1,leaderboard=8,leaderboard_page=1',
+}
+
+def tree_cpu_seconds(pid):
+    """User + system CPU seconds used so far by a process and its live descendants"""
+    children, used = defaultdict(list), {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesised command name, starting at state (field 3)
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children[int(fields[1])].append(int(entry))
+        used[int(entry)] = int(fields[11]) + int(fields[12])
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += used.get(current, 0)
+        pending.extend(children.get(current, ()))
+    return total / os.sysconf('SC_CLK_TCK')
+
+async def closed_loop(pool, mix, concurrency, duration, rng):
+    """`concurrency` clients sending back to back; returns (results, elapsed seconds)"""
+    names, weights = list(mix), list(mix.values())
+    loop = asyncio.get_running_loop()
+    results = []
+    started = loop.time()
+    deadline = started + duration
+
+    async def client():
+        while loop.time() < deadline:
+            method, path, body = SCENARIOS[rng.choices(names, weights)[0]](rng)
+            sent_at = loop.time()
+            try:
+                status, data = await pool.request(method, path, body)
+                outcome, size = str(status), len(data)
+            except Exception as e:
+                outcome, size = f"error:{type(e).__name__}", 0
+            results.append((outcome, loop.time() - sent_at, size))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results, loop.time() - started
+
+async def measure_server(args, stack):
+    """Seed, warm up and measure every workload against one running server"""
+    rng = random.Random(args.random_seed)
+    headers = {name: value for name, value in (('Accept', args.accept), ('Accept-Encoding', args.accept_encoding))
+               if value}
+    pool = HttpPool('127.0.0.1', stack.port, args.concurrency, args.timeout, headers)
+    rows = []
+    try:
+        await wait_ready(pool)
+        if args.seed:
+            await seed(pool, args.seed, rng)
+        for workload in args.workloads:
+            mix = parse_mix(WORKLOADS[workload])
+            if args.warmup:
+                await closed_loop(pool, mix, args.concurrency, args.warmup, rng)
+            cpu_before = tree_cpu_seconds(stack.server.pid)
+            results, elapsed = await closed_loop(pool, mix, args.concurrency, args.duration, rng)
+            cpu = tree_cpu_seconds(stack.server.pid) - cpu_before
+
+            latencies = sorted(latency * 1000 for _, latency, _ in results)
+            statuses = Counter(outcome for outcome, _, _ in results)
+            ok = sum(count for outcome, count in statuses.items() if outcome[0] in '23')
+            rows.append({
+                'server': args.server,
+                'workload': workload,
+                'requests': len(results),
+                'failed': len(results) - ok,
+                'statuses': dict(statuses),
+                'throughput_rps': len(results) / elapsed,
+                'cpu_seconds': cpu,
+                'cores_used': cpu / elapsed,
+                'rps_per_core': len(results) / cpu if cpu else None,
+                'p50_ms': percentile(latencies, 50),
+                'p99_ms': percentile(latencies, 99),
+                'response_bytes': sum(size for _, _, size in results) / len(results) if results else 0,
+            })
+            print(f"  {workload}: {rows[-1]['throughput_rps']:.0f} req/s, "
+                  f"{rows[-1]['rps_per_core'] or 0:.0f} req/s per core")
+    finally:
+        pool.close()
+    return rows
+
+def print_table(rows):
+    print(f"{'server':>8} {'workload':>17} {'reqs':>7} {'fail':>5} {'req/s':>8} {'cores':>6} "
+          f"{'req/s/core':>11} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>7}")
+    for row in rows:
+        per_core = f"{row['rps_per_core']:11.0f}" if row['rps_per_core'] else f"{'-':>11}"
+        print(f"{row['server']:>8} {row['workload']:>17} {row['requests']:7d} {row['failed']:5d} "
+              f"{row['throughput_rps']:8.0f} {row['cores_used']:6.2f} {per_core} "
+              f"{row['p50_ms']:8.1f} {row['p99_ms']:8.1f} {row['response_bytes']:7.0f}")
+
+    # Change from the first server, per workload
+    baseline = {row['workload']: row for row in rows if row['server'] == rows[0]['server']}
+    for row in rows:
+        base = baseline.get(row['workload'])
+        if row['server'] != rows[0]['server'] and base and base['rps_per_core'] and row['rps_per_core']:
+            print(f"{row['server']} vs {base['server']} on {row['workload']}: "
+                  f"{row['rps_per_core'] / base['rps_per_core']:.2f}x req/s per core, "
+                  f"{row['throughput_rps'] / base['throughput_rps']:.2f}x req/s")
+
+def parse_list(choices):
+    def parse(spec):
+        items = [item.strip() for item in spec.split(',') if item.strip()]
+        unknown = [item for item in items if item not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown {', '.join(unknown)}; expected {', '.join(choices)}")
+        return items
+    return parse
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', type=parse_list(['flask', 'gunicorn', 'uvicorn']),
+                        default=['flask', 'uvicorn'], help='Servers to compare, the first is the baseline')
+    parser.add_argument('--workloads', type=parse_list(list(WORKLOADS)), default=['submit', 'leaderboard', 'mixed'],
+                        help=f"Workloads from: {', '.join(WORKLOADS)}")
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds per workload')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before each workload')
+    parser.add_argument('--concurrency', type=int, default=32, help='Clients sending back to back')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=2000, metavar='N', help='Submissions added before measuring')
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn or uvicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--accept', help='Accept header sent with every request, e.g. application/msgpack')
+    parser.add_argument('--accept-encoding', help='Accept-Encoding header sent with every request, e.g. gzip')
+    parser.add_argument('--database-url', help='Database to run against (default: throwaway SQLite per server)')
+    parser.add_argument('--redis-port', type=int, help='Redis on localhost')
+    parser.add_argument('--spawn-redis', action='store_true', help='Run a private redis-server per server')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='Leave rate limiting on')
+    parser.add_argument('--keep-workdir', action='store_true', help='Keep server logs and the SQLite files')
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    rows = []
+    for server in args.servers:
+        print(f"Measuring {server}...")
+        server_args = argparse.Namespace(**{**vars(args), 'server': server})
+        with LocalStack(server_args) as stack:
+            rows += asyncio.run(measure_server(server_args, stack))
+
+    print()
+    print_table(rows)
+    if args.output:
+        report = {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'config': {key: getattr(args, key)
+                       for key in ('duration', 'concurrency', 'seed', 'workers', 'accept', 'accept_encoding')},
+            'cpus': os.cpu_count(),
+            'results': rows,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
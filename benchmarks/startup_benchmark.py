@@ -0,0 +1,127 @@
+"""
+Benchmark cold start: import-to-first-response time of a fresh process
+
+Each run starts a new Python interpreter that imports the app package, calls
+create_app() and serves one request through the test client, timing every
+phase. Process spawn to first response is measured from the outside as well,
+since an autoscaled instance pays the interpreter start too.
+
+--slow-redis points REDIS_HOST at an unroutable address, to check that a
+missing dependency delays only the requests that need it, not boot.
+--profile-imports runs one extra start under -X importtime and lists the
+slowest imports.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/gpu python benchmarks/startup_benchmark.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+responded = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import_s': imported - started,
+    'create_app_s': created - imported,
+    'first_response_s': responded - created,
+    'import_to_first_response_s': responded - started,
+}))
+"""
+
+PHASES = ['import_s', 'create_app_s', 'first_response_s', 'import_to_first_response_s', 'spawn_to_first_response_s']
+
+def run_once(path, env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Child process failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['spawn_to_first_response_s'] = elapsed
+    return timings
+
+def profile_imports(env, top):
+    """Run one start under -X importtime and return the slowest imports (cumulative us)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def summarize(samples):
+    summary = {}
+    for phase in PHASES:
+        values = sorted(sample[phase] * 1000 for sample in samples)
+        summary[phase] = {
+            'p50_ms': statistics.median(values),
+            'p90_ms': values[min(len(values) - 1, int(len(values) * 0.9))],
+            'max_ms': values[-1],
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/ready', help='Request served as the first response')
+    parser.add_argument('--slow-redis', action='store_true', help='Point REDIS_HOST at an unroutable address')
+    parser.add_argument('--profile-imports', type=int, metavar='N', default=0,
+                        help='Also list the N slowest imports')
+    parser.add_argument('--output', help='Write samples and summary as JSON to this path')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not env.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    if args.slow_redis:
+        env['REDIS_HOST'] = '10.255.255.1'
+
+    # Warm the OS page cache and bytecode so runs compare like with like
+    run_once(args.path, env)
+    samples = []
+    for i in range(args.runs):
+        samples.append(run_once(args.path, env))
+        print(f"  run {i + 1}/{args.runs}: {samples[-1]['spawn_to_first_response_s'] * 1000:.0f} ms "
+              f"(HTTP {samples[-1]['status']})")
+
+    summary = summarize(samples)
+    print(f"\n=== Cold start over {args.runs} runs, first request GET {args.path} ===")
+    for phase, stats in summary.items():
+        print(f"{phase:>28}: p50 {stats['p50_ms']:8.1f} ms  p90 {stats['p90_ms']:8.1f} ms  "
+              f"max {stats['max_ms']:8.1f} ms")
+
+    if args.profile_imports:
+        print(f"\n=== {args.profile_imports} slowest imports (cumulative) ===")
+        for cumulative_us, name in profile_imports(env, args.profile_imports):
+            print(f"{cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'path': args.path, 'slow_redis': args.slow_redis,
+                       'samples': samples, 'summary': summary}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
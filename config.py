@@ -7,4 +7,56 @@ class Config:
     RATELIMIT_DEFAULT = "100 per day"
     GPU_SLOT_DURATION = 24 * 60 * 60  # 24 hours in seconds
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))  # Items per batch submission
+    LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 60))  # Seconds a rendered leaderboard is cached
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 10))
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 2))
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 1))
+    REDIS_BREAKER_THRESHOLD = int(os.environ.get('REDIS_BREAKER_THRESHOLD', 3))  # Failures before failing fast
+    REDIS_BREAKER_WINDOW = float(os.environ.get('REDIS_BREAKER_WINDOW', 10))  # Seconds failures are counted over
+    REDIS_BREAKER_RETRY_INTERVAL = float(os.environ.get('REDIS_BREAKER_RETRY_INTERVAL', 1))  # Seconds between reconnect probes
+    LEADERBOARD_MAX_PAGE_SIZE = int(os.environ.get('LEADERBOARD_MAX_PAGE_SIZE', 100))
+    RANK_MAX_NEIGHBOURS = int(os.environ.get('RANK_MAX_NEIGHBOURS', 10))  # Entries shown on each side of a rank
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Off only for capacity tests
+    RATELIMIT_LOCAL_SHARE = float(os.environ.get('RATELIMIT_LOCAL_SHARE', 0.05))  # Share of remaining allowance reserved for a process to admit without Redis
+    RATELIMIT_LOCAL_TTL = float(os.environ.get('RATELIMIT_LOCAL_TTL', 1))  # Seconds a local allowance stays valid; what is left unused is given back to Redis soon after
+    ASYNC_INGEST = os.environ.get('ASYNC_INGEST', 'false').lower() in ('1', 'true', 'yes')  # Queue submissions on a Redis Stream
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))  # Stream entries written per database round trip
+    INGEST_CLAIM_IDLE_MS = int(os.environ.get('INGEST_CLAIM_IDLE_MS', 60000))  # Reclaim entries a dead worker left unacknowledged
+    RECONCILE_INTERVAL = float(os.environ.get('RECONCILE_INTERVAL', 5))  # Seconds between leaderboard reconciliations (0 disables)
+    RECONCILE_VERIFY_EVERY = int(os.environ.get('RECONCILE_VERIFY_EVERY', 12))  # Passes between entry count checks (incremental, on the primary key)
+    RECONCILE_CHUNK_SIZE = int(os.environ.get('RECONCILE_CHUNK_SIZE', 10000))  # Rows fetched and ZADDed per round trip
+    RECONCILE_LOOKBACK = int(os.environ.get('RECONCILE_LOOKBACK', 1000))  # Ids below the high-water mark still watched for late commits
+    RECONCILE_LOCK_TTL = int(os.environ.get('RECONCILE_LOCK_TTL', 600))  # Seconds before a dead rebuild's lock expires
+    LEADERBOARD_TOP_K = int(os.environ.get('LEADERBOARD_TOP_K', 0))  # Entries kept in the Redis leaderboard (0 keeps all)
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # Seconds between pushes of a process's metrics to Redis
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # Root log level
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', 'sqlalchemy=WARNING,urllib3=WARNING')  # Per-logger overrides, "name=LEVEL,..."
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' lines or human-readable 'text'
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))  # Share of requests whose DEBUG/INFO records are kept
+    SCORING_PROFILE = int(os.environ.get('SCORING_PROFILE', 1))  # Scoring profile version applied to new submissions
+    RESCORE_CHUNK_SIZE = int(os.environ.get('RESCORE_CHUNK_SIZE', 50000))  # Rows read, rescored and written back per chunk
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))  # Seconds a response is replayed for its Idempotency-Key
+    IDEMPOTENCY_BODY_TTL = int(os.environ.get('IDEMPOTENCY_BODY_TTL', 300))  # Same, for requests keyed by a hash of their body
+    IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', 30))  # Seconds before a crashed request's in-flight marker expires
+    IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 5))  # How long a duplicate waits for the first request
+    STREAM_KEEPALIVE_SECONDS = float(os.environ.get('STREAM_KEEPALIVE_SECONDS', 15))  # Idle time before /leaderboard/stream sends a keepalive
+    STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 300))  # Lifetime of one stream before the client reconnects
+    STREAM_RETRY_MS = int(os.environ.get('STREAM_RETRY_MS', 2000))  # Reconnect delay suggested to stream clients
+    FALLBACK_REFRESH_SECONDS = float(os.environ.get('FALLBACK_REFRESH_SECONDS', 5))  # Age at which a degraded read refreshes its snapshot from Postgres
+    FALLBACK_SNAPSHOT_TTL = float(os.environ.get('FALLBACK_SNAPSHOT_TTL', 300))  # Oldest snapshot served when Postgres can't be read either
+    FALLBACK_SNAPSHOT_SIZE = int(os.environ.get('FALLBACK_SNAPSHOT_SIZE', 100))  # Entries read from Postgres into a snapshot
+    FALLBACK_DB_CONCURRENCY = int(os.environ.get('FALLBACK_DB_CONCURRENCY', 2))  # Concurrent fallback leaderboard queries per process
+    FALLBACK_DB_WAIT_SECONDS = float(os.environ.get('FALLBACK_DB_WAIT_SECONDS', 0.5))  # How long a read without a snapshot waits for a query slot
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')  # Database for the ASGI app (default: DATABASE_URL on asyncpg/aiosqlite)
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 5))  # Async database connections per ASGI worker, as for the Flask app
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))  # Threads per ASGI worker for requests served by the Flask app
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')  # 'orjson' (when installed) or the standard library's 'json'
+    RESPONSE_MSGPACK = os.environ.get('RESPONSE_MSGPACK', 'true').lower() in ('1', 'true', 'yes')  # MessagePack for clients whose Accept prefers it
+    COMPRESS_ALGORITHMS = os.environ.get('COMPRESS_ALGORITHMS', 'br,gzip')  # Content codings offered, preferred first (empty disables)
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))  # Smaller bodies are sent uncompressed
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))  # 0-11; higher levels cost far more CPU per response
+    STATS_SHARDS = int(os.environ.get('STATS_SHARDS', 16))  # Summary rows per histogram bucket that concurrent writers spread over
+    BACKFILL_CHUNK_SIZE = int(os.environ.get('BACKFILL_CHUNK_SIZE', 10000))  # Rows per transaction when migrations backfill columns
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUBMISSION = {
+    'gpu_utilization': 97.5,
+    'memory_usage': 40,
+    'power_efficiency': 80,
+    'completion_time': 120,
+    'accuracy': 99
+}
+
+@pytest.fixture
+def asgi(flask_app, redis_db):
+    from app.asgi import create_asgi_app
+    return create_asgi_app(flask_app), redis_db
+
+async def call(app, method, path, body=None, headers=None, client='127.0.0.1'):
+    """Send one request straight to the ASGI app; returns (status, headers, body)"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in {'Content-Type': 'application/json', **(headers or {})}.items()],
+        'client': (client, 50000), 'server': ('testserver', 80), 'http_version': '1.1', 'scheme': 'http'
+    }
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()  # The client never disconnects
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    response_headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+    return sent[0]['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+def test_async_handlers_match_the_flask_views(asgi, monkeypatch):
+    app, client = asgi
+    logger.info("Testing the ASGI app...")
+
+    async def scenario():
+        try:
+            # Submissions are scored, stored and ranked, and retries are replayed
+            status, headers, body = await call(app, 'POST', '/submit_qualification', SUBMISSION,
+                                               {'Idempotency-Key': 'asgi-1'})
+            assert status == 200 and headers['x-ratelimit-limit'] == '10' and 'x-request-id' in headers
+            submission_id = json.loads(body)['submission_id']
+            assert client.zscore('gpu_leaderboard', str(submission_id)) == json.loads(body)['score']
+            retry = await call(app, 'POST', '/submit_qualification', SUBMISSION, {'Idempotency-Key': 'asgi-1'})
+            assert retry[0] == 200 and retry[1]['idempotent-replayed'] == 'true' and retry[2] == body
+            status, _, _ = await call(app, 'POST', '/submit_qualification', {'accuracy': 1},
+                                      {'Idempotency-Key': 'asgi-1'})
+            assert status == 422
+            status, _, body = await call(app, 'POST', '/submit_qualification', {'accuracy': 'high'})
+            assert status == 400 and json.loads(body)['error'] == 'Invalid submission format'
+
+            # The default view is cached under an ETag and holds the slot for the leader
+            status, headers, body = await call(app, 'GET', '/leaderboard')
+            board = json.loads(body)
+            assert status == 200 and board['leaderboard'][0]['submission_id'] == submission_id
+            assert board['current_slot']['submission_id'] == submission_id
+            status, _, body = await call(app, 'GET', '/leaderboard', headers={'If-None-Match': headers['etag']})
+            assert status == 304 and body == b''
+            status, _, body = await call(app, 'GET', '/leaderboard?limit=1&offset=0')
+            page = json.loads(body)
+            assert status == 200 and page['total'] == 1 and page['leaderboard'][0]['rank'] == 1
+
+            # Other routes, and everything while Redis is unreachable, are served by the Flask app
+            status, _, body = await call(app, 'GET', '/ready')
+            assert status == 200 and json.loads(body)['ready']
+            from app import redis_client
+            monkeypatch.setattr(redis_client.breaker, 'state', redis_client.CircuitBreaker.OPEN)
+            status, _, body = await call(app, 'POST', '/submit_qualification', SUBMISSION)
+            assert status == 200 and json.loads(body)['submission_id'] > submission_id
+        finally:
+            await app.close()
+
+    asyncio.run(scenario())
+    logger.info("✓ ASGI app test passed")
+
+def test_failed_commits_stay_off_the_leaderboard(asgi, monkeypatch):
+    app, client = asgi
+    logger.info("Testing ASGI submissions whose commit fails...")
+    from sqlalchemy import exc
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+    async def failing_commit(self):
+        raise exc.OperationalError('COMMIT', {}, Exception('database is locked'))
+    monkeypatch.setattr(AsyncConnection, 'commit', failing_commit)
+
+    async def scenario():
+        try:
+            status, _, _ = await call(app, 'POST', '/submit_qualification', dict(SUBMISSION, accuracy=98.75))
+            assert status == 500
+            assert client.zcard('gpu_leaderboard') == 0
+        finally:
+            await app.close()
+
+    asyncio.run(scenario())
+    logger.info("✓ ASGI failed commit test passed")
+
+def test_replays_skip_the_rate_limit(asgi):
+    app, _ = asgi
+    logger.info("Testing ASGI replays at an exhausted rate limit...")
+
+    async def scenario():
+        try:
+            first = await call(app, 'POST', '/submit_qualification', SUBMISSION, {'Idempotency-Key': 'asgi-limited'})
+            assert first[0] == 200
+            accuracy = 90.0
+            while (response := await call(app, 'POST', '/submit_qualification',
+                                          dict(SUBMISSION, accuracy=accuracy)))[0] == 200:
+                accuracy += 0.25
+            assert response[0] == 429
+
+            retry = await call(app, 'POST', '/submit_qualification', SUBMISSION, {'Idempotency-Key': 'asgi-limited'})
+            assert retry[0] == 200 and retry[1]['idempotent-replayed'] == 'true' and retry[2] == first[2]
+        finally:
+            await app.close()
+
+    asyncio.run(scenario())
+    logger.info("✓ ASGI replay at rate limit test passed")
+
+def test_replays_stay_with_their_client(asgi):
+    app, _ = asgi
+    logger.info("Testing ASGI idempotency records per client...")
+
+    async def scenario():
+        try:
+            body = dict(SUBMISSION, accuracy=98.25)
+            first = await call(app, 'POST', '/submit_qualification', body, client='10.0.0.1')
+            other = await call(app, 'POST', '/submit_qualification', body, client='10.0.0.2')
+            assert first[0] == other[0] == 200 and 'idempotent-replayed' not in other[1]
+            assert json.loads(other[2])['submission_id'] != json.loads(first[2])['submission_id']
+            retry = await call(app, 'POST', '/submit_qualification', body, client='10.0.0.1')
+            assert retry[1]['idempotent-replayed'] == 'true' and retry[2] == first[2]
+        finally:
+            await app.close()
+
+    asyncio.run(scenario())
+    logger.info("✓ ASGI per-client idempotency test passed")
+
+def test_stream_is_served_on_the_event_loop(asgi, monkeypatch):
+    app, _ = asgi
+    logger.info("Testing the ASGI leaderboard stream...")
+    from app.stream import broadcaster
+    from config import Config
+    monkeypatch.setattr(Config, 'STREAM_MAX_SECONDS', 1.0)
+    monkeypatch.setattr(Config, 'STREAM_KEEPALIVE_SECONDS', 0.2)
+
+    async def scenario():
+        try:
+            stream = asyncio.ensure_future(call(app, 'GET', '/leaderboard/stream'))
+            # Wait for the stream to register its queue, then push a submission into the top 10
+            while not broadcaster._queues:
+                await asyncio.sleep(0.01)
+            status, _, body = await call(app, 'POST', '/submit_qualification', dict(SUBMISSION, accuracy=99.5))
+            submission_id = json.loads(body)['submission_id']
+            status, headers, body = await stream
+            assert status == 200 and headers['content-type'].startswith('text/event-stream')
+            assert headers['cache-control'] == 'no-cache' and 'content-length' not in headers
+            events = []
+            for block in body.decode().split('\n\n'):
+                # Keepalives are comment lines
+                fields = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+                if fields:
+                    events.append(fields)
+            assert events[0]['event'] == 'snapshot' and events[0]['retry'] == str(Config.STREAM_RETRY_MS)
+            entered = next(event for event in events if event['event'] == 'entered')
+            assert json.loads(entered['data'])['entries'][0]['submission_id'] == submission_id
+            assert not broadcaster._queues
+
+            # Reconnecting with the last id replays what followed it, without a new snapshot
+            status, _, body = await call(app, 'GET', '/leaderboard/stream', headers={'Last-Event-ID': events[0]['id']})
+            assert status == 200 and 'event: snapshot' not in body.decode()
+            assert f'"submission_id":{submission_id}' in body.decode()
+        finally:
+            await app.close()
+
+    asyncio.run(scenario())
+    logger.info("✓ ASGI leaderboard stream test passed")
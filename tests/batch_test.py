@@ -0,0 +1,60 @@
+import logging
+import random
+from app.scoring import GPUScorer
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+VALID = {
+    'gpu_utilization': 85.5,
+    'memory_usage': 90.2,
+    'power_efficiency': 88.7,
+    'completion_time': 45.3,
+    'accuracy': 95.1
+}
+
+def test_bulk_scores_match_single_scores():
+    logger.info("Testing bulk scoring...")
+    rng = random.Random(42)
+    batch = [
+        {
+            'gpu_utilization': rng.uniform(0, 100),
+            'memory_usage': rng.choice([0, 100, rng.uniform(0, 100)]),
+            'power_efficiency': rng.uniform(0, 100),
+            'completion_time': rng.choice([0, 1, 300, 450, rng.uniform(0, 600)]),
+            'accuracy': rng.randint(0, 100)
+        }
+        for _ in range(1000)
+    ]
+    scorer = GPUScorer()
+    assert scorer.calculate_scores(batch) == [scorer.calculate_score(metrics) for metrics in batch]
+    assert scorer.calculate_scores([]) == []
+    logger.info("✓ Bulk scoring test passed")
+
+def test_batch_reports_errors_per_item(flask_app):
+    logger.info("Testing per-item batch validation...")
+    client = flask_app.test_client()
+    batch = [
+        dict(VALID, accuracy=91.25),
+        dict(VALID, gpu_utilization=150),
+        {key: value for key, value in VALID.items() if key != 'accuracy'},
+        dict(VALID, accuracy=92.25),
+        'not an object',
+    ]
+    response = client.post('/submit_qualification/batch', json=batch)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['accepted'] == 2 and data['rejected'] == 3
+    results = data['results']
+    assert [result['index'] for result in results] == list(range(len(batch)))
+    assert [result['success'] for result in results] == [True, False, False, True, False]
+    assert results[0]['score'] == GPUScorer().calculate_score(batch[0])
+    assert results[0]['submission_id'] < results[3]['submission_id']
+    for result in (results[1], results[2], results[4]):
+        assert result['error'] == 'Invalid submission format' and result['details']
+    assert 'gpu_utilization' in results[1]['details'] and 'accuracy' in results[2]['details']
+
+    # A batch with nothing valid is refused as a whole, still with every item's error
+    response = client.post('/submit_qualification/batch', json=batch[1:3])
+    assert response.status_code == 400 and len(response.get_json()['results']) == 2
+    logger.info("✓ Per-item batch validation test passed")
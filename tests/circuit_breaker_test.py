@@ -0,0 +1,85 @@
+import logging
+import multiprocessing
+import time
+import redis
+from app import redis_client
+from app.redis_client import CircuitBreaker
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class FlakyProbe:
+    """A probe failing its first `failures` calls"""
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise redis.ConnectionError(f"probe {self.calls} refused")
+        return True
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the breaker"
+        time.sleep(0.005)
+
+def test_breaker_opens_at_threshold_and_probes_closed():
+    logger.info("Testing the circuit breaker...")
+    probe = FlakyProbe(failures=3)
+    breaker = CircuitBreaker(probe, threshold=3, window=0.2, retry_interval=0.02)
+
+    # Failures spread wider than the window never add up to the threshold
+    breaker.record_failure(redis.ConnectionError("first"))
+    breaker.record_failure(redis.ConnectionError("second"))
+    time.sleep(0.25)
+    breaker.record_failure(redis.ConnectionError("third"))
+    assert breaker.allow() and breaker.status()['recent_failures'] == 1
+
+    # Three inside the window trip it
+    breaker.record_failure(redis.ConnectionError("fourth"))
+    breaker.record_failure(redis.ConnectionError("fifth"))
+    assert not breaker.allow()
+    status = breaker.status()
+    assert status['state'] == CircuitBreaker.OPEN and status['opened_at'] and status['last_error'] == 'fifth'
+
+    # Failed probes keep it open; the first successful one closes it
+    wait_for(lambda: probe.calls >= 2)
+    assert not breaker.allow() and breaker.status()['last_error'].startswith('probe')
+    wait_for(breaker.allow)
+    assert probe.calls == 4 and breaker.status()['recent_failures'] == 0
+    logger.info("✓ Circuit breaker test passed")
+
+def test_open_breaker_fails_fast(monkeypatch):
+    logger.info("Testing fail-fast while the breaker is open...")
+    monkeypatch.setattr(redis_client.breaker, 'state', CircuitBreaker.OPEN)
+    started = time.perf_counter()
+    assert redis_client.get_redis_client() is None
+    assert redis_client.ping_redis() is False
+    assert redis_client.get_top_submissions(10) is None
+    assert time.perf_counter() - started < 0.05
+
+    # Refusals by the breaker itself are not counted as new failures
+    failures = redis_client.breaker.status()['recent_failures']
+    redis_client.record_redis_error(redis_client.RedisUnavailableError("open"))
+    assert redis_client.breaker.status()['recent_failures'] == failures
+    logger.info("✓ Fail-fast test passed")
+
+def _report_breaker(queue):
+    queue.put((redis_client.breaker.allow(), redis_client.breaker.status()['recent_failures'],
+               redis_client._client is None))
+
+def test_forked_workers_start_closed(monkeypatch):
+    logger.info("Testing the breaker reset after fork...")
+    monkeypatch.setattr(redis_client.breaker, 'state', CircuitBreaker.OPEN)
+    monkeypatch.setattr(redis_client, '_client', object())
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    worker = ctx.Process(target=_report_breaker, args=(queue,))
+    worker.start()
+    assert queue.get(timeout=10) == (True, 0, True)
+    worker.join()
+    assert not redis_client.breaker.allow()
+    logger.info("✓ Breaker fork reset test passed")
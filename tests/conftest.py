@@ -0,0 +1,46 @@
+import os
+import pytest
+import redis
+
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+TEST_DB = 15  # Keep test keys away from the live leaderboard
+
+# Keys the app writes under their production names during a test
+APP_KEY_PATTERNS = ('gpu_leaderboard*', 'gpu_slot:*', 'idempotency:*', 'ratelimit:*')
+
+def clear_app_keys(client):
+    for pattern in APP_KEY_PATTERNS:
+        for key in client.scan_iter(pattern):
+            client.delete(key)
+
+@pytest.fixture
+def redis_db(monkeypatch):
+    """A client on the test database, installed as the app's Redis client; skips without Redis"""
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=TEST_DB,
+                         decode_responses=True, socket_connect_timeout=1)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip("Local Redis not available")
+
+    from app import redis_client
+    monkeypatch.setenv('REDIS_DB', str(TEST_DB))  # Read by forked workers and the async client
+    monkeypatch.setattr(redis_client, '_client', client)
+    monkeypatch.setattr(redis_client, '_scripts', {})
+    monkeypatch.setattr(redis_client, '_async_scripts', {})
+    return client
+
+@pytest.fixture
+def flask_app(redis_db, monkeypatch):
+    """The app on a migrated database, with its Redis keys cleared before and after the test"""
+    from app import create_app, db, redis_client
+    from app.migrations import upgrade
+    # No background rebuilds bumping the leaderboard version mid-test
+    monkeypatch.setattr(redis_client.Config, 'RECONCILE_INTERVAL', 0)
+    clear_app_keys(redis_db)
+    app = create_app()
+    with app.app_context():
+        upgrade(db.engine)
+    yield app
+    clear_app_keys(redis_db)
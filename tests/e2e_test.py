@@ -82,7 +82,9 @@ def test_rate_limiting():
         responses = []
         for i in range(12):  # Try to exceed the 10/hour limit
             logger.debug(f"Sending request {i+1}/12")
-            response = requests.post(f"{BASE_URL}/submit_qualification", json=valid_data)
+            # Distinct bodies: a repeated one is replayed by idempotency, without using the limit
+            body = {**valid_data, "accuracy": 90 + i * 0.25}
+            response = requests.post(f"{BASE_URL}/submit_qualification", json=body)
             responses.append(response.status_code)
             logger.debug(f"Response {i+1}: status {response.status_code}")
 
@@ -93,6 +95,34 @@ def test_rate_limiting():
         logger.error(f"❌ Rate limiting test failed: {str(e)}")
         raise
 
+def test_batch_submission():
+    logger.info("Testing batch submission...")
+    try:
+        valid_data = {
+            "gpu_utilization": 85.5,
+            "memory_usage": 90.2,
+            "power_efficiency": 88.7,
+            "completion_time": 45.3,
+            "accuracy": 95.1
+        }
+        invalid_data = dict(valid_data, gpu_utilization=150)
+
+        response = requests.post(
+            f"{BASE_URL}/submit_qualification/batch",
+            json=[valid_data, invalid_data, valid_data]
+        )
+        logger.debug(f"Batch response: {response.text}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2 and data["rejected"] == 1
+        assert [r["success"] for r in data["results"]] == [True, False, True]
+        assert all(r["index"] == i for i, r in enumerate(data["results"]))
+        assert "submission_id" in data["results"][0]
+        logger.info("✓ Batch submission test passed")
+    except Exception as e:
+        logger.error(f"❌ Batch submission test failed: {str(e)}")
+        raise
+
 def test_leaderboard():
     logger.info("Testing leaderboard...")
     try:
@@ -117,13 +147,51 @@ def test_leaderboard():
         logger.error(f"❌ Leaderboard test failed: {str(e)}")
         raise
 
+def test_leaderboard_stream():
+    logger.info("Testing leaderboard stream...")
+    try:
+        with requests.get(f"{BASE_URL}/leaderboard/stream", stream=True, timeout=10) as stream:
+            assert stream.status_code == 200
+            assert stream.headers["Content-Type"].startswith("text/event-stream")
+            lines = stream.iter_lines(decode_unicode=True)
+
+            def next_event():
+                event = {}
+                for line in lines:
+                    if not line:
+                        if event:
+                            return event
+                        continue
+                    field, _, value = line.partition(": ")
+                    event[field] = value
+
+            snapshot = next_event()
+            assert snapshot["event"] == "snapshot" and "leaderboard" in snapshot["data"]
+
+            # A perfect score enters the top 10 and is pushed to the open stream
+            perfect = {"gpu_utilization": 100, "memory_usage": 100, "power_efficiency": 100,
+                       "completion_time": 1, "accuracy": 100}
+            response = requests.post(f"{BASE_URL}/submit_qualification/batch", json=[perfect])
+            submission_id = response.json()["results"][0]["submission_id"]
+
+            event = next_event()
+            while event["event"] != "entered":
+                event = next_event()
+            assert f'"submission_id":{submission_id}' in event["data"]
+        logger.info("✓ Leaderboard stream test passed")
+    except Exception as e:
+        logger.error(f"❌ Leaderboard stream test failed: {str(e)}")
+        raise
+
 def run_all_tests():
     try:
         logger.info("Starting end-to-end tests...")
         test_health_check()
         test_submission_process()
         test_rate_limiting()
+        test_batch_submission()
         test_leaderboard()
+        test_leaderboard_stream()
         logger.info("✅ All tests passed successfully!")
     except AssertionError as e:
         logger.error(f"❌ Test failed: {str(e)}")
@@ -131,4 +199,4 @@ def run_all_tests():
         logger.error(f"❌ Unexpected error: {str(e)}")
 
 if __name__ == "__main__":
-    run_all_tests()
\ No newline at end of file
+    run_all_tests()
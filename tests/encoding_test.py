@@ -0,0 +1,73 @@
+import gzip
+import json
+import logging
+from datetime import datetime
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUBMISSION = {
+    'gpu_utilization': 91,
+    'memory_usage': 35,
+    'power_efficiency': 70,
+    'completion_time': 200,
+    'accuracy': 99
+}
+
+@pytest.fixture
+def encoded(flask_app, monkeypatch):
+    from app import encoding
+    monkeypatch.setattr(encoding.Config, 'COMPRESS_ALGORITHMS', 'gzip')
+    monkeypatch.setattr(encoding.Config, 'COMPRESS_MIN_BYTES', 0)
+    with flask_app.test_client() as test_client:
+        for accuracy in (90, 95, 98):
+            assert test_client.post('/submit_qualification', json={**SUBMISSION, 'accuracy': accuracy}).status_code == 200
+        yield flask_app, encoding, test_client
+
+def test_responses_are_compressed_and_cached_per_representation(encoded):
+    app, encoding, client = encoded
+    logger.info("Testing negotiated response encoding...")
+    # Datetimes are written as ISO 8601 by whichever provider is installed
+    with app.app_context():
+        body = app.json.dumps({'at': datetime(2024, 1, 2, 3, 4, 5, 6)})
+        assert json.loads(body) == {'at': '2024-01-02T03:04:05.000006'}
+
+    # Without Accept-Encoding the body is plain JSON; with it, the same payload gzipped
+    plain = client.get('/leaderboard?limit=3')
+    packed = client.get('/leaderboard?limit=3', headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert 'Content-Encoding' not in plain.headers and packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    entries = json.loads(plain.data)['leaderboard']
+    assert json.loads(gzip.decompress(packed.data))['leaderboard'] == entries
+    assert datetime.fromisoformat(entries[0]['timestamp'])
+
+    # The cached view has one ETag per representation, each answering its own 304
+    plain = client.get('/leaderboard')
+    packed = client.get('/leaderboard', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert gzip.decompress(packed.data).decode() == plain.get_data(as_text=True)
+    assert client.get('/leaderboard', headers={'Accept-Encoding': 'gzip',
+                                                'If-None-Match': packed.headers['ETag']}).status_code == 304
+    assert client.get('/leaderboard', headers={'If-None-Match': packed.headers['ETag']}).status_code == 200
+
+    # Binary bodies survive the idempotency record
+    assert encoding.decode_record_body(encoding.encode_record_body(b'\x93\xc3\xff')) == b'\x93\xc3\xff'
+    assert encoding.decode_record_body(encoding.encode_record_body(b'{}')) == '{}'
+    logger.info("✓ Response encoding test passed")
+
+def test_msgpack_is_opt_in(encoded):
+    msgpack = pytest.importorskip('msgpack')
+    app, encoding, client = encoded
+    logger.info("Testing MessagePack negotiation...")
+    assert client.get('/leaderboard?limit=3', headers={'Accept': '*/*'}).mimetype == 'application/json'
+    assert client.get('/leaderboard?limit=3', headers={
+        'Accept': 'application/json, application/msgpack;q=0.5'
+    }).mimetype == 'application/json'
+
+    for path in ('/leaderboard?limit=3', '/leaderboard'):
+        plain = client.get(path)
+        packed = client.get(path, headers={'Accept': 'application/msgpack'})
+        assert packed.mimetype == 'application/msgpack' and 'Accept' in packed.headers['Vary']
+        assert msgpack.unpackb(packed.data)['leaderboard'] == plain.get_json()['leaderboard']
+    logger.info("✓ MessagePack negotiation test passed")
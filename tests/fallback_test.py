@@ -0,0 +1,68 @@
+import logging
+import threading
+from datetime import datetime
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def degraded(flask_app, redis_db, monkeypatch):
+    from app import db, fallback, redis_client
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_KEY', 'test:gpu_leaderboard')
+    monkeypatch.setattr(fallback, '_snapshot', None)
+    redis_db.delete('test:gpu_leaderboard')
+    with flask_app.app_context():
+        yield flask_app, fallback, redis_client, redis_db, db
+    redis_db.delete('test:gpu_leaderboard')
+
+def test_reads_fall_back_to_snapshot_then_postgres(degraded, monkeypatch):
+    app, fallback, redis_client, client, db = degraded
+    logger.info("Testing degraded leaderboard reads...")
+    from sqlalchemy import func, select
+    from app.models import Submission
+    # Outrank everything earlier runs left in the database
+    base = (db.session.scalar(select(func.max(Submission.score))) or 0) + 1
+    rows = [Submission(metrics={}, score=base + i, timestamp=datetime.utcnow(), slot_allocated=False)
+            for i in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    ids = [row.id for row in reversed(rows)]
+
+    # An empty Redis board (e.g. a fresh replica) is not shown as an empty leaderboard
+    entries, snapshot = fallback.top_submissions(3)
+    assert [sub_id for sub_id, _ in entries] == ids
+    assert snapshot.freshness()['source'] == 'database'
+
+    # Reads from Redis refresh the snapshot...
+    client.zadd('test:gpu_leaderboard', {'999999999': base + 10, **{str(i): base for i in ids}})
+    entries, snapshot = fallback.top_submissions(3)
+    assert snapshot is None and entries[0][0] == 999999999
+
+    # ...which is served while Redis is unreachable
+    monkeypatch.setattr(redis_client.breaker, 'state', redis_client.CircuitBreaker.OPEN)
+    entries, snapshot = fallback.top_submissions(3)
+    assert entries[0][0] == 999999999 and snapshot.freshness()['source'] == 'snapshot'
+
+    # Once it is due for a refresh, Postgres is read unless every query slot is busy
+    monkeypatch.setattr(fallback.Config, 'FALLBACK_REFRESH_SECONDS', 0)
+    slots = fallback._db_slots
+    monkeypatch.setattr(fallback, '_db_slots', threading.Semaphore(0))
+    assert fallback.top_submissions(3)[0][0][0] == 999999999
+    monkeypatch.setattr(fallback.Config, 'FALLBACK_SNAPSHOT_TTL', 0)
+    monkeypatch.setattr(fallback.Config, 'FALLBACK_DB_WAIT_SECONDS', 0.01)
+    assert fallback.top_submissions(3) is None
+    monkeypatch.setattr(fallback, '_db_slots', slots)
+    entries, snapshot = fallback.top_submissions(3)
+    assert [sub_id for sub_id, _ in entries] == ids and snapshot.origin == 'database'
+
+    # Responses say where the board came from and how old it is
+    monkeypatch.setattr(fallback.Config, 'FALLBACK_REFRESH_SECONDS', 60)
+    response = app.test_client().get('/leaderboard')
+    assert response.status_code == 200
+    assert response.get_json()['degraded']['source'] == 'database'
+    assert response.headers['X-Leaderboard-Source'] == 'database' and 'Age' in response.headers
+    assert [entry['submission_id'] for entry in response.get_json()['leaderboard'][:3]] == ids
+    page = app.test_client().get('/leaderboard?limit=2').get_json()
+    assert [entry['submission_id'] for entry in page['leaderboard']] == ids[:2] and page['degraded']
+    logger.info("✓ Degraded leaderboard test passed")
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+import pytest
+from flask import Flask, jsonify, request
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def submit_app(redis_db):
+    from app.idempotency import idempotent
+    client = redis_db
+    for key in client.scan_iter('idempotency:*'):
+        client.delete(key)
+
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/submit', methods=['POST'])
+    @idempotent
+    def submit():
+        calls.append(request.get_json())
+        time.sleep(float(request.args.get('delay', 0)))
+        if request.get_json().get('fail'):
+            return jsonify({'error': 'Database error occurred'}), 500
+        return jsonify({'success': True, 'submission_id': len(calls)}), 200
+
+    yield app, calls
+    for key in client.scan_iter('idempotency:*'):
+        client.delete(key)
+
+def test_duplicates_replay_the_first_response(submit_app):
+    app, calls = submit_app
+    logger.info("Testing idempotent submissions...")
+    http = app.test_client()
+    headers = {'Idempotency-Key': 'run-1'}
+
+    first = http.post('/submit', json={'accuracy': 90}, headers=headers)
+    retry = http.post('/submit', json={'accuracy': 90}, headers=headers)
+    assert first.get_json() == retry.get_json() == {'success': True, 'submission_id': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true' and len(calls) == 1
+
+    # A reused key with another body is refused
+    assert http.post('/submit', json={'accuracy': 91}, headers=headers).status_code == 422
+
+    # Without a header the body hash is the key, regardless of key order
+    http.post('/submit', json={'a': 1, 'b': 2})
+    assert http.post('/submit', json={'b': 2, 'a': 1}).headers.get('Idempotent-Replayed') == 'true'
+    assert len(calls) == 2
+
+    # Failures are not stored, so a retry runs again
+    http.post('/submit', json={'fail': True})
+    http.post('/submit', json={'fail': True})
+    assert len(calls) == 4
+    logger.info("✓ Idempotent replay test passed")
+
+def test_concurrent_duplicates_wait_for_the_first(submit_app):
+    app, calls = submit_app
+    logger.info("Testing concurrent duplicate submissions...")
+    responses = []
+
+    def post():
+        response = app.test_client().post('/submit?delay=0.3', json={'accuracy': 50},
+                                          headers={'Idempotency-Key': 'run-2'})
+        responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=post) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert responses == [(200, {'success': True, 'submission_id': 1})] * 5
+    logger.info("✓ Concurrent duplicate test passed")
+
+def test_clients_do_not_share_records(submit_app):
+    app, calls = submit_app
+    logger.info("Testing idempotency records per client...")
+    alice = app.test_client()
+    alice.environ_base['REMOTE_ADDR'] = '10.0.0.1'
+    bob = app.test_client()
+    bob.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+
+    # The same body, or the same key, from another client is a new submission
+    for headers in ({}, {'Idempotency-Key': 'run-3'}):
+        first = alice.post('/submit', json={'accuracy': 70}, headers=headers)
+        other = bob.post('/submit', json={'accuracy': 70}, headers=headers)
+        assert 'Idempotent-Replayed' not in other.headers
+        assert other.get_json()['submission_id'] == first.get_json()['submission_id'] + 1
+        assert alice.post('/submit', json={'accuracy': 70}, headers=headers).get_json() == first.get_json()
+    assert len(calls) == 4
+
+    # Nor does one client's key conflict with another's request under that key
+    assert bob.post('/submit', json={'accuracy': 71}, headers={'Idempotency-Key': 'run-4'}).status_code == 200
+    assert alice.post('/submit', json={'accuracy': 72}, headers={'Idempotency-Key': 'run-4'}).status_code == 200
+    logger.info("✓ Per-client idempotency test passed")
+
+def test_replays_are_not_rate_limited(flask_app):
+    logger.info("Testing replays at an exhausted rate limit...")
+    http = flask_app.test_client()
+    submission = {'gpu_utilization': 80, 'memory_usage': 40, 'power_efficiency': 70,
+                  'completion_time': 100, 'accuracy': 92.5}
+    for path, wrap in (('/submit_qualification', dict), ('/submit_qualification/batch', lambda body: [body])):
+        body = wrap(submission)
+        first = http.post(path, json=body, headers={'Idempotency-Key': 'limited'})
+        assert first.status_code == 200
+
+        # Spend the rest of the hour's limit, until new requests are refused
+        accuracy = 93.0
+        while (response := http.post(path, json=wrap(dict(submission, accuracy=accuracy)))).status_code == 200:
+            accuracy += 0.25
+        assert response.status_code == 429
+
+        # A retry of the stored request is still answered, and charges nothing
+        retry = http.post(path, json=body, headers={'Idempotency-Key': 'limited'})
+        assert retry.status_code == 200 and retry.headers['Idempotent-Replayed'] == 'true'
+        assert retry.get_json() == first.get_json()
+    logger.info("✓ Replay at rate limit test passed")
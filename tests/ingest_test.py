@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'test:submissions:ingest'
+DEAD_LETTER_KEY = 'test:submissions:ingest:dead'
+
+def submission(accuracy):
+    return {'gpu_utilization': 80, 'memory_usage': 40, 'power_efficiency': 70,
+            'completion_time': 100, 'accuracy': accuracy}
+
+@pytest.fixture
+def ingest(flask_app, redis_db, monkeypatch):
+    from app import db, ingest
+    monkeypatch.setattr(ingest, 'STREAM_KEY', STREAM_KEY)
+    monkeypatch.setattr(ingest, 'DEAD_LETTER_KEY', DEAD_LETTER_KEY)
+    redis_db.delete(STREAM_KEY, DEAD_LETTER_KEY)
+    with flask_app.app_context():
+        yield flask_app, ingest, redis_db, db
+    redis_db.delete(STREAM_KEY, DEAD_LETTER_KEY)
+
+def enqueue(ingest, count):
+    items = [(submission(90 + i / 10), 50.0 + i, datetime.utcnow()) for i in range(count)]
+    return ingest.enqueue_submissions(items)
+
+def stored(db, ingest_ids):
+    from app.models import Submission
+    return db.session.query(Submission.ingest_id, Submission.id).filter(Submission.ingest_id.in_(ingest_ids)).all()
+
+def test_worker_writes_in_batches(ingest):
+    app, ingest, client, db = ingest
+    logger.info("Testing batched ingestion...")
+    ingest_ids = enqueue(ingest, 5)
+    worker = ingest.IngestWorker(app, consumer='test-writer', batch_size=2, block_ms=10)
+    worker.ensure_group(client)
+
+    # Each read takes at most batch_size entries, and each batch is written and acknowledged
+    sizes = []
+    while entries := worker.read_batch(client):
+        sizes.append(len(entries))
+        worker.process(client, entries)
+    assert sizes == [2, 2, 1] and worker.written == 5
+    assert sorted(ingest_id for ingest_id, _ in stored(db, ingest_ids)) == sorted(ingest_ids)
+    assert client.xlen(STREAM_KEY) == 0 and client.xpending(STREAM_KEY, ingest.GROUP)['pending'] == 0
+    assert ingest.lookup_ingested(ingest_ids[0])[1] == 50.0
+
+    # The run loop drains what arrives later, until stopped
+    later = enqueue(ingest, 3)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while len(stored(db, later)) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive() and len(stored(db, later)) == 3
+    logger.info("✓ Batched ingestion test passed")
+
+def test_abandoned_entries_are_claimed(ingest):
+    app, ingest, client, db = ingest
+    logger.info("Testing redelivery of abandoned entries...")
+    ingest_ids = enqueue(ingest, 3)
+
+    # A worker reads a batch and dies before writing or acknowledging it
+    crashed = ingest.IngestWorker(app, consumer='test-crashed', batch_size=10, block_ms=10)
+    crashed.ensure_group(client)
+    assert len(crashed.read_batch(client)) == 3
+    assert stored(db, ingest_ids) == []
+
+    # Until the entries have been idle claim_idle_ms, another worker only sees new ones
+    patient = ingest.IngestWorker(app, consumer='test-rescuer', batch_size=10, block_ms=10, claim_idle_ms=60_000)
+    assert patient.read_batch(client) == []
+    rescuer = ingest.IngestWorker(app, consumer='test-rescuer', batch_size=10, block_ms=10, claim_idle_ms=1)
+    time.sleep(0.01)
+    claimed = rescuer.read_batch(client)
+    assert len(claimed) == 3
+    rescuer.process(client, claimed)
+    assert len(stored(db, ingest_ids)) == 3
+    assert client.xpending(STREAM_KEY, ingest.GROUP)['pending'] == 0
+    logger.info("✓ Redelivery test passed")
+
+def test_replayed_rows_are_written_once(ingest):
+    app, ingest, client, db = ingest
+    logger.info("Testing idempotent ingestion writes...")
+    from app.stats import summary
+    now = datetime.utcnow()
+    rows = [{'ingest_id': uuid.uuid4().hex, 'metrics': submission(91.5 + i), 'score': 60.0 + i,
+             'score_version': 1, 'timestamp': now, 'slot_allocated': False} for i in range(2)]
+    before = summary()['submissions']
+
+    # A batch holding an entry twice, then the whole batch redelivered after its commit
+    first = ingest.write_submissions(rows + rows[:1])
+    replay = ingest.write_submissions(rows)
+    assert first == replay and len(set(first.values())) == 2
+    assert sorted(stored(db, list(first))) == sorted(first.items())
+    assert summary()['submissions'] == before + 2
+    assert client.zscore('gpu_leaderboard', str(first[rows[1]['ingest_id']])) == 61.0
+    logger.info("✓ Idempotent ingestion test passed")
+
+def test_failing_entries_are_dead_lettered(ingest, monkeypatch):
+    app, ingest, client, db = ingest
+    logger.info("Testing dead-lettering of entries that cannot be written...")
+    ingest_ids = enqueue(ingest, 3)
+    poisoned = ingest_ids[1]
+    metric_columns = ingest.metric_columns
+
+    def failing_columns(data):
+        if data['accuracy'] == 90.1:
+            raise RuntimeError("cannot score")
+        return metric_columns(data)
+    monkeypatch.setattr(ingest, 'metric_columns', failing_columns)
+
+    # The first read fails unexpectedly; the run loop logs it and keeps consuming
+    worker = ingest.IngestWorker(app, consumer='test-poisoned', batch_size=10, block_ms=10)
+    read_batch = worker.read_batch
+    failures = []
+
+    def flaky_read(client):
+        if not failures:
+            failures.append(True)
+            raise ValueError("unexpected reply")
+        return read_batch(client)
+    monkeypatch.setattr(worker, 'read_batch', flaky_read)
+    monkeypatch.setattr(worker.stopping, 'wait', lambda timeout=None: worker.stopping.is_set())
+
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while client.xlen(DEAD_LETTER_KEY) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive() and failures
+
+    # The other entries are written, and the failing one is moved aside with its error
+    assert sorted(ingest_id for ingest_id, _ in stored(db, ingest_ids)) == sorted(set(ingest_ids) - {poisoned})
+    (_, fields), = client.xrange(DEAD_LETTER_KEY)
+    assert fields['ingest_id'] == poisoned and fields['error'] == 'cannot score'
+    assert client.xlen(STREAM_KEY) == 0 and client.xpending(STREAM_KEY, ingest.GROUP)['pending'] == 0
+    logger.info("✓ Dead-letter test passed")
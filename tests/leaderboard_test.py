@@ -0,0 +1,153 @@
+import base64
+import logging
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUBMISSION = {
+    'gpu_utilization': 88,
+    'memory_usage': 45,
+    'power_efficiency': 75,
+    'completion_time': 150,
+    'accuracy': 96
+}
+
+def test_leaderboard_revalidation(flask_app):
+    logger.info("Testing leaderboard revalidation...")
+    client = flask_app.test_client()
+    assert client.post('/submit_qualification', json=dict(SUBMISSION, accuracy=96.5)).status_code == 200
+
+    # An unchanged board answers 304, with the validators and no body
+    first = client.get('/leaderboard')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/leaderboard').headers['ETag'] == etag
+    revalidated = client.get('/leaderboard', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag and 'Content-Type' not in revalidated.headers
+    assert len(revalidated.headers.getlist('Date')) <= 1
+    assert client.get('/leaderboard', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    assert client.get('/leaderboard', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+    # A submission bumps the version, so the cached board and its ETag are replaced
+    response = client.post('/submit_qualification', json=dict(SUBMISSION, accuracy=97.5))
+    submission_id = response.get_json()['submission_id']
+    changed = client.get('/leaderboard', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert submission_id in [entry['submission_id'] for entry in changed.get_json()['leaderboard']]
+    logger.info("✓ Leaderboard revalidation test passed")
+
+@pytest.fixture
+def ranked_board(flask_app, monkeypatch):
+    """Seven scored submissions, alone on the Redis board (no top-K overflow into Postgres)"""
+    from datetime import datetime
+    from app import db, redis_client
+    from app.models import Submission
+    monkeypatch.setattr(redis_client.Config, 'LEADERBOARD_TOP_K', 0)
+    with flask_app.app_context():
+        rows = [Submission(metrics={}, score=float(score), timestamp=datetime.utcnow(), slot_allocated=False)
+                for score in range(10, 80, 10)]
+        db.session.add_all(rows)
+        db.session.commit()
+        entries = [(row.id, row.score) for row in rows]
+        redis_client.update_leaderboard_bulk(entries)
+    # Best first
+    return flask_app.test_client(), [sub_id for sub_id, _ in reversed(entries)]
+
+def test_leaderboard_pages(ranked_board):
+    client, ids = ranked_board
+    logger.info("Testing leaderboard pagination...")
+    from config import Config
+    for query in ('limit=0', f'limit={Config.LEADERBOARD_MAX_PAGE_SIZE + 1}', 'offset=-1', 'window=year'):
+        assert client.get(f'/leaderboard?{query}').status_code == 400, query
+
+    # The last page is short, numbered from its offset, and has no cursor
+    page = client.get('/leaderboard?offset=5&limit=10').get_json()
+    assert [entry['submission_id'] for entry in page['leaderboard']] == ids[5:]
+    assert [entry['rank'] for entry in page['leaderboard']] == [6, 7]
+    assert page['total'] == 7 and page['next_cursor'] is None
+    assert client.get('/leaderboard?offset=7').get_json()['leaderboard'] == []
+
+    # Following cursors walks the whole board once, in order
+    seen, ranks, query = [], [], 'limit=3'
+    while query:
+        page = client.get(f'/leaderboard?{query}').get_json()
+        seen += [entry['submission_id'] for entry in page['leaderboard']]
+        ranks += [entry['rank'] for entry in page['leaderboard']]
+        query = f"limit=3&cursor={page['next_cursor']}" if page['next_cursor'] else None
+    assert seen == ids and ranks == list(range(1, 8))
+
+    # Malformed cursors are refused
+    bad = base64.urlsafe_b64encode(b'high:1:2').decode()
+    for cursor in ('not-base64!', bad, base64.urlsafe_b64encode(b'1.0:2:3:4').decode()):
+        assert client.get(f'/leaderboard?cursor={cursor}').status_code == 400, cursor
+    logger.info("✓ Leaderboard pagination test passed")
+
+def test_rank_lookup(ranked_board, monkeypatch):
+    client, ids = ranked_board
+    logger.info("Testing rank lookups...")
+    top = client.get(f'/submissions/{ids[0]}/rank?neighbours=2').get_json()
+    assert top['rank'] == 1 and top['percentile'] == 100.0 and top['total'] == 7
+    assert [entry['submission_id'] for entry in top['neighbours']] == ids[:3]
+    assert [entry['rank'] for entry in top['neighbours']] == [1, 2, 3]
+
+    bottom = client.get(f'/submissions/{ids[-1]}/rank?neighbours=2').get_json()
+    assert bottom['rank'] == 7 and not bottom['approximate']
+    assert [entry['submission_id'] for entry in bottom['neighbours']] == ids[-3:]
+    assert [entry['rank'] for entry in bottom['neighbours']] == [5, 6, 7]
+
+    middle = client.get(f'/submissions/{ids[3]}/rank?neighbours=0').get_json()
+    assert middle['rank'] == 4 and [entry['submission_id'] for entry in middle['neighbours']] == [ids[3]]
+
+    assert client.get(f'/submissions/{ids[0]}/rank?neighbours=-1').status_code == 400
+    assert client.get(f'/submissions/{ids[0]}/rank?neighbours=1000').status_code == 400
+    assert client.get('/submissions/999999999/rank').status_code == 404
+    # Also when ranks outside the top K are looked up in Postgres
+    from config import Config
+    monkeypatch.setattr(Config, 'LEADERBOARD_TOP_K', 5)
+    assert client.get('/submissions/999999999/rank').status_code == 404
+    logger.info("✓ Rank lookup test passed")
+
+def test_tied_scores_across_top_k(flask_app, monkeypatch):
+    logger.info("Testing tied scores on both sides of rank K...")
+    from datetime import datetime
+    from sqlalchemy import delete, func, select
+    from app import db, redis_client
+    from app.models import Submission
+    # Ids of different lengths, so string order (the zset's) and numeric order disagree
+    ids = [999_999_999_997, 999_999_999_998, 999_999_999_999,
+           1_000_000_000_000, 1_000_000_000_001, 1_000_000_000_002]
+    expected = sorted(ids, key=str, reverse=True)
+    monkeypatch.setattr(redis_client.Config, 'LEADERBOARD_TOP_K', 3)
+    client = flask_app.test_client()
+    with flask_app.app_context():
+        score = (db.session.scalar(select(func.max(Submission.score))) or 0) + 1000
+        db.session.add_all([Submission(id=sub_id, metrics={}, score=score, timestamp=datetime.utcnow(),
+                                       slot_allocated=False) for sub_id in ids])
+        db.session.commit()
+        redis_client.update_leaderboard_bulk([(sub_id, score) for sub_id in ids])
+    try:
+        # Redis keeps the three members that sort last as strings
+        assert [entry['submission_id'] for entry in client.get('/leaderboard?limit=3').get_json()['leaderboard']] \
+            == expected[:3]
+
+        # Cursors and offsets both continue into Postgres without skipping or repeating a tie
+        seen, query = [], 'limit=2'
+        while len(seen) < len(ids):
+            page = client.get(f'/leaderboard?{query}').get_json()
+            seen += [entry['submission_id'] for entry in page['leaderboard']]
+            query = f"limit=2&cursor={page['next_cursor']}"
+        assert seen == expected
+        page = client.get('/leaderboard?offset=2&limit=3').get_json()
+        assert [entry['submission_id'] for entry in page['leaderboard']] == expected[2:5]
+
+        # Neighbours of a tie past K are ordered the same way
+        rank = client.get(f'/submissions/{expected[4]}/rank?neighbours=1').get_json()
+        assert rank['approximate']
+        assert [entry['submission_id'] for entry in rank['neighbours']][:2] == expected[3:5]
+    finally:
+        with flask_app.app_context():
+            db.session.execute(delete(Submission).where(Submission.id.in_(ids)))
+            db.session.commit()
+    logger.info("✓ Tied scores across top-K test passed")
@@ -0,0 +1,38 @@
+import io
+import json
+import logging
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+def test_sampled_json_logs_carry_request_id():
+    from app import logs
+    stream = io.StringIO()
+    logs.configure_logging(level='DEBUG', levels='', log_format='json', sample_rate=0.0, stream=stream)
+    try:
+        app = Flask(__name__)
+        logs.init_app(app)
+
+        @app.route('/work')
+        def work():
+            logger.info("success path detail")
+            logger.error("failure detail")
+            return 'ok'
+
+        response = app.test_client().get('/work', headers={'X-Request-ID': 'req-42'})
+        assert response.headers['X-Request-ID'] == 'req-42'
+        logs.flush_logs()
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        messages = [record['message'] for record in records]
+        # Unsampled request: INFO dropped, ERROR always kept and correlated
+        assert "success path detail" not in messages
+        error = next(record for record in records if record['message'] == "failure detail")
+        assert error['level'] == 'ERROR' and error['request_id'] == 'req-42'
+
+        assert logs.parse_levels('app=info, sqlalchemy.engine=WARNING') == {
+            'app': 'INFO', 'sqlalchemy.engine': 'WARNING'
+        }
+    finally:
+        logs.configure_logging()
+    logger.info("✓ Logging pipeline test passed")
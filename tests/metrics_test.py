@@ -0,0 +1,43 @@
+import importlib
+import logging
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def metrics_module(redis_db, monkeypatch):
+    # app.routes star-imports the registry instance over the module attribute
+    metrics = importlib.import_module('app.metrics')
+    client = redis_db
+    for name in ('SERIES_KEY', 'PROCESSES_KEY', 'GAUGES_KEY_PREFIX'):
+        monkeypatch.setattr(metrics, name, f"test:{getattr(metrics, name)}")
+    client.delete(metrics.SERIES_KEY, metrics.PROCESSES_KEY)
+    yield metrics
+    for key in client.keys('test:metrics:*'):
+        client.delete(key)
+
+def test_metrics_aggregate_across_processes(metrics_module):
+    logger.info("Testing metrics aggregation...")
+    workers = [metrics_module.Metrics() for _ in range(2)]
+    for i, worker in enumerate(workers):
+        worker.process_id = f"test-worker-{i}"
+        worker.observe('http_request_duration_seconds', 0.003, method='GET', endpoint='get_leaderboard', status=200)
+        worker.observe('http_request_duration_seconds', 0.2, method='GET', endpoint='get_leaderboard', status=200)
+        worker.inc('ratelimit_rejections_total', scope='submit_qualification')
+        assert worker.flush()
+
+    # Either process renders the totals for both
+    text = workers[0].render()
+    labels = 'endpoint="get_leaderboard",method="GET",status="200"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.005"}} 2' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.25"}} 4' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 4' in text
+    assert f'http_request_duration_seconds_count{{{labels}}} 4' in text
+    assert 'ratelimit_rejections_total{scope="submit_qualification"} 2' in text
+    assert 'metrics_processes 2' in text
+
+    # Flushed deltas are not counted twice
+    assert workers[1].flush()
+    assert 'ratelimit_rejections_total{scope="submit_qualification"} 2' in workers[1].render()
+    logger.info("✓ Metrics aggregation test passed")
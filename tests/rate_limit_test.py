@@ -0,0 +1,140 @@
+import os
+import time
+import logging
+import multiprocessing
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PROCESSES = 4
+# Leave a core for Redis when measuring latency, so the test measures the
+# limiter rather than CPU oversubscription
+LATENCY_PROCESSES = max(1, min(PROCESSES, (os.cpu_count() or 1) - 1))
+
+@pytest.fixture
+def limiter_db(redis_db):
+    # Import the package once here; forked workers inherit it and open their
+    # own Redis pools on the test database
+    import app.rate_limit  # noqa: F401
+    client = redis_db
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+def _hammer(spec, key, hits, local_share, queue, start):
+    from app.rate_limit import RedisRateLimiter, RateLimit
+    limiter = RedisRateLimiter(local_share=local_share)
+    limit = RateLimit.parse(spec)
+    start.wait()  # Contend, rather than run one process after another
+
+    allowed = 0
+    latencies = []
+    for _ in range(hits):
+        started = time.perf_counter()
+        result = limiter.hit(key, limit)
+        latencies.append(time.perf_counter() - started)
+        allowed += result.allowed
+    limiter.flush()
+    queue.put((allowed, limiter.local_hits, latencies))
+
+def _run(spec, key, hits_per_process, local_share=None, processes=PROCESSES):
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    start = ctx.Barrier(processes)
+    workers = [ctx.Process(target=_hammer, args=(spec, key, hits_per_process, local_share, queue, start))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    allowed = sum(r[0] for r in results)
+    local_hits = sum(r[1] for r in results)
+    latencies = sorted(latency for r in results for latency in r[2])
+    return allowed, local_hits, latencies
+
+def test_limit_is_exact_across_processes(limiter_db):
+    logger.info("Testing rate limit across processes...")
+    allowed, _, _ = _run("20 per hour", "ratelimit:test:exact", 15)
+
+    assert allowed == 20, f"{allowed} requests admitted for a limit of 20"
+    stats = limiter_db.hgetall("ratelimit:test:exact:stats")
+    assert int(stats['allowed']) == 20
+    assert int(stats['rejected']) == PROCESSES * 15 - 20
+    logger.info("✓ Cross-process limit test passed")
+
+def test_local_allowance_never_overshoots(limiter_db):
+    logger.info("Testing local allowance under contention...")
+    allowed, local_hits, _ = _run("1000 per hour", "ratelimit:test:overshoot", 500)
+
+    assert local_hits > 0, "No request skipped the Redis round trip"
+    assert allowed <= 1000, f"{allowed} requests admitted for a limit of 1000"
+    stats = limiter_db.hgetall("ratelimit:test:overshoot:stats")
+    assert int(stats['allowed']) == allowed
+    logger.info("✓ Local allowance test passed")
+
+def test_local_allowances_are_reserved_in_redis(limiter_db):
+    logger.info("Testing local allowances with many processes...")
+    # With half the remaining allowance per process, allowances granted without
+    # a global bound would add up to several times the limit
+    processes = 16
+    allowed, local_hits, _ = _run("200 per hour", "ratelimit:test:reserved", 40,
+                                  local_share=0.5, processes=processes)
+
+    assert local_hits > 0, "No request skipped the Redis round trip"
+    assert allowed <= 200, f"{allowed} requests admitted for a limit of 200 across {processes} processes"
+    stats = limiter_db.hgetall("ratelimit:test:reserved:stats")
+    assert int(stats['allowed']) == allowed
+    assert int(stats['allowed']) + int(stats['rejected']) == processes * 40
+    logger.info("✓ Reserved local allowance test passed")
+
+def test_check_latency_under_a_millisecond(limiter_db):
+    logger.info("Testing rate limit check latency...")
+    # Without local allowances every check is a Redis round trip
+    allowed, local_hits, latencies = _run("100000 per hour", "ratelimit:test:latency", 2000,
+                                          local_share=0, processes=LATENCY_PROCESSES)
+
+    assert allowed == LATENCY_PROCESSES * 2000
+    assert int(limiter_db.hget("ratelimit:test:latency:stats", 'allowed')) == allowed
+    p99 = latencies[int(len(latencies) * 0.99)]
+    logger.info(f"p99 check latency {p99 * 1000:.3f} ms, {local_hits} local hits")
+    assert p99 < 0.001, f"p99 check latency {p99 * 1000:.3f} ms"
+    logger.info("✓ Rate limit latency test passed")
+
+def _reserve_and_idle(spec, key, hits, queue, start, done):
+    from app.rate_limit import RedisRateLimiter, RateLimit
+    limiter = RedisRateLimiter(local_share=0.5, local_ttl=0.2)
+    limit = RateLimit.parse(spec)
+    start.wait()
+    queue.put(sum(limiter.hit(key, limit).allowed for _ in range(hits)))
+    # Stay alive without checking the key again or flushing
+    done.wait()
+
+def test_idle_workers_give_reservations_back(limiter_db):
+    logger.info("Testing release of reservations held by idle workers...")
+    from app.rate_limit import RedisRateLimiter, RateLimit
+    ctx = multiprocessing.get_context('fork')
+    queue, start, done = ctx.Queue(), ctx.Barrier(8), ctx.Event()
+    args = ("40 per hour", "ratelimit:test:release", 2, queue, start, done)
+    workers = [ctx.Process(target=_reserve_and_idle, args=args) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    try:
+        allowed = sum(queue.get(timeout=60) for _ in workers)
+        # Once their reservations expire, the idle workers hand back what they didn't use,
+        # and the rest of the client's limit is admitted elsewhere
+        time.sleep(0.6)
+        limiter = RedisRateLimiter(local_share=0)
+        limit = RateLimit.parse("40 per hour")
+        while limiter.hit("ratelimit:test:release", limit).allowed:
+            allowed += 1
+    finally:
+        done.set()
+        for worker in workers:
+            worker.join()
+
+    assert allowed == 40, f"{allowed} requests admitted for a limit of 40"
+    assert int(limiter_db.hget("ratelimit:test:release:stats", 'allowed')) == 40
+    logger.info("✓ Reservation release test passed")
@@ -0,0 +1,288 @@
+import logging
+from datetime import datetime
+import pytest
+from sqlalchemy import func
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+KEYS = ['test:gpu_leaderboard', 'test:gpu_leaderboard:version',
+        'test:gpu_leaderboard:high_water_mark', 'test:gpu_leaderboard:sync_lock',
+        'test:gpu_leaderboard:metric_sets', 'test:gpu_leaderboard:unseen_ids',
+        'test:gpu_leaderboard:verified_count']
+METRIC_PREFIX = 'test:gpu_leaderboard:metric:'
+
+@pytest.fixture
+def reconcile(flask_app, redis_db, monkeypatch):
+    from app import db, redis_client, reconcile
+    client = redis_db
+    monkeypatch.setattr(reconcile, 'LEADERBOARD_KEY', KEYS[0])
+    monkeypatch.setattr(reconcile, 'LEADERBOARD_VERSION_KEY', KEYS[1])
+    monkeypatch.setattr(reconcile, 'HIGH_WATER_MARK_KEY', KEYS[2])
+    monkeypatch.setattr(reconcile, 'SYNC_LOCK_KEY', KEYS[3])
+    monkeypatch.setattr(reconcile, 'METRIC_SETS_KEY', KEYS[4])
+    monkeypatch.setattr(reconcile, 'UNSEEN_IDS_KEY', KEYS[5])
+    monkeypatch.setattr(reconcile, 'VERIFIED_COUNT_KEY', KEYS[6])
+    monkeypatch.setattr(reconcile, 'METRIC_LEADERBOARD_PREFIX', METRIC_PREFIX)
+    monkeypatch.setattr(redis_client, 'METRIC_LEADERBOARD_PREFIX', METRIC_PREFIX)
+    monkeypatch.setattr(reconcile.Config, 'RECONCILE_CHUNK_SIZE', 7)
+    client.delete(*KEYS, *client.keys(f"{METRIC_PREFIX}*"))
+    with flask_app.app_context():
+        yield reconcile, client, db
+    client.delete(*KEYS, *client.keys(f"{METRIC_PREFIX}*"))
+
+def add_submissions(db, scores, metrics=None):
+    from app.models import Submission
+    rows = [Submission(metrics=data, score=score, timestamp=datetime.utcnow(), slot_allocated=False)
+            for score, data in zip(scores, metrics or [{}] * len(scores))]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+def test_rebuild_and_catch_up(reconcile):
+    reconcile, client, db = reconcile
+    logger.info("Testing leaderboard rebuild and reconciliation...")
+    from app.models import Submission
+    add_submissions(db, [float(i) for i in range(20)])
+    expected = db.session.query(Submission).filter(Submission.score.isnot(None)).count()
+
+    # Redis lost everything: the first pass rebuilds the whole board in chunks
+    assert reconcile.reconcile_once() == 'rebuilt'
+    assert client.zcard(KEYS[0]) == expected
+    assert not [key for key in client.keys('test:gpu_leaderboard:rebuild:*')]
+
+    rebuilt_to = int(client.get(KEYS[2]))
+
+    # New rows reach the board through the high-water mark
+    new_ids = add_submissions(db, [1000.0, 1001.0])
+    assert reconcile.reconcile_once() == 'caught_up'
+    assert client.zscore(KEYS[0], str(new_ids[1])) == 1001.0
+    assert int(client.get(KEYS[2])) == new_ids[1]
+
+    # The count check only counts rows above the mark it last counted to
+    assert client.get(KEYS[6]) == f"{rebuilt_to}:{expected}"
+    assert reconcile.reconcile_once(verify=True) == 'caught_up'
+    assert client.get(KEYS[6]) == f"{new_ids[1]}:{expected + 2}"
+
+    # Entries dropped from Redis are noticed by the count check
+    client.zrem(KEYS[0], str(new_ids[0]), str(new_ids[0] - 5))
+    assert reconcile.reconcile_once(verify=True) == 'rebuilt'
+    assert client.zcard(KEYS[0]) == expected + 2
+
+    # A pass with nothing new writes nothing
+    version = client.get(KEYS[1])
+    assert reconcile.reconcile_once() == 'caught_up' and client.get(KEYS[1]) == version
+    assert reconcile.catch_up(client, int(client.get(KEYS[2]))) == 0
+
+    # Another process holding the lock means this one skips the pass
+    client.set(KEYS[3], 'someone-else', px=1000)
+    assert reconcile.reconcile_once() == 'locked'
+    logger.info("✓ Leaderboard reconciliation test passed")
+
+def test_rebuild_extends_its_lock(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing the sync lock during a long rebuild...")
+    import time
+    from app.models import Submission
+    add_submissions(db, [float(i) for i in range(20)])
+    # A few slow chunks, however many rows earlier runs left
+    total = db.session.query(Submission).filter(Submission.score.isnot(None)).count()
+    monkeypatch.setattr(reconcile.Config, 'RECONCILE_CHUNK_SIZE', total // 3 + 1)
+    load = reconcile._load
+
+    def slow_load(*args):
+        time.sleep(0.3)
+        return load(*args)
+    monkeypatch.setattr(reconcile, '_load', slow_load)
+
+    # The rebuild outlasts the lock's TTL, but keeps renewing it
+    lock = reconcile.SyncLock(client, 500)
+    with lock as acquired:
+        assert acquired
+        assert reconcile.rebuild_leaderboard(client, lock) > 0
+        assert client.get(KEYS[3]) == lock.token
+    version = client.get(KEYS[1])
+
+    # A process that lost the lock mid-rebuild stops before the swap
+    def load_then_lose_lock(*args):
+        client.set(KEYS[3], 'someone-else', px=60_000)
+        return load(*args)
+    monkeypatch.setattr(reconcile, '_load', load_then_lose_lock)
+    client.delete(KEYS[0])
+    assert reconcile.reconcile_once() == 'locked'
+    assert not client.exists(KEYS[0]) and client.get(KEYS[1]) == version
+    assert not client.keys('test:gpu_leaderboard:rebuild:*')
+    logger.info("✓ Sync lock extension test passed")
+
+def test_late_commits_below_the_mark(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing rows committed out of id order...")
+    from app.models import Submission
+    monkeypatch.setattr(reconcile.Config, 'RECONCILE_LOOKBACK', 5)
+    assert reconcile.reconcile_once() == 'rebuilt'
+
+    # The middle row is still uncommitted when the mark passes it
+    ids = add_submissions(db, [2000.0, 2001.0, 2002.0])
+    late = db.session.get(Submission, ids[1])
+    db.session.delete(late)
+    db.session.commit()
+    assert reconcile.reconcile_once() == 'caught_up'
+    assert int(client.get(KEYS[2])) == ids[2]
+    assert client.zrange(KEYS[5], 0, -1) == [str(ids[1])]
+
+    # It is added once it commits, and then no longer looked for
+    db.session.add(Submission(id=ids[1], metrics={}, score=2001.0, timestamp=datetime.utcnow(), slot_allocated=False))
+    db.session.commit()
+    assert reconcile.catch_up(client, ids[2]) == 1
+    assert client.zscore(KEYS[0], str(ids[1])) == 2001.0 and not client.exists(KEYS[5])
+
+    # Ids that never appear are forgotten once they fall out of the lookback
+    gone, _ = add_submissions(db, [2003.0, 2004.0])
+    db.session.delete(db.session.get(Submission, gone))
+    db.session.commit()
+    reconcile.catch_up(client, ids[2])
+    assert client.zrange(KEYS[5], 0, -1) == [str(gone)]
+    add_submissions(db, [2005.0 + i for i in range(5)])
+    reconcile.catch_up(client, int(client.get(KEYS[2])))
+    assert not client.exists(KEYS[5])
+    logger.info("✓ Late commit test passed")
+
+def test_top_k_trims_and_estimates_overflow(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing top-K leaderboard...")
+    from app import redis_client, ranking
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_KEY', KEYS[0])
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_VERSION_KEY', KEYS[1])
+    monkeypatch.setattr(reconcile.Config, 'LEADERBOARD_TOP_K', 5)
+
+    # Scores above anything left behind by earlier runs
+    base = (db.session.query(func.max(reconcile.Submission.score)).scalar() or 0) + 1000
+    ids = add_submissions(db, [base + i for i in range(10)])
+    assert reconcile.reconcile_once() == 'rebuilt'
+    assert client.zcard(KEYS[0]) == 5
+
+    # Inserts trim in the same MULTI/EXEC; the new leader stays, the 5th best drops out
+    leader = redis_client.update_leaderboard(ids[-1] + 1000, base + 100)
+    assert leader == (ids[-1] + 1000, base + 100)
+    assert client.zcard(KEYS[0]) == 5
+    assert client.zscore(KEYS[0], str(ids[5])) is None
+    assert redis_client.get_leaderboard_memory()['memory_bytes'] > 0
+
+    # A submission below the top K is ranked from the database
+    estimate = ranking.estimate_submission_rank(ids[3], 1)
+    higher = db.session.query(reconcile.Submission).filter(reconcile.Submission.score > base + 3).count()
+    assert estimate['approximate'] and estimate['rank'] == higher
+    assert [sub_id for sub_id, _ in estimate['neighbours']] == [ids[4], ids[3], ids[2]]
+    logger.info("✓ Top-K leaderboard test passed")
+
+def test_metric_leaderboards(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing per-metric leaderboards...")
+    from app import redis_client
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_KEY', KEYS[0])
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_VERSION_KEY', KEYS[1])
+    monkeypatch.setattr(reconcile.Config, 'LEADERBOARD_TOP_K', 3)
+
+    # Faster than any completion time left behind by earlier runs, so these rank first
+    fastest_seen = min([row.metrics.get('completion_time', 1.0)
+                        for row in db.session.query(reconcile.Submission)] + [1.0])
+
+    def metrics(i):
+        return {'gpu_utilization': 90.0, 'memory_usage': 50.0, 'power_efficiency': 10.0 * i,
+                'completion_time': fastest_seen * (i + 1) / 10, 'accuracy': 99.0}
+
+    ids = add_submissions(db, [1.0] * 5, [metrics(i) for i in range(5)])
+
+    # A rebuild fills every per-metric board, trimmed to the best K in each direction
+    assert reconcile.reconcile_once() == 'rebuilt'
+    fastest, total = redis_client.get_metric_leaderboard_page('completion_time', 0, 10)
+    assert [sub_id for sub_id, _ in fastest] == ids[:3] and total == 3
+    best_power, _ = redis_client.get_metric_leaderboard_page('power_efficiency', 0, 2)
+    assert best_power[0][1] >= 40.0
+
+    # Live updates go to the metric boards in the same pipeline
+    redis_client.update_leaderboard(ids[-1] + 1000, 1.0, metrics(-0.5))
+    fastest, _ = redis_client.get_metric_leaderboard_page('completion_time', 0, 1)
+    assert fastest == [(ids[-1] + 1000, metrics(-0.5)['completion_time'])]
+
+    # Losing one metric board's marker forces a rebuild of all of them
+    client.delete(KEYS[4])
+    assert reconcile.reconcile_once() == 'rebuilt'
+    logger.info("✓ Per-metric leaderboard test passed")
+
+def test_time_windows(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing time-windowed leaderboards...")
+    from datetime import timedelta
+    from app import redis_client
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_KEY', KEYS[0])
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_VERSION_KEY', KEYS[1])
+    monkeypatch.setattr(redis_client, 'HOUR_BUCKET_PREFIX', 'test:gpu_leaderboard:hour:')
+    monkeypatch.setattr(redis_client, 'WINDOW_ROLLUP_PREFIX', 'test:gpu_leaderboard:window:')
+
+    now = datetime.utcnow()
+    base = 10 ** 9
+    redis_client.update_leaderboard_bulk(
+        [(base, 10.0), (base + 1, 20.0), (base + 2, 30.0), (base + 3, 40.0)], None,
+        [now, now - timedelta(hours=3), now - timedelta(hours=30), now - timedelta(hours=200)]
+    )
+
+    def window(name):
+        entries, total = redis_client.get_leaderboard_page(0, 10, name)
+        assert total == len(entries)
+        return [sub_id for sub_id, _ in entries]
+
+    assert window('hour') == [base]
+    assert window('day') == [base + 1, base]
+    assert window('week') == [base + 2, base + 1, base]
+
+    # Rollups already built this hour take new entries incrementally
+    redis_client.update_leaderboard(base + 4, 25.0, timestamp=now)
+    assert window('day') == [base + 4, base + 1, base]
+    assert window('week') == [base + 2, base + 4, base + 1, base]
+    offset, entries, _ = redis_client.get_leaderboard_page_after(base + 4, 25.0, 10, 'week')
+    assert offset == 2 and [sub_id for sub_id, _ in entries] == [base + 1, base]
+
+    # Buckets expire on their own once the week has moved past them
+    bucket = redis_client.hour_bucket_key(now.replace(minute=0, second=0, microsecond=0))
+    assert 0 < client.ttl(bucket) <= 169 * 3600
+    client.delete(*client.keys('test:gpu_leaderboard:hour:*'), *client.keys('test:gpu_leaderboard:window:*'))
+    logger.info("✓ Time-windowed leaderboard test passed")
+
+def test_rescore_resumes_and_swaps(reconcile, monkeypatch):
+    reconcile, client, db = reconcile
+    logger.info("Testing rescoring with a new scoring profile...")
+    from app import redis_client, rescore, scoring
+    from app.models import Submission
+    monkeypatch.setattr(rescore, 'LEADERBOARD_KEY', KEYS[0])
+    monkeypatch.setattr(rescore, 'LEADERBOARD_VERSION_KEY', KEYS[1])
+    monkeypatch.setattr(rescore, 'HIGH_WATER_MARK_KEY', KEYS[2])
+    monkeypatch.setattr(rescore, 'SHADOW_KEY', 'test:gpu_leaderboard:rescore:{version}')
+    monkeypatch.setattr(rescore, 'CHECKPOINT_KEY', 'test:gpu_leaderboard:rescore:{version}:checkpoint')
+    monkeypatch.setattr(redis_client, 'HOUR_BUCKET_PREFIX', 'test:gpu_leaderboard:hour:')
+    monkeypatch.setattr(redis_client, 'WINDOW_ROLLUP_PREFIX', 'test:gpu_leaderboard:window:')
+    # Profile 2 scores on accuracy alone
+    weights = dict.fromkeys(scoring.SCORING_PROFILES[1]['weights'], 0.0)
+    monkeypatch.setitem(scoring.SCORING_PROFILES, 2, {
+        'weights': dict(weights, accuracy=1.0), 'completion_time_best': 1, 'completion_time_worst': 300
+    })
+
+    metrics = [{'gpu_utilization': 50, 'memory_usage': 50, 'power_efficiency': 50,
+                'completion_time': 10, 'accuracy': accuracy} for accuracy in (70.0, 80.0, 90.0)]
+    ids = add_submissions(db, [1.0, 2.0, 3.0], metrics)
+    total = db.session.query(Submission).count()
+
+    # A run stopped after its first chunk picks up from the checkpoint
+    first = rescore.Rescorer(client, 2, chunk_size=5)
+    first.load_checkpoint(restart=True)
+    assert first.run_chunk() == min(5, total)
+    summary = rescore.rescore(2, chunk_size=50)
+    assert summary['rows'] == total - min(5, total)
+
+    rows = db.session.query(Submission).filter(Submission.id.in_(ids)).order_by(Submission.id).all()
+    assert [(row.score, row.score_version) for row in rows] == [(70.0, 2), (80.0, 2), (90.0, 2)]
+    assert client.zscore(KEYS[0], str(ids[2])) == 90.0
+    assert int(client.get(KEYS[2])) == ids[-1]
+    assert not client.exists('test:gpu_leaderboard:rescore:2', 'test:gpu_leaderboard:rescore:2:checkpoint')
+    client.delete(*client.keys('test:gpu_leaderboard:hour:*'), *client.keys('test:gpu_leaderboard:window:*'))
+    logger.info("✓ Rescore test passed")
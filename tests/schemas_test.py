@@ -0,0 +1,51 @@
+import logging
+import math
+import random
+from decimal import Decimal
+import jsonschema
+from app.schemas import submission_schema, validate_submission
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+FIELDS = list(submission_schema['properties'])
+
+def random_value(rng):
+    """Mostly in-range numbers, plus boundaries and values of the wrong type"""
+    generator = rng.choices([
+        lambda: rng.uniform(0, 100),
+        lambda: rng.randint(0, 100),
+        lambda: rng.uniform(-1e6, 1e6),
+        lambda: rng.choice([0, 0.0, 100, 100.0, -0.0, 100.0000001, -1e-9, 10 ** 30]),
+        lambda: rng.choice([math.nan, math.inf, -math.inf]),
+        lambda: rng.choice([True, False, None, '50', [50], {'value': 50}, Decimal('50')]),
+    ], weights=[30, 30, 2, 2, 1, 2])[0]
+    return generator()
+
+def random_submission(rng):
+    if rng.random() < 0.05:
+        return rng.choice([None, [], 'gpu', 42, [{'accuracy': 1}]])
+    data = {field: random_value(rng) for field in FIELDS if rng.random() > 0.05}
+    if rng.random() < 0.05:
+        data[rng.choice(['extra', 'score', 'Accuracy'])] = rng.uniform(0, 100)
+    return data
+
+def reference(data):
+    try:
+        jsonschema.validate(instance=data, schema=submission_schema)
+        return None
+    except jsonschema.ValidationError as e:
+        return str(e)
+
+def test_fast_path_matches_jsonschema():
+    logger.info("Testing validator conformance...")
+    rng = random.Random(1234)
+    accepted = 0
+    for _ in range(2000):
+        data = random_submission(rng)
+        expected = reference(data)
+        assert validate_submission(data) == expected, data
+        accepted += expected is None
+    # The fuzzer must exercise both outcomes
+    assert 0 < accepted < 2000
+    logger.info(f"✓ Validator conformance test passed ({accepted} of 2000 accepted)")
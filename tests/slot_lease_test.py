@@ -0,0 +1,51 @@
+import threading
+import time
+import logging
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+THREADS = 32
+WINDOWS = 5
+LEASE_MS = 300
+
+@pytest.fixture
+def lease_client(redis_db, monkeypatch):
+    from app import redis_client
+    client = redis_db
+    monkeypatch.setattr(redis_client, 'SLOT_LEASE_KEY', 'test:gpu_slot:lease')
+    monkeypatch.setattr(redis_client, 'LEADERBOARD_VERSION_KEY', 'test:gpu_leaderboard:version')
+    client.delete('test:gpu_slot:lease', 'test:gpu_leaderboard:version')
+    yield redis_client
+    client.delete('test:gpu_slot:lease', 'test:gpu_leaderboard:version')
+
+def test_exactly_one_winner_per_window(lease_client):
+    logger.info("Testing slot lease contention...")
+    for window in range(WINDOWS):
+        barrier = threading.Barrier(THREADS)
+        results = [None] * THREADS
+
+        def contend(i):
+            barrier.wait()
+            results[i] = lease_client.acquire_slot_lease(window * 1000 + i, LEASE_MS)
+
+        threads = [threading.Thread(target=contend, args=(i,)) for i in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        winners = [r for r in results if r and r[0]]
+        assert len(winners) == 1, f"Window {window}: {len(winners)} winners"
+        holder = winners[0][1]
+        assert all(r[1] == holder for r in results), "Losers saw a different holder"
+        assert lease_client.get_slot_lease()[0] == holder
+
+        # Let the lease expire before the next window
+        time.sleep(LEASE_MS / 1000 + 0.05)
+        assert lease_client.get_slot_lease() is None
+
+    # Every win bumped the leaderboard version exactly once
+    assert int(lease_client._client.get('test:gpu_leaderboard:version')) == WINDOWS
+    logger.info("✓ Slot lease contention test passed")
@@ -0,0 +1,90 @@
+import logging
+import importlib
+import pytest
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUBMISSIONS = [
+    {'gpu_utilization': 80, 'memory_usage': 40, 'power_efficiency': 60, 'completion_time': 120, 'accuracy': 91.5},
+    {'gpu_utilization': 90, 'memory_usage': 30, 'power_efficiency': 70, 'completion_time': 240, 'accuracy': 95.5},
+    {'gpu_utilization': 70, 'memory_usage': 50, 'power_efficiency': 80, 'completion_time': 360, 'accuracy': 97.5},
+]
+
+@pytest.fixture
+def stats_app(flask_app):
+    from app import db
+    return flask_app, db
+
+def test_stats_follow_submissions(stats_app):
+    app, _ = stats_app
+    logger.info("Testing submission statistics...")
+    with app.test_client() as client:
+        before = client.get('/stats').get_json()['fields']
+        for body in SUBMISSIONS:
+            assert client.post('/submit_qualification', json=body).status_code == 200
+        after = client.get('/stats').get_json()
+
+    # Counts and sums grow by exactly the submitted values
+    for field in ('gpu_utilization', 'completion_time', 'accuracy'):
+        added = after['fields'][field]['count'] - before[field]['count']
+        assert added == len(SUBMISSIONS)
+        old_sum = (before[field]['mean'] or 0) * before[field]['count']
+        new_sum = after['fields'][field]['mean'] * after['fields'][field]['count']
+        # Means are rounded to 4 places, so each sum is only that exact per row
+        tolerance = 0.0001 * after['fields'][field]['count'] + 0.1
+        assert new_sum - old_sum == pytest.approx(sum(body[field] for body in SUBMISSIONS), abs=tolerance)
+    assert after['submissions'] == after['fields']['score']['count']
+
+    accuracy = after['fields']['accuracy']
+    assert sum(accuracy['histogram']['counts']) == accuracy['count']
+    percentiles = [accuracy['percentiles'][f"p{p}"] for p in (25, 50, 75, 90, 99)]
+    assert percentiles == sorted(percentiles)
+    logger.info("✓ Submission statistics test passed")
+
+def test_backfill_counts_unfilled_rows(stats_app):
+    app, db = stats_app
+    from app.models import Submission
+    from app.stats import metric_columns, summary
+    backfill = importlib.import_module('app.migrations.0006_backfill_metric_columns')
+    logger.info("Testing the metric column backfill...")
+    with app.app_context():
+        # A row written before the typed columns existed
+        row = Submission(metrics={**SUBMISSIONS[0], 'accuracy': 93.25}, score=50.0)
+        db.session.add(row)
+        db.session.commit()
+        unfilled = [
+            metrics for metrics, in db.session.query(Submission.metrics).filter(
+                *(getattr(Submission, name).is_(None) for name in backfill.METRIC_COLUMNS)
+            )
+            if any(value is not None for value in metric_columns(metrics).values())
+        ]
+        before = summary()
+
+        with db.engine.connect() as connection:
+            backfill.upgrade(connection)
+        db.session.expire_all()
+        after = summary()
+
+        assert db.session.get(Submission, row.id).accuracy == 93.25
+        assert after['fields']['accuracy']['count'] - before['fields']['accuracy']['count'] == len(unfilled)
+        # A second run finds nothing left to count
+        with db.engine.connect() as connection:
+            backfill.upgrade(connection)
+        assert summary() == after
+    logger.info("✓ Metric column backfill test passed")
+
+def test_metric_columns_migration_reruns(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from app.migrations import upgrade
+    logger.info("Testing a re-run of the metric columns migration...")
+    engine = create_engine(f"sqlite:///{tmp_path / 'partial.db'}")
+    upgrade(engine, target='0004')
+    # A previous attempt added some of the columns before failing
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE submissions ADD COLUMN gpu_utilization DOUBLE PRECISION'))
+    assert '0005_submission_metric_columns' in upgrade(engine)
+    columns = {column['name'] for column in inspect(engine).get_columns('submissions')}
+    assert {'gpu_utilization', 'memory_usage', 'power_efficiency', 'completion_time', 'accuracy'} <= columns
+    engine.dispose()
+    logger.info("✓ Metric columns migration re-run test passed")
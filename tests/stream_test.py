@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import threading
+from app.stream import LeaderboardBroadcaster
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def publish(broadcaster, *ranks):
+    for rank in ranks:
+        broadcaster._push(json.dumps({'type': 'entered', 'entries': [{'rank': rank}]}))
+
+def parse(frame):
+    fields = dict(line.split(': ', 1) for line in frame.strip().split('\n'))
+    return fields['id'], fields['event'], json.loads(fields['data'])
+
+def test_ring_buffer_and_gaps():
+    logger.info("Testing the broadcaster's ring buffer...")
+    broadcaster = LeaderboardBroadcaster(buffer_size=4)
+    assert broadcaster.frames(0, 0) == (0, [])
+    publish(broadcaster, 1, 2, 3)
+
+    # Every frame carries an id, and a stream gets what it has not seen yet
+    seq, frames = broadcaster.frames(0, 0)
+    assert seq == 3 and [parse(frame)[0] for frame in frames] == [broadcaster.event_id(n) for n in (1, 2, 3)]
+    assert [parse(frame)[2]['entries'][0]['rank'] for frame in frames] == [1, 2, 3]
+    assert broadcaster.frames(3, 0.01) == (3, [])
+
+    # Frames 1 and 2 fall out of the buffer: a stream that missed one gets a single reset
+    publish(broadcaster, 4, 5, 6)
+    seq, frames = broadcaster.frames(1, 0)
+    assert seq == 6 and len(frames) == 1
+    assert parse(frames[0])[:2] == (broadcaster.event_id(6), 'reset')
+    seq, frames = broadcaster.frames(2, 0)
+    assert seq == 6 and [parse(frame)[0] for frame in frames] == [broadcaster.event_id(n) for n in (3, 4, 5, 6)]
+
+    # A waiting stream wakes up on the next frame
+    threading.Timer(0.05, publish, (broadcaster, 7)).start()
+    seq, frames = broadcaster.frames(6, 5)
+    assert seq == 7 and parse(frames[0])[0] == broadcaster.event_id(7)
+    logger.info("✓ Ring buffer test passed")
+
+def test_last_event_id_resumes_in_the_same_process():
+    logger.info("Testing Last-Event-ID resumption...")
+    broadcaster = LeaderboardBroadcaster(buffer_size=4)
+    publish(broadcaster, 1, 2)
+    assert broadcaster.resume_point(broadcaster.event_id(0)) == 0
+    assert broadcaster.resume_point(broadcaster.event_id(2)) == 2
+
+    # Ids from another process (or a restarted one), or not issued yet, need a new snapshot
+    other = LeaderboardBroadcaster()
+    for last_event_id in (None, '', 'garbage', other.event_id(1), broadcaster.event_id(3),
+                          f"{broadcaster.event_id(1)}x"):
+        assert broadcaster.resume_point(last_event_id) is None, last_event_id
+
+    # A resumed stream replays what it missed, or resets once that has left the buffer
+    publish(broadcaster, 3, 4, 5, 6)
+    assert [parse(frame)[0] for frame in broadcaster.frames(broadcaster.resume_point(broadcaster.event_id(3)), 0)[1]] \
+        == [broadcaster.event_id(n) for n in (4, 5, 6)]
+    assert parse(broadcaster.frames(broadcaster.resume_point(broadcaster.event_id(1)), 0)[1][0])[1] == 'reset'
+    logger.info("✓ Last-Event-ID test passed")
+
+def test_async_queues_follow_the_buffer():
+    logger.info("Testing the broadcaster's asyncio queues...")
+    broadcaster = LeaderboardBroadcaster(buffer_size=3)
+    publish(broadcaster, 1, 2)
+
+    async def scenario():
+        # Buffered frames come first, then frames pushed from the subscriber thread
+        queue = broadcaster.listen(1)
+        thread = threading.Thread(target=publish, args=(broadcaster, 3))
+        thread.start()
+        received = [await asyncio.wait_for(queue.get(), 5) for _ in range(2)]
+        thread.join()
+        assert [parse(frame)[0] for frame in received] == [broadcaster.event_id(2), broadcaster.event_id(3)]
+
+        # A stream a whole buffer behind is told to reset instead of queueing more
+        publish(broadcaster, 4, 5, 6, 7)
+        await asyncio.sleep(0.01)
+        assert queue.qsize() == 1
+        assert parse(queue.get_nowait())[:2] == (broadcaster.event_id(7), 'reset')
+
+        # A stream that is gone stops receiving frames
+        broadcaster.unlisten(queue)
+        publish(broadcaster, 8)
+        await asyncio.sleep(0.01)
+        assert queue.empty()
+
+    asyncio.run(scenario())
+    logger.info("✓ Async queue test passed")